@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import argparse
+import time
+from pathlib import Path
+
+from novaedit.model import NovaEditModel
+from novaedit.model.generation import SpeculativeStats
+from trainer.utils_dataset import load_jsonl
+
+
+def benchmark(model: NovaEditModel, rows: list[dict], runs: int) -> float:
+    """Return the mean seconds per `generate_patch` call over `runs` passes."""
+    start = time.perf_counter()
+    for _ in range(runs):
+        for row in rows:
+            code = row["code"]
+            model.generate_patch(
+                code=code,
+                start_line=row.get("region", {}).get("start_line", 1),
+                end_line=row.get("region", {}).get("end_line", len(code.splitlines())),
+                diagnostics=row.get("diagnostics", []),
+                instruction=row.get("instruction", ""),
+            )
+    return (time.perf_counter() - start) / (len(rows) * runs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare HF decoding modes on CPU.")
+    parser.add_argument("--model-id", required=True)
+    parser.add_argument("--data", type=Path, default=Path("eval/datasets/sample_bugfix.jsonl"))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--device", default="cpu")
+    args = parser.parse_args()
+
+    rows = list(load_jsonl(args.data))
+    for speculative in (False, True):
+        model = NovaEditModel(
+            hf_model_id=args.model_id, device=args.device, speculative=speculative
+        )
+        benchmark(model, rows[:1], 1)  # warm-up
+        model.speculative_stats = SpeculativeStats()
+        per_request = benchmark(model, rows, args.runs)
+        label = "prompt-lookup" if speculative else "greedy"
+        print(f"[{label}] {per_request * 1000:.1f} ms/request")
+        if speculative:
+            stats = model.speculative_stats
+            print(
+                f"  acceptance rate {stats.acceptance_rate:.2%}, "
+                f"{stats.generated / max(1, stats.verify_steps):.2f} tokens per forward pass"
+            )
+
+
+if __name__ == "__main__":
+    main()
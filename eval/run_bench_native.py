@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import argparse
+import time
+from dataclasses import replace
+from pathlib import Path
+
+import torch
+
+from novaedit.model.config import ModelConfig
+from novaedit.model.transformer import NovaEditForCausalLM
+
+
+def decode(model: NovaEditForCausalLM, prompt: torch.Tensor, new_tokens: int, use_cache: bool):
+    """Greedy-decode `new_tokens` tokens; return (prefill seconds, decode seconds)."""
+    with torch.no_grad():
+        start = time.perf_counter()
+        output = model(prompt, use_cache=use_cache)
+        prefilled = time.perf_counter()
+        ids = prompt
+        for _ in range(new_tokens):
+            next_token = output.logits[:, -1:].argmax(-1)
+            if use_cache:
+                output = model(next_token, past_key_values=output.past_key_values)
+            else:
+                ids = torch.cat((ids, next_token), dim=1)
+                output = model(ids, use_cache=False)
+        done = time.perf_counter()
+    return prefilled - start, done - prefilled
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the native NovaEdit transformer on CPU with random weights."
+    )
+    parser.add_argument("--config", type=Path, help="ModelConfig YAML; overrides below apply")
+    parser.add_argument("--d-model", type=int, default=256)
+    parser.add_argument("--n-layers", type=int, default=4)
+    parser.add_argument("--n-heads", type=int, default=8)
+    parser.add_argument("--n-kv-heads", type=int, default=2)
+    parser.add_argument("--d-ff", type=int, default=683)
+    parser.add_argument("--max-seq-len", type=int, default=1024)
+    parser.add_argument("--prompt-tokens", type=int, default=256)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads")
+    parser.add_argument("--no-cache-baseline", action="store_true", help="Also time recompute")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    config = ModelConfig.from_yaml(args.config) if args.config else ModelConfig()
+    if not args.config:
+        config = replace(
+            config,
+            d_model=args.d_model,
+            n_layers=args.n_layers,
+            n_heads=args.n_heads,
+            n_kv_heads=args.n_kv_heads,
+            d_ff=args.d_ff,
+            max_seq_len=args.max_seq_len,
+        )
+    torch.manual_seed(0)
+    model = NovaEditForCausalLM(config).eval()
+    params = sum(p.numel() for p in model.parameters())
+    print(f"config: {config.to_dict()}")
+    cache_mib = model.new_cache().nbytes / 2**20
+    print(f"parameters: {params / 1e6:.1f}M, KV cache per sequence: {cache_mib:.1f} MiB")
+
+    prompt = torch.randint(0, config.vocab_size, (1, args.prompt_tokens))
+    modes = [True, False] if args.no_cache_baseline else [True]
+    for use_cache in modes:
+        decode(model, prompt[:, :16], 4, use_cache)  # warm-up
+        timings = [decode(model, prompt, args.new_tokens, use_cache) for _ in range(args.runs)]
+        prefill = sum(t[0] for t in timings) / args.runs
+        decoding = sum(t[1] for t in timings) / args.runs
+        label = "kv-cache" if use_cache else "recompute"
+        print(
+            f"[{label}] prefill {prefill * 1000:.1f} ms "
+            f"({args.prompt_tokens / prefill:.0f} tok/s), "
+            f"decode {args.new_tokens / decoding:.1f} tok/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import torch
+
+from novaedit.model.config import ModelConfig
+from novaedit.model.generation import prompt_lookup_generate
+from novaedit.model.quantization import (
+    load_quantized,
+    model_nbytes,
+    quantize_model,
+    save_quantized,
+)
+from novaedit.model.transformer import CONFIG_FILE, NovaEditForCausalLM
+
+
+def random_config(args: argparse.Namespace) -> ModelConfig:
+    return ModelConfig(
+        d_model=args.d_model,
+        n_layers=args.n_layers,
+        n_heads=args.n_heads,
+        n_kv_heads=args.n_kv_heads,
+        d_ff=args.d_ff,
+        max_seq_len=args.prompt_tokens + args.new_tokens + 16,
+    )
+
+
+def load_fp32(args: argparse.Namespace):
+    if args.model_id:
+        from transformers import AutoModelForCausalLM
+
+        return AutoModelForCausalLM.from_pretrained(args.model_id).eval()
+    if args.native_model_dir:
+        return NovaEditForCausalLM.from_pretrained(args.native_model_dir)
+    torch.manual_seed(0)
+    return NovaEditForCausalLM(random_config(args)).eval()
+
+
+def build_skeleton(args: argparse.Namespace):
+    if args.model_id:
+        from transformers import AutoConfig, AutoModelForCausalLM
+
+        return AutoModelForCausalLM.from_config(AutoConfig.from_pretrained(args.model_id))
+    if args.native_model_dir:
+        return NovaEditForCausalLM(ModelConfig.from_yaml(Path(args.native_model_dir) / CONFIG_FILE))
+    return NovaEditForCausalLM(random_config(args))
+
+
+def tokens_per_second(model, prompt: torch.Tensor, new_tokens: int, runs: int) -> float:
+    """Greedy decode throughput, including prefill, averaged over `runs`."""
+    prompt_lookup_generate(model, prompt[:, :16], max_new_tokens=4, num_draft_tokens=0)
+    start = time.perf_counter()
+    for _ in range(runs):
+        prompt_lookup_generate(model, prompt, max_new_tokens=new_tokens, num_draft_tokens=0)
+    return new_tokens * runs / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compare fp32 and int8 CPU inference.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--model-id", help="HF model id or path")
+    source.add_argument("--native-model-dir", help="Native NovaEdit checkpoint directory")
+    parser.add_argument("--d-model", type=int, default=512, help="Random native config only")
+    parser.add_argument("--n-layers", type=int, default=8)
+    parser.add_argument("--n-heads", type=int, default=8)
+    parser.add_argument("--n-kv-heads", type=int, default=2)
+    parser.add_argument("--d-ff", type=int, default=1365)
+    parser.add_argument("--prompt-tokens", type=int, default=256)
+    parser.add_argument("--new-tokens", type=int, default=64)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--threads", type=int, help="torch.set_num_threads")
+    args = parser.parse_args()
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    start = time.perf_counter()
+    fp32 = load_fp32(args)
+    load_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    int8 = quantize_model(load_fp32(args), "int8")
+    quantize_seconds = time.perf_counter() - start
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "model-int8.safetensors"
+        save_quantized(int8, path)
+        start = time.perf_counter()
+        load_quantized(path, lambda: build_skeleton(args))
+        cached_seconds = time.perf_counter() - start
+
+    prompt = torch.randint(0, fp32.config.vocab_size, (1, args.prompt_tokens))
+    for label, model, seconds in (("fp32", fp32, load_seconds), ("int8", int8, quantize_seconds)):
+        rate = tokens_per_second(model, prompt, args.new_tokens, args.runs)
+        print(
+            f"[{label}] weights {model_nbytes(model) / 2**20:.1f} MiB, "
+            f"{rate:.1f} tok/s, startup {seconds:.2f} s"
+        )
+    print(f"[int8] startup from quantized cache {cached_seconds:.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+CLI = [sys.executable, "-m", "novaedit.clients.cli.novaedit_cli"]
+# Import the app and run its startup (model load) and shutdown once.
+SERVER_BOOT = (
+    "from fastapi.testclient import TestClient\n"
+    "from novaedit.server.main import app\n"
+    "with TestClient(app):\n"
+    "    pass\n"
+)
+HEAVY_MODULES = ("torch", "transformers", "tokenizers", "safetensors", "yaml", "pydantic")
+
+
+def time_command(command: list[str], runs: int) -> float:
+    """Median wall-clock seconds for a fresh interpreter to run `command`."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def heavy_imports(command: list[str]) -> dict[str, float]:
+    """Cumulative import seconds of the heavy top-level packages `command` pulls in."""
+    result = subprocess.run(
+        [command[0], "-X", "importtime", *command[1:]],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    found = {}
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() in HEAVY_MODULES:
+            found[parts[2].strip()] = int(parts[1]) / 1e6
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cold-start time of the CLI and server.")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snippet = Path(tmp) / "snippet.py"
+        snippet.write_text("def add(a, b):\n    return a + c\n")
+        commands = {
+            "novaedit --help": CLI + ["--help"],
+            "novaedit edit": CLI + ["edit", str(snippet), "-d", "NameError: name 'c'"],
+            "server boot": [sys.executable, "-c", SERVER_BOOT],
+        }
+        for name, command in commands.items():
+            seconds = time_command(command, args.runs)
+            heavy = heavy_imports(command)
+            loaded = ", ".join(f"{m} {s * 1000:.0f}ms" for m, s in heavy.items()) or "none"
+            print(f"[{name}] {seconds * 1000:.0f} ms median; heavy imports: {loaded}")
+
+
+if __name__ == "__main__":
+    main()
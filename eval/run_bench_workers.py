@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import time
+from functools import partial
+
+from novaedit.model import NovaEditModel, PatchRequest
+from novaedit.server.workers import ProcessWorkerPool
+
+
+def make_requests(count: int, lines: int) -> list[PatchRequest]:
+    """Large regions with an undefined name, so the heuristics do real difflib work."""
+    requests = []
+    for i in range(count):
+        body = [f"    value_{i}_{n} = compute_{n}(arg_{n})" for n in range(lines)]
+        code = "def handler(args):\n" + "\n".join(body) + f"\n    return valeu_{i}\n"
+        diagnostics = [f"NameError: name 'valeu_{i}' is not defined"]
+        requests.append(PatchRequest(code, 1, lines + 2, diagnostics))
+    return requests
+
+
+async def run_threads(requests: list[PatchRequest]) -> None:
+    model = NovaEditModel()
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(
+        *(loop.run_in_executor(None, partial(model.generate_patch_batch, [r])) for r in requests)
+    )
+
+
+async def run_processes(pool: ProcessWorkerPool, requests: list[PatchRequest]) -> None:
+    await asyncio.gather(*(pool.submit(r) for r in requests))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Heuristic throughput: threads vs processes.")
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--lines", type=int, default=400, help="Lines per request region")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args()
+
+    requests = make_requests(args.requests, args.lines)
+    start = time.perf_counter()
+    asyncio.run(run_threads(requests))
+    print(f"[threads] {args.requests / (time.perf_counter() - start):.1f} req/s")
+    for count in args.workers:
+        pool = ProcessWorkerPool(count)
+        pool.warm_up()
+        start = time.perf_counter()
+        asyncio.run(run_processes(pool, requests))
+        print(f"[processes x{count}] {args.requests / (time.perf_counter() - start):.1f} req/s")
+        pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
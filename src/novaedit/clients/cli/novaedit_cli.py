@@ -1,15 +1,14 @@
 from __future__ import annotations
 
-import json
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, List, Optional, Tuple
 
 import typer
 from rich.console import Console
 from rich.syntax import Syntax
 
+from novaedit.languages.python.patch_apply import apply_patch_dsl
 from novaedit.model import NovaEditModel
-from novaedit.server.api_schemas import EditRequest
 
 console = Console()
 app = typer.Typer(help="NovaEdit CLI")
@@ -37,6 +36,12 @@ def edit(
         None, "--hf-model-id", help="Optional Hugging Face model ID to use locally."
     ),
     max_edits: int = typer.Option(5, "--max-edits", help="Maximum edits to apply from response."),
+    cascade: bool = typer.Option(
+        False, "--cascade", help="With --hf-model-id, try the heuristics before the model."
+    ),
+    precheck: bool = typer.Option(
+        False, "--precheck", help="Return an empty patch for clean code without generating."
+    ),
     diagnostics_file: Optional[Path] = typer.Option(
         None, "--diagnostics-file", help="Path to file with diagnostics, one per line."
     ),
@@ -55,26 +60,30 @@ def edit(
             import httpx
         except ImportError as exc:  # pragma: no cover
             raise typer.BadParameter("Install httpx or drop --use-server.") from exc
-        payload = EditRequest(
-            language=language,
-            code=code,
-            file_path=str(code_file),
-            start_line=start_line,
-            end_line=end_line,
-            diagnostics=diagnostics,
-            instruction=instruction,
-            max_edits=max_edits,
-        )
+        # A plain payload: the server validates it, and the CLI need not import the schemas.
+        payload = {
+            "language": language,
+            "code": code,
+            "file_path": str(code_file),
+            "start_line": start_line,
+            "end_line": end_line,
+            "diagnostics": diagnostics,
+            "instruction": instruction,
+            "max_edits": max_edits,
+            "priority": "batch",
+        }
         with httpx.Client(timeout=30) as client:
-            resp = client.post(server_url, json=json.loads(payload.model_dump_json()))
+            resp = client.post(server_url, json=payload)
             if resp.status_code >= 400:
                 console.print(f"[red]Server error {resp.status_code}: {resp.text}[/red]")
                 raise typer.Exit(1)
             data = resp.json()
             patch_dsl = data.get("raw_patch_dsl", "")
-            new_code = NovaEditModel().apply_patch(code, patch_dsl)
+            new_code = apply_patch_dsl(code, patch_dsl)
     else:
-        model = NovaEditModel(language=language, hf_model_id=hf_model_id)
+        model = NovaEditModel(
+            language=language, hf_model_id=hf_model_id, cascade=cascade, precheck=precheck
+        )
         _, patch_dsl = model.generate_patch(
             code=code,
             start_line=start_line,
@@ -102,6 +111,161 @@ def serve(port: int = typer.Option(8000, "--port"), reload: bool = typer.Option(
     uvicorn.run("novaedit.server.main:app", host="0.0.0.0", port=port, reload=reload)
 
 
+@app.command()
+def lsp(
+    hf_model_id: Optional[str] = typer.Option(
+        None, "--hf-model-id", help="Optional Hugging Face model ID to use."
+    ),
+    native_model_dir: Optional[Path] = typer.Option(
+        None, "--native-model-dir", help="Optional native NovaEdit checkpoint directory."
+    ),
+    max_edits: int = typer.Option(5, "--max-edits", help="Maximum edits per code action."),
+) -> None:
+    """Run a Language Server Protocol server on stdin/stdout."""
+    from novaedit.lsp import NovaEditLanguageServer
+
+    def load_model() -> NovaEditModel:
+        return NovaEditModel(
+            hf_model_id=hf_model_id,
+            native_model_dir=str(native_model_dir) if native_model_dir else None,
+        )
+
+    raise typer.Exit(NovaEditLanguageServer(load_model, max_edits=max_edits).serve())
+
+
+@app.command()
+def capacity(
+    config_file: Optional[Path] = typer.Option(
+        None, "--config", help="Model config YAML (default: the shipped small config)."
+    ),
+    native_model_dir: Optional[Path] = typer.Option(
+        None, "--native-model-dir", help="Read the config of a native checkpoint."
+    ),
+    hf_model_id: Optional[str] = typer.Option(
+        None, "--hf-model-id", help="Read the config of a Hugging Face model."
+    ),
+    prompt_tokens: int = typer.Option(1024, "--prompt-tokens"),
+    new_tokens: int = typer.Option(256, "--new-tokens"),
+    quantization: str = typer.Option("none", "--quantization", help="none or int8."),
+    memory_budget_mb: float = typer.Option(
+        0, "--memory-budget-mb", help="Recommend concurrency and batch limits for this budget."
+    ),
+    measure: bool = typer.Option(
+        False, "--measure", help="Check the estimates against the peak RSS of a real decode."
+    ),
+    batch_size: int = typer.Option(1, "--batch-size", help="Sequences decoded by --measure."),
+) -> None:
+    """Estimate model and per-request memory, and the concurrency a memory budget allows."""
+    from novaedit.model.capacity import plan_capacity, request_cost, weight_bytes
+    from novaedit.model.config import ModelConfig, load_default_config
+
+    if hf_model_id:
+        from transformers import AutoConfig
+
+        from novaedit.model.capacity import config_from_hf
+
+        try:
+            config = config_from_hf(AutoConfig.from_pretrained(hf_model_id))
+        except ValueError as exc:
+            console.print(f"[red]{exc}[/red]")
+            raise typer.Exit(1)
+    elif native_model_dir:
+        from novaedit.model.transformer import CONFIG_FILE
+
+        config = ModelConfig.from_yaml(native_model_dir / CONFIG_FILE)
+    else:
+        config = ModelConfig.from_yaml(config_file) if config_file else load_default_config()
+    # The native model preallocates its KV cache; HF caches grow with the sequence.
+    preallocated = not hf_model_id
+    weights = weight_bytes(config, quantization)
+    cost = request_cost(config, prompt_tokens, new_tokens, preallocated)
+    console.print(f"Weights: {_mib(weights)}")
+    console.print(
+        f"Per request: {_mib(cost.total)} (KV cache {_mib(cost.kv_cache)}, "
+        f"prefill {_mib(cost.prefill)})"
+    )
+    if memory_budget_mb > 0:
+        try:
+            plan = plan_capacity(
+                config,
+                int(memory_budget_mb * 1024 * 1024),
+                prompt_tokens,
+                new_tokens,
+                quantization=quantization,
+                preallocated=preallocated,
+            )
+        except ValueError as exc:
+            console.print(f"[red]{exc}[/red]")
+            raise typer.Exit(1)
+        console.print(
+            f"NOVAEDIT_MAX_CONCURRENT={plan.max_concurrent} "
+            f"NOVAEDIT_MAX_BATCH_SIZE={plan.max_batch_size}"
+        )
+    if measure:
+        if hf_model_id:
+            import torch
+            from transformers import AutoModelForCausalLM
+
+            label = f"{hf_model_id}, fp32"
+
+            def load():
+                return AutoModelForCausalLM.from_pretrained(hf_model_id, torch_dtype=torch.float32)
+
+        elif native_model_dir:
+            from novaedit.model.transformer import NovaEditForCausalLM
+
+            label = f"{native_model_dir}, fp32"
+
+            def load():
+                return NovaEditForCausalLM.from_pretrained(native_model_dir, device="cpu")
+
+        else:
+            from novaedit.model.transformer import NovaEditForCausalLM
+
+            label = "random native weights, fp32"
+
+            def load():
+                return NovaEditForCausalLM(config)
+
+        measured_weights, measured_request = _measure(
+            load, config, prompt_tokens, new_tokens, batch_size
+        )
+        # The measured decode runs in full precision, so compare against the fp32 estimate.
+        console.print(f"Measured ({label}):")
+        console.print(
+            f"  weights {_mib(measured_weights)} (estimated {_mib(weight_bytes(config))})"
+        )
+        console.print(f"  per request {_mib(measured_request)} (estimated {_mib(cost.total)})")
+
+
+def _measure(
+    load: Callable[[], Any], config, prompt_tokens: int, new_tokens: int, batch_size: int
+) -> Tuple[int, int]:
+    """Peak RSS growth from `load()`ing the model and from one greedy decode per row."""
+    import torch
+
+    from novaedit.server.memory import process_memory
+
+    # Peak RSS only grows, so each phase is measured as the growth of the peak.
+    before = process_memory()["peak_rss_bytes"] or 0
+    model = load().eval()
+    built = process_memory()["peak_rss_bytes"] or 0
+    prompt = min(prompt_tokens, config.max_seq_len - 1)
+    steps = min(new_tokens, config.max_seq_len - prompt)
+    input_ids = torch.randint(config.vocab_size, (batch_size, prompt))
+    with torch.no_grad():
+        output = model(input_ids)
+        for _ in range(steps - 1):
+            next_ids = output.logits[:, -1:].argmax(-1)
+            output = model(next_ids, past_key_values=output.past_key_values)
+    decoded = process_memory()["peak_rss_bytes"] or 0
+    return built - before, (decoded - built) // batch_size
+
+
+def _mib(nbytes: int) -> str:
+    return f"{nbytes / (1024 * 1024):,.1f} MiB"
+
+
 @app.command()
 def regression() -> None:
     """Run the built-in regression cases and print patches."""
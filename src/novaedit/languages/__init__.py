@@ -1 +1,16 @@
-__all__ = ["python", "javascript"]
+from __future__ import annotations
+
+__all__ = ["python", "javascript", "adapter_for"]
+
+
+def adapter_for(language: str):
+    """Language adapter for `language`, or None when the language is not supported."""
+    if language == "python":
+        from novaedit.languages.python.adapter import PythonAdapter
+
+        return PythonAdapter()
+    if language == "javascript":
+        from novaedit.languages.javascript.adapter import JavaScriptAdapter
+
+        return JavaScriptAdapter()
+    return None
@@ -11,7 +11,7 @@ class LanguageAdapter(Protocol):
 
     def parse_ast(self, code: str): ...
 
-    def run_diagnostics(self, code: str, path: str | None = None) -> list[str]: ...
+    def run_diagnostics(self, code: str, path: str | None = None, tree=None) -> list[str]: ...
 
     def apply_patch(self, code: str, patch_dsl: str) -> str: ...
 
@@ -24,7 +24,7 @@ class JavaScriptAdapter(LanguageAdapter):
         # Placeholder; could integrate tree-sitter or babel in the future.
         return None
 
-    def run_diagnostics(self, code: str, path: str | None = None) -> list[str]:
+    def run_diagnostics(self, code: str, path: str | None = None, tree=None) -> list[str]:
         # Placeholder diagnostics; integrate eslint/js parser later.
         return []
 
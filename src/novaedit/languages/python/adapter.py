@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import ast
 from dataclasses import dataclass
-from typing import Protocol, Sequence
+from typing import Any, Protocol, Sequence
 
 from novaedit.languages.python import diagnostics, patch_apply
 
@@ -12,7 +12,9 @@ class LanguageAdapter(Protocol):
 
     def parse_ast(self, code: str) -> ast.AST | None: ...
 
-    def run_diagnostics(self, code: str, path: str | None = None) -> list[str]: ...
+    def run_diagnostics(
+        self, code: str, path: str | None = None, tree: Any = None
+    ) -> list[str]: ...
 
     def apply_patch(self, code: str, patch_dsl: str) -> str: ...
 
@@ -27,8 +29,11 @@ class PythonAdapter(LanguageAdapter):
         except SyntaxError:
             return None
 
-    def run_diagnostics(self, code: str, path: str | None = None) -> list[str]:
-        return diagnostics.run_basic_diagnostics(code, path)
+    def run_diagnostics(
+        self, code: str, path: str | None = None, tree: Any = None
+    ) -> list[str]:
+        """Diagnostics for `code`; `tree`, its cached `parse_ast`, saves parsing it again."""
+        return diagnostics.run_basic_diagnostics(code, path, tree)
 
     def apply_patch(self, code: str, patch_dsl: str) -> str:
         return patch_apply.apply_patch_dsl(code, patch_dsl)
@@ -1,12 +1,17 @@
 from __future__ import annotations
 
 import ast
-from typing import List
+from typing import Any, List
 
 
-def run_basic_diagnostics(code: str, path: str | None = None) -> List[str]:
-    """Very small diagnostic runner using stdlib only."""
+def run_basic_diagnostics(code: str, path: str | None = None, tree: Any = None) -> List[str]:
+    """Very small diagnostic runner using stdlib only.
+
+    A `tree` already parsed from `code` means it has no syntax errors to report.
+    """
     errors: List[str] = []
+    if tree is not None:
+        return errors
     try:
         ast.parse(code, filename=path or "<snippet>")
     except SyntaxError as exc:  # pragma: no cover - hard to trigger in tests
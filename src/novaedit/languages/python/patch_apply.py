@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import Iterable, List, Sequence
+from typing import Iterable, List, Optional, Sequence, Tuple
 
 
 @dataclass
@@ -12,35 +12,77 @@ class Edit:
 
 
 def parse_patch_dsl(patch_dsl: str) -> List[Edit]:
-    edits: List[Edit] = []
     if not patch_dsl.strip():
+        return []
+    parser = PatchStreamParser()
+    return parser.feed(patch_dsl) + parser.close()
+
+
+class PatchStreamParser:
+    """Incremental patch DSL parser.
+
+    Text can be fed in arbitrary chunks (for example as tokens are decoded);
+    `feed` returns every hunk that became complete, i.e. whose following
+    `@@` header has been seen, and `close` flushes the final hunk. Feeding a
+    whole patch and closing yields the same edits as `parse_patch_dsl`.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._span: Optional[Tuple[int, int]] = None
+        self._replacement: List[str] = []
+
+    def feed(self, text: str) -> List[Edit]:
+        self._buffer += text
+        *lines, self._buffer = self._buffer.split("\n")
+        edits: List[Edit] = []
+        for line in lines:
+            edit = self._consume(line)
+            if edit is not None:
+                edits.append(edit)
+        return edits
+
+    def close(self) -> List[Edit]:
+        edits: List[Edit] = []
+        if self._buffer:
+            edit = self._consume(self._buffer)
+            self._buffer = ""
+            if edit is not None:
+                edits.append(edit)
+        if self._span is not None:
+            edits.append(self._finish())
         return edits
 
-    lines = patch_dsl.splitlines()
-    idx = 0
-    while idx < len(lines):
-        header = lines[idx].strip()
-        if not header.startswith("@@"):
-            idx += 1
-            continue
-        try:
-            span = header.split(" ", maxsplit=1)[1]
-            start_str, end_str = span.split("-")
-            start_line, end_line = int(start_str), int(end_str)
-        except Exception as exc:  # pragma: no cover - defensive
-            raise ValueError(f"Invalid patch header: {header}") from exc
-        if start_line < 1 or end_line < start_line:
-            raise ValueError(f"Invalid line span in patch header: {header}")
-        idx += 1
-        replacement_lines: List[str] = []
-        while idx < len(lines) and not lines[idx].startswith("@@"):
-            line = lines[idx]
-            if line.startswith("+"):
-                replacement_lines.append(line[2:] if line.startswith("+ ") else line[1:])
-            idx += 1
-        replacement = "\n".join(replacement_lines) + ("\n" if replacement_lines else "")
-        edits.append(Edit(start_line=start_line, end_line=end_line, replacement=replacement))
-    return edits
+    def _consume(self, line: str) -> Optional[Edit]:
+        line = line.rstrip("\r")
+        header = line.strip()
+        if header.startswith("@@"):
+            finished = self._finish() if self._span is not None else None
+            self._span = _parse_header(header)
+            return finished
+        if self._span is not None and line.startswith("+"):
+            self._replacement.append(line[2:] if line.startswith("+ ") else line[1:])
+        return None
+
+    def _finish(self) -> Edit:
+        assert self._span is not None
+        start_line, end_line = self._span
+        replacement = "\n".join(self._replacement) + ("\n" if self._replacement else "")
+        self._span = None
+        self._replacement = []
+        return Edit(start_line=start_line, end_line=end_line, replacement=replacement)
+
+
+def _parse_header(header: str) -> Tuple[int, int]:
+    try:
+        span = header.split(" ", maxsplit=1)[1]
+        start_str, end_str = span.split("-")
+        start_line, end_line = int(start_str), int(end_str)
+    except Exception as exc:  # pragma: no cover - defensive
+        raise ValueError(f"Invalid patch header: {header}") from exc
+    if start_line < 1 or end_line < start_line:
+        raise ValueError(f"Invalid line span in patch header: {header}")
+    return start_line, end_line
 
 
 def apply_edits(code: str, edits: Sequence[Edit]) -> str:
@@ -69,3 +111,28 @@ def validate_edits(edits: Sequence[Edit]) -> None:
         if edit.start_line <= last_end:
             raise ValueError("Overlapping edits detected")
         last_end = edit.end_line
+
+
+def merge_edits(groups: Sequence[Sequence[Edit]]) -> Tuple[List[Edit], List[int]]:
+    """Merge edits proposed for several regions of one file into a non-overlapping set.
+
+    Edits are taken in group order; an edit overlapping one already accepted
+    is dropped unless it is an exact duplicate. Returns the merged edits in
+    line order and the indices of groups that lost at least one edit.
+    """
+    accepted: List[Edit] = []
+    conflicts: List[int] = []
+    for index, group in enumerate(groups):
+        for edit in group:
+            clash = [
+                kept
+                for kept in accepted
+                if edit.start_line <= kept.end_line and kept.start_line <= edit.end_line
+            ]
+            if not clash:
+                accepted.append(edit)
+            elif clash != [edit] and index not in conflicts:
+                conflicts.append(index)
+    merged = sorted(accepted, key=lambda e: (e.start_line, e.end_line))
+    validate_edits(merged)
+    return merged, conflicts
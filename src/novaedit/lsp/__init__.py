@@ -0,0 +1,3 @@
+from novaedit.lsp.server import NovaEditLanguageServer
+
+__all__ = ["NovaEditLanguageServer"]
@@ -0,0 +1,425 @@
+from __future__ import annotations
+
+import re
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from novaedit.languages.javascript.adapter import JavaScriptAdapter
+from novaedit.languages.python.adapter import PythonAdapter
+from novaedit.lsp.jsonrpc import (
+    INTERNAL_ERROR,
+    INVALID_PARAMS,
+    INVALID_REQUEST,
+    METHOD_NOT_FOUND,
+    PARSE_ERROR,
+    REQUEST_CANCELLED,
+    SERVER_NOT_INITIALIZED,
+    read_message,
+    write_message,
+)
+from novaedit.model import CancelToken, GenerationCancelled, NovaEditModel, PatchEdit
+from novaedit.server.documents import (
+    DocumentStore,
+    DocumentVersionError,
+    TextChange,
+    UnknownDocumentError,
+    apply_change,
+)
+
+# Editor language ids served, mapped to NovaEdit languages.
+LANGUAGE_IDS = {
+    "python": "python",
+    "javascript": "javascript",
+    "javascriptreact": "javascript",
+}
+ADAPTERS = {"python": PythonAdapter(), "javascript": JavaScriptAdapter()}
+# The LSP server holds a single client's documents.
+_SESSION = "lsp"
+_LINE_PATTERN = re.compile(r"at line (\d+)")
+# LSP `DiagnosticSeverity.Error`, `TextDocumentSyncKind.Incremental` and the
+# `quickfix` code action kind.
+_SEVERITY_ERROR = 1
+_SYNC_INCREMENTAL = 2
+_QUICKFIX = "quickfix"
+
+
+class InvalidParams(ValueError):
+    """Params of a request or notification that do not have the shape LSP defines."""
+
+
+class NovaEditLanguageServer:
+    """Language Server Protocol server answering code actions with NovaEdit patches.
+
+    Speaks JSON-RPC over `reader`/`writer` (stdin/stdout by default). Documents
+    are synced incrementally into a `DocumentStore`; diagnostics from the
+    language adapter are published on every change, and `textDocument/codeAction`
+    asks the model for a patch over the requested range, using both those and
+    the diagnostics the client sends in the code action context. Code actions
+    run on `max_workers` threads so `$/cancelRequest` can stop them mid-generation.
+    The model is built by `model_factory` on the first code action.
+
+    Malformed requests are answered with `InvalidParams`, failing ones with
+    `InternalError`; malformed notifications are dropped. Neither stops the server.
+    """
+
+    def __init__(
+        self,
+        model_factory: Callable[[], NovaEditModel] = NovaEditModel,
+        reader: Optional[BinaryIO] = None,
+        writer: Optional[BinaryIO] = None,
+        max_workers: int = 2,
+        max_edits: int = 5,
+    ):
+        self.model_factory = model_factory
+        self.reader = reader or sys.stdin.buffer
+        self.writer = writer or sys.stdout.buffer
+        self.max_edits = max_edits
+        self.documents = DocumentStore()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._write_lock = threading.Lock()
+        self._model_lock = threading.Lock()
+        self._models: Dict[str, NovaEditModel] = {}
+        self._base_model: Optional[NovaEditModel] = None
+        self._pending: Dict[Any, Tuple[Future, CancelToken]] = {}
+        self._diagnostics: Dict[str, List[str]] = {}
+        self._utf16 = True
+        self._initialized = False
+        self._shutdown = False
+        self._notifications: Dict[str, Callable[[Dict[str, Any]], None]] = {
+            "textDocument/didOpen": self._did_open,
+            "textDocument/didChange": self._did_change,
+            "textDocument/didClose": self._did_close,
+            "$/cancelRequest": self._cancel_request,
+        }
+
+    def serve(self) -> int:
+        """Handle messages until `exit` or end of input; return the process exit code."""
+        try:
+            while True:
+                try:
+                    message = read_message(self.reader)
+                except ValueError as exc:
+                    self._error(None, PARSE_ERROR, f"Parse error: {exc}")
+                    continue
+                if message is None:
+                    return 0 if self._shutdown else 1
+                if not isinstance(message, dict):
+                    self._error(None, INVALID_REQUEST, "Expected a JSON-RPC message object")
+                    continue
+                if message.get("method") == "exit":
+                    return 0 if self._shutdown else 1
+                self.handle(message)
+        finally:
+            for future, cancel in list(self._pending.values()):
+                cancel.cancel()
+                future.cancel()
+            self._executor.shutdown(wait=True)
+
+    def handle(self, message: Dict[str, Any]) -> None:
+        method = message.get("method")
+        params = message.get("params") or {}
+        request_id = message.get("id")
+        if method is None:
+            return  # a response to a server request; none are sent
+        try:
+            self._dispatch(method, request_id, params)
+        except InvalidParams as exc:
+            if request_id is not None:
+                self._error(request_id, INVALID_PARAMS, str(exc))
+        except Exception as exc:
+            if request_id is not None:
+                self._error(request_id, INTERNAL_ERROR, str(exc))
+
+    def _dispatch(self, method: str, request_id: Any, params: Any) -> None:
+        if not isinstance(params, dict):
+            raise InvalidParams("params must be an object")
+        if request_id is None:
+            handler = self._notifications.get(method)
+            if handler is not None and self._initialized:
+                handler(params)
+            return
+        if method == "initialize":
+            self._respond(request_id, self._initialize(params))
+        elif not self._initialized:
+            self._error(request_id, SERVER_NOT_INITIALIZED, "Server not initialized")
+        elif method == "shutdown":
+            # Answer code actions still running before acknowledging.
+            wait([future for future, _ in list(self._pending.values())])
+            self._shutdown = True
+            self._respond(request_id, None)
+        elif method == "textDocument/codeAction":
+            self._start_code_action(request_id, params)
+        else:
+            self._error(request_id, METHOD_NOT_FOUND, f"Unsupported method: {method}")
+
+    def _initialize(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        capabilities = _optional(params, "capabilities", dict) or {}
+        general = _optional(capabilities, "general", dict) or {}
+        encodings = _optional(general, "positionEncodings", list) or []
+        # Document offsets are code points; utf-32 lets clients send them as is.
+        self._utf16 = "utf-32" not in encodings
+        self._initialized = True
+        return {
+            "capabilities": {
+                "positionEncoding": "utf-16" if self._utf16 else "utf-32",
+                "textDocumentSync": {"openClose": True, "change": _SYNC_INCREMENTAL},
+                "codeActionProvider": {"codeActionKinds": [_QUICKFIX]},
+            },
+            "serverInfo": {"name": "novaedit"},
+        }
+
+    def _did_open(self, params: Dict[str, Any]) -> None:
+        item = _required(params, "textDocument", dict)
+        uri = _required(item, "uri", str)
+        version = _required(item, "version", int)
+        text = _required(item, "text", str)
+        language = LANGUAGE_IDS.get(_optional(item, "languageId", str) or "")
+        if language is None:
+            return
+        self.documents.open(_SESSION, uri, language, version, text)
+        self._publish_diagnostics(uri)
+
+    def _did_change(self, params: Dict[str, Any]) -> None:
+        identifier = _required(params, "textDocument", dict)
+        uri = _required(identifier, "uri", str)
+        version = _required(identifier, "version", int)
+        changes = _required(params, "contentChanges", list)
+        try:
+            document = self.documents.get(_SESSION, uri)
+        except UnknownDocumentError:
+            return
+        text = document.text
+        try:
+            for change in changes:
+                text = apply_change(text, self._text_change(text, change))
+            self.documents.change(_SESSION, uri, version, [TextChange(text)])
+        except (DocumentVersionError, ValueError):
+            # Out of sync; the client's next full-text change or reopen recovers.
+            return
+        self._publish_diagnostics(uri)
+
+    def _did_close(self, params: Dict[str, Any]) -> None:
+        uri = _required(_required(params, "textDocument", dict), "uri", str)
+        try:
+            self.documents.close(_SESSION, uri)
+        except UnknownDocumentError:
+            return
+        self._diagnostics.pop(uri, None)
+        self._notify("textDocument/publishDiagnostics", {"uri": uri, "diagnostics": []})
+
+    def _cancel_request(self, params: Dict[str, Any]) -> None:
+        pending = self._pending.get(params.get("id"))
+        if pending is not None:
+            future, cancel = pending
+            cancel.cancel()
+            future.cancel()
+
+    def _start_code_action(self, request_id: Any, params: Dict[str, Any]) -> None:
+        uri = _required(_required(params, "textDocument", dict), "uri", str)
+        lines = _lines(_required(params, "range", dict))
+        context = _optional(params, "context", dict) or {}
+        sent = []
+        for diagnostic in _optional(context, "diagnostics", list) or []:
+            if not isinstance(diagnostic, dict):
+                raise InvalidParams("diagnostics must be objects")
+            span = _lines(_required(diagnostic, "range", dict))
+            sent.append((_required(diagnostic, "message", str), span))
+        try:
+            document = self.documents.get(_SESSION, uri)
+        except UnknownDocumentError:
+            self._respond(request_id, [])
+            return
+        # Only diagnostics touching the range are worth a patch; without any
+        # there is nothing to fix and no reason to run the model.
+        first, last = lines
+        diagnostics = [
+            message
+            for message in self._diagnostics.get(uri, [])
+            if first <= _diagnostic_line(message) <= last
+        ]
+        for message, span in sent:
+            if span[0] <= last and span[1] >= first:
+                diagnostics.append(message)
+                lines += span
+        if not diagnostics:
+            self._respond(request_id, [])
+            return
+        # Snapshot the document here: it may change while the action runs. Its
+        # AST was cached for this version when its diagnostics were published.
+        tree = document.parse(ADAPTERS[document.language].parse_ast)
+        job = (uri, document.language, document.version, document.text, tree, diagnostics, lines)
+        cancel = CancelToken()
+        future = self._executor.submit(self._code_action, cancel, *job)
+        self._pending[request_id] = (future, cancel)
+        future.add_done_callback(lambda done: self._finish_code_action(request_id, done))
+
+    def _code_action(
+        self,
+        cancel: CancelToken,
+        uri: str,
+        language: str,
+        version: int,
+        text: str,
+        tree: Any,
+        diagnostics: List[str],
+        lines: List[int],
+    ) -> List[Dict[str, Any]]:
+        last_line = max(1, len(text.splitlines()))
+        edits, _ = self._model(language).generate_patch(
+            code=text,
+            start_line=min(last_line, min(lines) + 1),
+            end_line=min(last_line, max(lines) + 1),
+            diagnostics=diagnostics,
+            max_edits=self.max_edits,
+            cancel=cancel,
+            tree=tree,
+        )
+        if not edits:
+            return []
+        edit = {
+            "documentChanges": [
+                {
+                    "textDocument": {"uri": uri, "version": version},
+                    "edits": [_text_edit(e) for e in edits],
+                }
+            ]
+        }
+        title = "NovaEdit: apply fix" if len(edits) == 1 else f"NovaEdit: apply {len(edits)} fixes"
+        return [{"title": title, "kind": _QUICKFIX, "edit": edit}]
+
+    def _finish_code_action(self, request_id: Any, future: Future) -> None:
+        self._pending.pop(request_id, None)
+        if future.cancelled():
+            self._error(request_id, REQUEST_CANCELLED, "Request cancelled")
+            return
+        error = future.exception()
+        if isinstance(error, GenerationCancelled):
+            self._error(request_id, REQUEST_CANCELLED, "Request cancelled")
+        elif isinstance(error, (KeyError, TypeError, ValueError)):
+            self._error(request_id, INVALID_PARAMS, str(error))
+        elif error is not None:
+            self._error(request_id, INTERNAL_ERROR, str(error))
+        else:
+            self._respond(request_id, future.result())
+
+    def _model(self, language: str) -> NovaEditModel:
+        with self._model_lock:
+            if self._base_model is None:
+                self._base_model = self.model_factory()
+            if language not in self._models:
+                self._models[language] = self._base_model.for_language(language)
+            return self._models[language]
+
+    def _publish_diagnostics(self, uri: str) -> None:
+        document = self.documents.get(_SESSION, uri)
+        adapter = ADAPTERS[document.language]
+        tree = document.parse(adapter.parse_ast)
+        messages = adapter.run_diagnostics(document.text, uri, tree)
+        self._diagnostics[uri] = messages
+        diagnostics = []
+        for message in messages:
+            line = _diagnostic_line(message)
+            diagnostics.append(
+                {
+                    "range": {
+                        "start": {"line": line, "character": 0},
+                        "end": {"line": line + 1, "character": 0},
+                    },
+                    "severity": _SEVERITY_ERROR,
+                    "source": "novaedit",
+                    "message": message,
+                }
+            )
+        self._notify(
+            "textDocument/publishDiagnostics",
+            {"uri": uri, "version": document.version, "diagnostics": diagnostics},
+        )
+
+    def _text_change(self, text: str, change: Any) -> TextChange:
+        if not isinstance(change, dict):
+            raise InvalidParams("contentChanges must be objects")
+        new_text = _required(change, "text", str)
+        span = _optional(change, "range", dict)
+        if span is None:
+            return TextChange(new_text)
+        start, end = _position(span, "start"), _position(span, "end")
+        return TextChange(
+            new_text,
+            start_line=start[0],
+            start_character=self._character(text, *start),
+            end_line=end[0],
+            end_character=self._character(text, *end),
+        )
+
+    def _character(self, text: str, line: int, character: int) -> int:
+        """Convert a client character offset on `line` to a code point offset."""
+        if not self._utf16:
+            return character
+        lines = text.split("\n")
+        if line >= len(lines):
+            return character
+        units = 0
+        for index, char in enumerate(lines[line]):
+            if units >= character:
+                return index
+            units += 2 if ord(char) > 0xFFFF else 1
+        return len(lines[line])
+
+    def _respond(self, request_id: Any, result: Any) -> None:
+        self._write({"jsonrpc": "2.0", "id": request_id, "result": result})
+
+    def _error(self, request_id: Any, code: int, message: str) -> None:
+        self._write(
+            {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+        )
+
+    def _notify(self, method: str, params: Dict[str, Any]) -> None:
+        self._write({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def _write(self, message: Dict[str, Any]) -> None:
+        with self._write_lock:
+            write_message(self.writer, message)
+
+
+def _diagnostic_line(message: str) -> int:
+    """0-based line an adapter diagnostic points at; the first line when it names none."""
+    match = _LINE_PATTERN.search(message)
+    return max(0, int(match.group(1)) - 1) if match else 0
+
+
+def _required(params: Dict[str, Any], key: str, kind: type) -> Any:
+    value = params.get(key)
+    # bool is an int subclass, but never a valid line, version or offset.
+    if not isinstance(value, kind) or (kind is int and isinstance(value, bool)):
+        raise InvalidParams(f"{key!r} must be a {kind.__name__}")
+    return value
+
+
+def _optional(params: Dict[str, Any], key: str, kind: type) -> Any:
+    return None if params.get(key) is None else _required(params, key, kind)
+
+
+def _position(span: Dict[str, Any], key: str) -> Tuple[int, int]:
+    position = _required(span, key, dict)
+    line, character = _required(position, "line", int), _required(position, "character", int)
+    if line < 0 or character < 0:
+        raise InvalidParams(f"{key!r} must not be negative")
+    return line, character
+
+
+def _lines(span: Dict[str, Any]) -> List[int]:
+    """0-based first and last line of an LSP `Range`."""
+    return [_position(span, "start")[0], _position(span, "end")[0]]
+
+
+def _text_edit(edit: PatchEdit) -> Dict[str, Any]:
+    """LSP `TextEdit` replacing the whole lines `edit` spans."""
+    return {
+        "range": {
+            "start": {"line": edit.start_line - 1, "character": 0},
+            "end": {"line": edit.end_line, "character": 0},
+        },
+        "newText": edit.replacement,
+    }
@@ -1,5 +1,14 @@
+from novaedit.model.cancellation import CancelToken, GenerationCancelled
 from novaedit.model.config import ModelConfig
-from novaedit.model.modeling_novaedit import NovaEditModel, PatchEdit
+from novaedit.model.modeling_novaedit import NovaEditModel, PatchEdit, PatchRequest
 from novaedit.model.tokenization_novaedit import NovaEditTokenizer
 
-__all__ = ["ModelConfig", "NovaEditModel", "PatchEdit", "NovaEditTokenizer"]
+__all__ = [
+    "CancelToken",
+    "GenerationCancelled",
+    "ModelConfig",
+    "NovaEditModel",
+    "PatchEdit",
+    "PatchRequest",
+    "NovaEditTokenizer",
+]
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import threading
+from typing import Optional
+
+
+class GenerationCancelled(RuntimeError):
+    """Raised when a patch request is cancelled before generation finishes."""
+
+
+class CancelToken:
+    """Thread-safe flag a caller sets to stop work on a request it no longer needs.
+
+    Model backends poll it cooperatively: the HF decode loops through their
+    stopping criteria after every step, the heuristics between rules.
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+
+def is_cancelled(token: Optional[CancelToken]) -> bool:
+    return token is not None and token.cancelled
+
+
+def raise_if_cancelled(token: Optional[CancelToken]) -> None:
+    if is_cancelled(token):
+        raise GenerationCancelled("Patch request was cancelled")
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from novaedit.model.config import ModelConfig
+
+# Bytes per weight and per activation/cache value in full precision.
+FLOAT_BYTES = 4
+# Python, torch, the tokenizer and the server itself, before any weights.
+RUNTIME_OVERHEAD_BYTES = 512 * 1024 * 1024
+# The server's default micro-batch cap; larger batches mostly add latency.
+DEFAULT_BATCH_CAP = 8
+
+
+@dataclass
+class RequestCost:
+    """Estimated memory one in-flight sequence needs, in bytes."""
+
+    kv_cache: int
+    prefill: int
+
+    @property
+    def total(self) -> int:
+        return self.kv_cache + self.prefill
+
+
+@dataclass
+class CapacityPlan:
+    memory_budget: int
+    weights: int
+    overhead: int
+    per_request: int
+    max_concurrent: int
+    max_batch_size: int
+
+    def to_dict(self) -> Dict[str, int]:
+        return asdict(self)
+
+
+def parameter_counts(config: ModelConfig) -> Dict[str, int]:
+    """Parameters of a `NovaEditForCausalLM` with `config`, split into linear and other weights.
+
+    Linear layers are the ones int8 quantization packs; embeddings and norms
+    stay in full precision.
+    """
+    d, ff, vocab = config.d_model, config.d_ff, config.vocab_size
+    kv_dim = config.n_kv_heads * (d // config.n_heads)
+    per_layer = d * (d + 2 * kv_dim) + d * d + d * 2 * ff + ff * d
+    return {
+        "linear": config.n_layers * per_layer + d * vocab,
+        "other": vocab * d + (2 * config.n_layers + 1) * d,
+    }
+
+
+def weight_bytes(config: ModelConfig, quantization: str = "none") -> int:
+    counts = parameter_counts(config)
+    linear_bytes = 1 if quantization == "int8" else FLOAT_BYTES
+    return counts["linear"] * linear_bytes + counts["other"] * FLOAT_BYTES
+
+
+def request_cost(
+    config: ModelConfig, prompt_tokens: int, new_tokens: int, preallocated: bool = False
+) -> RequestCost:
+    """Memory one sequence of `prompt_tokens` + `new_tokens` tokens costs while it decodes.
+
+    The KV cache holds keys and values for every layer and position; the
+    native model preallocates it for `max_seq_len` positions (`preallocated`),
+    HF caches grow with the sequence. Prefill is the peak working set of the
+    first forward pass: per-token layer activations and logits, plus the
+    attention scores of the unfused CPU attention path.
+    """
+    tokens = min(prompt_tokens + new_tokens, config.max_seq_len)
+    prompt = min(prompt_tokens, config.max_seq_len)
+    kv_dim = config.n_kv_heads * (config.d_model // config.n_heads)
+    cached = config.max_seq_len if preallocated else tokens
+    kv_cache = 2 * config.n_layers * kv_dim * cached * FLOAT_BYTES
+    per_token = 3 * config.d_ff + 4 * config.d_model + config.vocab_size
+    prefill = (prompt * per_token + config.n_heads * prompt * prompt) * FLOAT_BYTES
+    return RequestCost(kv_cache=kv_cache, prefill=prefill)
+
+
+def plan_capacity(
+    config: ModelConfig,
+    memory_budget: int,
+    prompt_tokens: int,
+    new_tokens: int,
+    quantization: str = "none",
+    preallocated: bool = False,
+    overhead: int = RUNTIME_OVERHEAD_BYTES,
+    batch_cap: int = DEFAULT_BATCH_CAP,
+) -> CapacityPlan:
+    """Largest concurrency and batch size whose sequences fit in `memory_budget` bytes.
+
+    Raises ValueError when the weights and runtime alone do not fit.
+    """
+    weights = weight_bytes(config, quantization)
+    per_request = request_cost(config, prompt_tokens, new_tokens, preallocated).total
+    free = memory_budget - weights - overhead
+    if free < per_request:
+        raise ValueError(
+            f"A budget of {memory_budget} bytes leaves no room for a request: weights take "
+            f"{weights}, runtime {overhead} and one request {per_request}"
+        )
+    max_concurrent = free // per_request
+    return CapacityPlan(
+        memory_budget=memory_budget,
+        weights=weights,
+        overhead=overhead,
+        per_request=per_request,
+        max_concurrent=max_concurrent,
+        max_batch_size=min(max_concurrent, batch_cap),
+    )
+
+
+# Field names for each `ModelConfig` entry across common Hugging Face decoder configs,
+# Llama-style first, then GPT-2/GPT-J and other spellings.
+_HF_FIELDS = {
+    "d_model": ("hidden_size", "n_embd", "d_model"),
+    "n_layers": ("num_hidden_layers", "n_layer", "num_layers"),
+    "n_heads": ("num_attention_heads", "n_head", "num_heads"),
+    "n_kv_heads": ("num_key_value_heads", "multi_query_group_num"),
+    "d_ff": ("intermediate_size", "n_inner", "ffn_dim", "d_ff"),
+    "vocab_size": ("vocab_size",),
+    "max_seq_len": ("max_position_embeddings", "n_positions", "max_sequence_length"),
+}
+
+
+def _hf_field(hf_config: Any, name: str) -> Optional[int]:
+    for field in _HF_FIELDS[name]:
+        value = getattr(hf_config, field, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def config_from_hf(hf_config: Any) -> ModelConfig:
+    """Map a Hugging Face decoder config onto a `ModelConfig`.
+
+    Missing KV heads default to full multi-head attention and a missing
+    feed-forward width to the usual `4 * d_model`. Raises ValueError when the
+    config lacks any of the other fields.
+    """
+    fields = {name: _hf_field(hf_config, name) for name in _HF_FIELDS}
+    fields["n_kv_heads"] = fields["n_kv_heads"] or fields["n_heads"]
+    if fields["d_ff"] is None and fields["d_model"] is not None:
+        fields["d_ff"] = 4 * fields["d_model"]
+    missing = sorted(name for name, value in fields.items() if value is None)
+    if missing:
+        kind = getattr(hf_config, "model_type", None) or type(hf_config).__name__
+        raise ValueError(f"unsupported config {kind!r}: no {', '.join(missing)}")
+    return ModelConfig(**fields)
+
+
+def model_config(model: Any) -> Optional[ModelConfig]:
+    """Architecture of a loaded `NovaEditModel`; None for the heuristic backend."""
+    if model.backend == "native":
+        return model.config
+    if model.backend == "hf":
+        return config_from_hf(model._hf_model.config)
+    return None
@@ -4,8 +4,6 @@ from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict
 
-import yaml
-
 
 @dataclass
 class ModelConfig:
@@ -24,6 +22,8 @@ class ModelConfig:
 
     @classmethod
     def from_yaml(cls, path: str | Path) -> "ModelConfig":
+        import yaml
+
         data: Dict[str, Any] = yaml.safe_load(Path(path).read_text())
         return cls(**data)
 
@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import ast
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TypeVar
+
+from novaedit.model.generation import patch_token_budget
+
+# "... at line 41", "line 41, in f", "app.py:41:5: F821 ..."
+LINE_NUMBER_PATTERN = re.compile(r"\bline (\d+)|:(\d+):\d+\b")
+SCOPE_NODES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+Edit = TypeVar("Edit")
+# Token counts for a batch of texts, measured with the model's tokenizer.
+TokenCounter = Callable[[List[str]], List[int]]
+
+
+@dataclass
+class PromptContext:
+    """The lines of a request that go into the prompt, with the diagnostics about them.
+
+    `start_line`/`end_line` are absolute 1-based file lines, as in the
+    request, so the prompt keeps the line numbering the model was trained on.
+    """
+
+    start_line: int
+    end_line: int
+    snippet: str
+    diagnostics: List[str]
+    tokens: int
+    narrowed: bool = False
+    truncated: bool = False
+
+    def to_absolute(self, edits: Sequence[Edit]) -> List[Edit]:
+        """Keep the edits that fall on the prompt's lines.
+
+        The prompt numbers lines as the file does, so hunks are already
+        absolute; one outside `start_line..end_line` would touch code the model
+        never saw and is dropped. A `truncated` prompt shows only part of its
+        line, so every hunk is dropped rather than cutting off the unseen rest.
+        """
+        if self.truncated:
+            return []
+        first, last = self.start_line, self.end_line
+        return [e for e in edits if _fits(e.start_line, e.end_line, first, last)]  # type: ignore
+
+
+def diagnostic_lines(diagnostics: Sequence[str]) -> List[Optional[int]]:
+    """The file line each diagnostic points at, or None when it names no line."""
+    lines: List[Optional[int]] = []
+    for diagnostic in diagnostics:
+        match = LINE_NUMBER_PATTERN.search(diagnostic)
+        lines.append(int(match.group(1) or match.group(2)) if match else None)
+    return lines
+
+
+def enclosing_scope(tree: ast.AST, line: int) -> Optional[Tuple[int, int]]:
+    """Lines of the innermost function or class around `line`, decorators included."""
+    best: Optional[Tuple[int, int]] = None
+    for node in ast.walk(tree):
+        if not isinstance(node, SCOPE_NODES) or node.end_lineno is None:
+            continue
+        start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+        if start <= line <= node.end_lineno and (
+            best is None or node.end_lineno - start < best[1] - best[0]
+        ):
+            best = (start, node.end_lineno)
+    return best
+
+
+def context_token_budget(available: int) -> int:
+    """Most region tokens that, with their patch budget, fit in `available` positions."""
+    low, high = 0, max(0, available)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if mid + patch_token_budget(mid) <= available:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def build_context(
+    code: str,
+    start_line: int,
+    end_line: int,
+    diagnostics: Sequence[str],
+    count_tokens: TokenCounter,
+    budget: Optional[int],
+    adapter: Any = None,
+    tree: Any = None,
+) -> PromptContext:
+    """Pick the lines of `start_line..end_line` worth `budget` tokens at most.
+
+    A region that fits is used whole. Otherwise the window starts at the lines
+    the diagnostics point at (the first diagnostic's line when they do not all
+    fit, the region's first line without any), grows to the innermost function
+    or class around them (from `tree`, or else `adapter.parse_ast`), then into
+    the rest of the region, one line above and one below at a time.
+    Diagnostics about lines left out are dropped from the prompt.
+    """
+    lines = code.splitlines()
+    snippet = "\n".join(lines[start_line - 1 : end_line])
+    tokens = count_tokens([snippet])[0]
+    first, last = max(1, start_line), min(len(lines), end_line)
+    if budget is None or tokens <= budget:
+        return PromptContext(start_line, end_line, snippet, list(diagnostics), tokens)
+    if last <= first:
+        return _truncate(lines, first, diagnostics, count_tokens, budget)
+    # One token for each line's newline.
+    costs = [n + 1 for n in count_tokens(lines[first - 1 : last])]
+
+    def cost(line: int) -> int:
+        return costs[line - first]
+
+    pointed = diagnostic_lines(diagnostics)
+    targets = [n for n in pointed if n is not None and first <= n <= last] or [first]
+    low, high = min(targets), max(targets)
+    used = sum(cost(n) for n in range(low, high + 1))
+    if used > budget:
+        # Too far apart to prompt together: focus on the first diagnostic.
+        low = high = targets[0]
+        used = cost(low)
+        if used > budget:
+            return _truncate(lines, low, diagnostics, count_tokens, budget)
+    if tree is None and adapter is not None:
+        tree = adapter.parse_ast(code)
+    scopes = [enclosing_scope(tree, n) for n in targets if low <= n <= high] if tree else []
+    scopes = [scope for scope in scopes if scope is not None]
+    scope_low = max(first, min([low] + [s[0] for s in scopes]))
+    scope_high = min(last, max([high] + [s[1] for s in scopes]))
+    low, high, used = _grow(low, high, scope_low, scope_high, used, cost, budget)
+    low, high, used = _grow(low, high, first, last, used, cost, budget)
+    kept = [d for d, n in zip(diagnostics, pointed) if n is None or low <= n <= high]
+    return PromptContext(low, high, "\n".join(lines[low - 1 : high]), kept, used, narrowed=True)
+
+
+def _truncate(
+    lines: Sequence[str],
+    line: int,
+    diagnostics: Sequence[str],
+    count_tokens: TokenCounter,
+    budget: int,
+) -> PromptContext:
+    """The longest prefix of one over-long `line` that fits in `budget` tokens."""
+    text = lines[line - 1]
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens([text[:mid]])[0] + 1 <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    pointed = diagnostic_lines(diagnostics)
+    kept = [d for d, n in zip(diagnostics, pointed) if n is None or n == line]
+    used = count_tokens([text[:low]])[0] + 1
+    return PromptContext(line, line, text[:low], kept, used, narrowed=True, truncated=True)
+
+
+def _grow(
+    low: int,
+    high: int,
+    floor: int,
+    ceiling: int,
+    used: int,
+    cost: Callable[[int], int],
+    budget: int,
+) -> Tuple[int, int, int]:
+    while True:
+        grew = False
+        if low > floor and used + cost(low - 1) <= budget:
+            low -= 1
+            used += cost(low)
+            grew = True
+        if high < ceiling and used + cost(high + 1) <= budget:
+            high += 1
+            used += cost(high)
+            grew = True
+        if not grew:
+            return low, high, used
+
+
+def _fits(start: int, end: int, first: int, last: int) -> bool:
+    return first <= start <= end <= last
@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from novaedit.model.cancellation import CancelToken, is_cancelled
+
+PATCH_END = "<PATCH_END>"
+HUNK_HEADER_PATTERN = re.compile(r"^@@ (\d+)-(\d+)$")
+MIN_NEW_TOKENS = 32
+MAX_NEW_TOKENS = 1024
+DRAFT_TOKENS = 10
+DRAFT_MAX_NGRAM = 3
+
+
+def patch_token_budget(region_tokens: int, cap: int = MAX_NEW_TOKENS) -> int:
+    """Decode budget for a patch over a region of `region_tokens` tokens.
+
+    A patch repeats each replaced line as `- old` and emits its replacement as
+    `+ new`, so it is roughly twice the region plus headers and slack.
+    """
+    return max(MIN_NEW_TOKENS, min(cap, 2 * region_tokens + MIN_NEW_TOKENS))
+
+
+def patch_is_finished(text: str, max_edits: Optional[int] = None) -> bool:
+    """True once `text` holds a complete patch or can no longer become a valid one.
+
+    That is: the `<PATCH_END>` terminator appeared, a completed line starts
+    with `@@` but is not a well-formed `@@ start-end` header, or a header for
+    hunk number `max_edits + 1` started.
+    """
+    if PATCH_END in text:
+        return True
+    *complete, last = text.split("\n")
+    malformed, hunks = _scan_lines(complete, 0)
+    return malformed or _over_limit(hunks, last, max_edits)
+
+
+def _scan_lines(lines: Sequence[str], hunks: int) -> Tuple[bool, int]:
+    """Check the hunk headers among complete `lines`: (a header is malformed, hunks so far)."""
+    for line in lines:
+        header = line.strip()
+        if not header.startswith("@@"):
+            continue
+        match = HUNK_HEADER_PATTERN.match(header)
+        if not match or int(match.group(1)) < 1 or int(match.group(2)) < int(match.group(1)):
+            return True, hunks
+        hunks += 1
+    return False, hunks
+
+
+def _over_limit(hunks: int, partial_line: str, max_edits: Optional[int]) -> bool:
+    if max_edits is None:
+        return False
+    if partial_line.lstrip().startswith("@@"):
+        hunks += 1
+    return hunks > max_edits
+
+
+class PatchTracker:
+    """`patch_is_finished` over a growing list of generated token ids.
+
+    Each `update` decodes only the tokens since the last completed line, not
+    the whole output, so checking every decode step stays linear in the
+    output length. Decoding from a line start keeps multi-token characters
+    intact.
+    """
+
+    def __init__(self, tokenizer, max_edits: Optional[int] = None):
+        self.tokenizer = tokenizer
+        self.max_edits = max_edits
+        self.finished = False
+        self._line_start = 0
+        self._hunks = 0
+
+    def update(self, ids) -> bool:
+        """True once the text of `ids` (all generated so far) is a finished patch."""
+        if self.finished:
+            return True
+        text = self.tokenizer.decode(ids[self._line_start :])
+        *complete, last = text.split("\n")
+        malformed, hunks = _scan_lines(complete, self._hunks)
+        self.finished = (
+            PATCH_END in text or malformed or _over_limit(hunks, last, self.max_edits)
+        )
+        if complete and not last:
+            # The tokens end on a line break: later calls start after them.
+            self._line_start, self._hunks = len(ids), hunks
+        return self.finished
+
+
+class PatchStoppingCriteria:
+    """Per-sequence stopping criterion for HF `generate` based on the patch DSL.
+
+    A sequence also stops as soon as its cancel token (if any) is cancelled.
+    HF only calls its criteria, so this does not subclass `StoppingCriteria`
+    and the module imports without transformers.
+    """
+
+    def __init__(
+        self,
+        tokenizer,
+        prompt_length: int,
+        max_edits: Sequence[Optional[int]],
+        cancel: Optional[Sequence[Optional[CancelToken]]] = None,
+    ):
+        self.prompt_length = prompt_length
+        self.trackers = [PatchTracker(tokenizer, limit) for limit in max_edits]
+        self.cancel: List[Optional[CancelToken]] = list(cancel or [None] * len(self.trackers))
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = [
+            is_cancelled(token) or tracker.update(row[self.prompt_length :])
+            for row, tracker, token in zip(input_ids, self.trackers, self.cancel)
+        ]
+        return input_ids.new_tensor(done).bool()
+
+
+@dataclass
+class SpeculativeStats:
+    """Running counters for prompt-lookup speculative decoding."""
+
+    drafted: int = 0
+    accepted: int = 0
+    verify_steps: int = 0
+    generated: int = 0
+
+    @property
+    def acceptance_rate(self) -> float:
+        return self.accepted / self.drafted if self.drafted else 0.0
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "drafted": self.drafted,
+            "accepted": self.accepted,
+            "verify_steps": self.verify_steps,
+            "generated": self.generated,
+            "acceptance_rate": self.acceptance_rate,
+            "tokens_per_step": self.generated / self.verify_steps if self.verify_steps else 0.0,
+        }
+
+
+def find_draft(
+    tokens: List[int], max_ngram: int = DRAFT_MAX_NGRAM, limit: int = DRAFT_TOKENS
+) -> List[int]:
+    """Propose up to `limit` next tokens by n-gram lookup into `tokens` itself.
+
+    The trailing n-gram (longest first, down to a single token) is searched for
+    earlier in the sequence; the tokens that followed its most recent earlier
+    occurrence are the draft. Patch DSL output is mostly copied from the code
+    in the prompt, so these drafts are often right.
+    """
+    if limit <= 0:
+        return []
+    for n in range(min(max_ngram, len(tokens) - 1), 0, -1):
+        tail = tokens[-n:]
+        last = tail[-1]
+        for start in range(len(tokens) - n - 1, -1, -1):
+            if tokens[start + n - 1] == last and tokens[start : start + n] == tail:
+                return tokens[start + n : start + n + limit]
+    return []
+
+
+def prompt_lookup_generate(
+    model,
+    input_ids,
+    max_new_tokens: int,
+    eos_token_id: Optional[int] = None,
+    should_stop: Optional[Callable[[List[int]], bool]] = None,
+    stats: Optional[SpeculativeStats] = None,
+    num_draft_tokens: int = DRAFT_TOKENS,
+    max_ngram: int = DRAFT_MAX_NGRAM,
+    past_key_values: Any = None,
+) -> Tuple[List[int], Any]:
+    """Greedy decoding of one sequence, verifying prompt-lookup drafts in one pass.
+
+    Each step feeds the last accepted token plus a draft through the model
+    with the KV cache; the longest draft prefix matching the model's own
+    argmax is accepted, together with the model's next token, and the cache
+    entries of rejected draft tokens are dropped. The output is identical to
+    plain greedy decoding.
+
+    `past_key_values` may already cover a prefix of `input_ids` (see
+    `PrefixCache`); only the rest of the prompt is prefilled. Returns the new
+    token ids and the KV cache, which covers the prompt and all but the last
+    new token.
+    """
+    import torch
+
+    stats = stats if stats is not None else SpeculativeStats()
+    tokens: List[int] = input_ids[0].tolist()
+    new_tokens: List[int] = []
+
+    def _append(token: int) -> bool:
+        """Record an accepted token; True when decoding should stop."""
+        new_tokens.append(token)
+        tokens.append(token)
+        if len(new_tokens) >= max_new_tokens or token == eos_token_id:
+            return True
+        return should_stop is not None and should_stop(new_tokens)
+
+    with torch.no_grad():
+        cached = past_key_values.get_seq_length() if past_key_values is not None else 0
+        output = model(
+            input_ids=input_ids[:, cached:], past_key_values=past_key_values, use_cache=True
+        )
+        cache = output.past_key_values
+        next_token = int(output.logits[0, -1].argmax())
+        while True:
+            if _append(next_token):
+                break
+            budget = min(num_draft_tokens, max_new_tokens - len(new_tokens))
+            draft = find_draft(tokens, max_ngram, budget)
+            step = torch.tensor([[next_token] + draft], device=input_ids.device)
+            output = model(input_ids=step, past_key_values=cache, use_cache=True)
+            cache = output.past_key_values
+            predicted = output.logits[0].argmax(-1).tolist()
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == predicted[accepted]:
+                accepted += 1
+            stats.verify_steps += 1
+            stats.drafted += len(draft)
+            stats.accepted += accepted
+            if any(_append(token) for token in draft[:accepted]):
+                break
+            rejected = len(draft) - accepted
+            if rejected:
+                cache.crop(-rejected)
+            next_token = int(predicted[accepted])
+    stats.generated += len(new_tokens)
+    return new_tokens, cache
@@ -0,0 +1,28 @@
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional, Protocol
+
+
+class ModelObserver(Protocol):
+    """Receives per-stage timings, token counts and cascade tiers from `NovaEditModel`."""
+
+    def stage(self, name: str, seconds: float) -> None: ...
+
+    def tokens(self, prompt_tokens: int, generated_tokens: int) -> None: ...
+
+    def tier(self, name: str) -> None: ...
+
+
+@contextmanager
+def timed(observer: Optional[ModelObserver], name: str) -> Iterator[None]:
+    """Report the wall time of the block to `observer` as stage `name`; free without one."""
+    if observer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observer.stage(name, time.perf_counter() - start)
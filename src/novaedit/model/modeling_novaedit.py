@@ -1,28 +1,59 @@
 from __future__ import annotations
 
+import copy
 import difflib
 import re
-from dataclasses import dataclass
-from typing import Any, List, Sequence, Tuple
-
-try:
-    from transformers import AutoModelForCausalLM, AutoTokenizer  # type: ignore
-    import torch  # type: ignore
-except Exception:  # pragma: no cover - optional dependency
-    AutoModelForCausalLM = None  # type: ignore
-    AutoTokenizer = None  # type: ignore
-    torch = None  # type: ignore
-
-from novaedit.languages.python.adapter import PythonAdapter
-from novaedit.languages.javascript.adapter import JavaScriptAdapter
-from novaedit.languages.python.patch_apply import apply_patch_dsl
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, List, Sequence, Tuple
+
+from novaedit.languages import adapter_for
+from novaedit.languages.python.patch_apply import PatchStreamParser, apply_patch_dsl
+from novaedit.model.cancellation import (
+    CancelToken,
+    GenerationCancelled,
+    is_cancelled,
+    raise_if_cancelled,
+)
 from novaedit.model.config import ModelConfig, load_default_config
+from novaedit.model.context import PromptContext, build_context, context_token_budget
+from novaedit.model.instrumentation import ModelObserver, timed
+from novaedit.model.prefix_cache import PrefixCache
+from novaedit.model.quantization import (
+    check_quant_mode,
+    load_quantized,
+    quantize_model,
+    quantized_cache_path,
+    save_quantized,
+)
+from novaedit.model.generation import (
+    DRAFT_TOKENS,
+    PATCH_END,
+    PatchStoppingCriteria,
+    PatchTracker,
+    SpeculativeStats,
+    patch_token_budget,
+    prompt_lookup_generate,
+)
+from novaedit.model.weights import load_mmapped, safetensors_files
+
+# torch and transformers are imported by the methods that need them, so the
+# heuristic backend (and anything importing this module) starts without them.
 
 
 UNDEFINED_NAME_PATTERN = re.compile(r"name '([^']+)' is not defined")
 MISSING_IMPORT_PATTERN = re.compile(r"No module named '([^']+)'|undefined name '([^']+)'")
 NAME_TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
 FUNC_DEF_PATTERN = re.compile(r"^def\s+([A-Za-z_][A-Za-z0-9_]*)\((.*)\):")
+# Instructions that do not ask for a change by themselves: a clean region stays as it is.
+HARMLESS_INSTRUCTION_PATTERN = re.compile(
+    r"^\s*(?:(?:please\s+)?(?:fix|check|review)"
+    r"(?:\s+(?:it|this|bugs?|errors?|issues?|problems?|diagnostics))?\s*[.!]?)?\s*$",
+    re.IGNORECASE,
+)
+EDIT_TOKEN = "<EDIT>"
+NO_EDIT_TOKEN = "<NO_EDIT>"
 
 
 @dataclass
@@ -32,12 +63,87 @@ class PatchEdit:
     replacement: str
 
 
+@dataclass
+class PatchRequest:
+    code: str
+    start_line: int
+    end_line: int
+    diagnostics: List[str] = field(default_factory=list)
+    instruction: str = ""
+    max_edits: int | None = None
+    cancel: CancelToken | None = None
+    # The adapter's `parse_ast(code)` when the caller already has it, e.g. cached
+    # per document version; it is parsed on demand otherwise.
+    tree: Any = None
+
+
+PatchResult = Tuple[List[PatchEdit], str]
+
+
+@dataclass
+class CascadeStats:
+    """Requests answered by each tier of the NO_EDIT-then-heuristics-then-model cascade."""
+
+    no_edit: int = 0
+    heuristic: int = 0
+    model: int = 0
+
+    def record(self, tier: str) -> None:
+        setattr(self, tier, getattr(self, tier) + 1)
+
+    def merged(self, other: "CascadeStats") -> "CascadeStats":
+        return CascadeStats(
+            self.no_edit + other.no_edit, self.heuristic + other.heuristic, self.model + other.model
+        )
+
+    def to_dict(self) -> dict:
+        total = self.no_edit + self.heuristic + self.model
+        return {
+            "no_edit": self.no_edit,
+            "heuristic": self.heuristic,
+            "model": self.model,
+            "no_edit_rate": self.no_edit / total if total else 0.0,
+            "heuristic_rate": self.heuristic / total if total else 0.0,
+        }
+
+
 class NovaEditModel:
     """Heuristic baseline with optional Hugging Face generation hook.
 
     - By default runs lightweight heuristics so the repo is runnable without weights.
     - If `hf_model_id` is provided and transformers is installed, uses the HF model
       to produce a textual patch DSL, then parses it.
+    - If `native_model_dir` is provided, loads a `NovaEditForCausalLM` checkpoint
+      (see `novaedit.model.transformer`) and decodes it with the same prompt and
+      patch parsing as the HF backend.
+    - With `quantization="int8"` the linear layers of either model are quantized
+      to int8 at load time for CPU serving; `quant_cache_dir` keeps the quantized
+      model on disk so later startups skip loading full-precision weights.
+    - With `cascade=True` a loaded model only runs when the heuristics are not
+      confident: requests whose diagnostics are all fixed by a rule (typo'd
+      names, missing imports) are answered by the rules alone. Requests
+      answered per tier are counted in `cascade_stats` and reported to
+      `observer`.
+    - With `precheck=True` requests with no diagnostics, no instruction beyond
+      a generic "fix", and code the language adapter finds clean get an empty
+      patch without decoding. Model backends whose tokenizer has `<NO_EDIT>`
+      and `<EDIT>` additionally need one forward pass over the prompt to rank
+      `<NO_EDIT>` first. Skipped requests count as the `no_edit` tier.
+    - With `mmap_weights=True` unquantized CPU weights are memory-mapped from the
+      checkpoint's safetensors files instead of copied into process memory, so
+      server processes loading the same checkpoint share one copy of them.
+    - With `speculative=True` the HF backend drafts tokens by n-gram lookup into
+      the prompt and verifies them in one forward pass (see `speculative_stats`).
+    - With `prefix_cache_bytes > 0` single-request HF decodes reuse the KV cache of
+      the longest prompt prefix seen recently and only prefill the new suffix.
+    - Model prompts hold as much of the requested region as fits the model's
+      context window next to the patch, or `max_prompt_tokens` when set: long
+      regions are narrowed to the lines the diagnostics point at, their
+      enclosing function or class and then their surroundings (see
+      `novaedit.model.context`). Generated hunks outside those lines are dropped.
+    - Setting `observer` (see `novaedit.model.instrumentation`) reports the time
+      spent per stage (prompt, tokenize, generate, parse, patch_dsl, heuristics,
+      precheck) and the prompt/generated token counts.
     """
 
     def __init__(
@@ -46,22 +152,66 @@ class NovaEditModel:
         language: str = "python",
         hf_model_id: str | None = None,
         device: str | None = None,
+        speculative: bool = False,
+        prefix_cache_bytes: int = 0,
+        native_model_dir: str | None = None,
+        quantization: str | None = None,
+        quant_cache_dir: str | None = None,
+        mmap_weights: bool = False,
+        cascade: bool = False,
+        precheck: bool = False,
+        max_prompt_tokens: int = 0,
     ):
-        self.config = config or load_default_config()
+        self._config = config
         self.language = language
-        if language == "python":
-            self.adapter = PythonAdapter()
-        elif language == "javascript":
-            self.adapter = JavaScriptAdapter()
-        else:
-            self.adapter = None
+        self.adapter = adapter_for(language)
         self.hf_model_id = hf_model_id
-        self.device = device or ("cuda" if torch and torch.cuda.is_available() else "cpu")
+        self.quantization = check_quant_mode(quantization)
+        self.quant_cache_dir = quant_cache_dir
+        self.mmap_weights = mmap_weights
+        # Whether the loaded weights actually are memory-mapped.
+        self.weights_mmapped = False
+        quantized = self.quantization != "none"
+        uses_weights = bool(native_model_dir or hf_model_id)
+        self.device = device or _default_device(prefer_cuda=uses_weights and not quantized)
+        if quantized and self.device != "cpu":
+            raise ValueError(f"{self.quantization} quantization is only supported on CPU")
         self._hf_model = None
         self._hf_tokenizer = None
-        if hf_model_id:
+        self.observer: ModelObserver | None = None
+        self.backend = "heuristic"
+        self.speculative = speculative
+        self.speculative_stats = SpeculativeStats()
+        self.cascade = cascade
+        self.precheck = precheck
+        self.max_prompt_tokens = max_prompt_tokens
+        self.cascade_stats = CascadeStats()
+        self.prefix_cache = PrefixCache(prefix_cache_bytes) if prefix_cache_bytes > 0 else None
+        if native_model_dir:
+            self._load_native_model(native_model_dir)
+        elif hf_model_id:
             self._load_hf_model(hf_model_id)
 
+    @property
+    def config(self) -> ModelConfig:
+        # The default config is only read from YAML when something asks for it.
+        if self._config is None:
+            self._config = load_default_config()
+        return self._config
+
+    @config.setter
+    def config(self, config: ModelConfig) -> None:
+        self._config = config
+
+    def for_language(self, language: str) -> "NovaEditModel":
+        """Return a model for `language` that shares this one's weights and caches."""
+        if language == self.language:
+            return self
+        clone = copy.copy(self)
+        clone.language = language
+        clone.adapter = adapter_for(language)
+        return clone
+
     def generate_patch(
         self,
         code: str,
@@ -69,25 +219,123 @@ class NovaEditModel:
         end_line: int,
         diagnostics: Sequence[str] | None = None,
         instruction: str | None = None,
-    ) -> Tuple[List[PatchEdit], str]:
-        """Return structured edits and textual patch DSL."""
-        diagnostics = diagnostics or []
-        instruction = instruction or ""
+        max_edits: int | None = None,
+        cancel: CancelToken | None = None,
+        tree: Any = None,
+    ) -> PatchResult:
+        """Return structured edits and textual patch DSL.
+
+        With `max_edits` set, at most that many edits are returned and the HF
+        backend stops decoding as soon as the next hunk would exceed it. Once
+        `cancel` is cancelled, work stops at the next decode step (or heuristic
+        rule) and `GenerationCancelled` is raised. `tree` is the adapter's parse
+        of `code`, when the caller has one cached.
+        """
+        request = PatchRequest(
+            code,
+            start_line,
+            end_line,
+            list(diagnostics or []),
+            instruction or "",
+            max_edits,
+            cancel,
+            tree,
+        )
+        result = self._cascade(request)
+        if result is not None:
+            return result
+        if self._hf_model:
+            result = self._generate_with_hf_batch([request])[0]
+            raise_if_cancelled(cancel)
+            return result
+        return self._generate_with_heuristics(request)
+
+    def stream_patch(
+        self,
+        code: str,
+        start_line: int,
+        end_line: int,
+        diagnostics: Sequence[str] | None = None,
+        instruction: str | None = None,
+        max_edits: int | None = None,
+        cancel: CancelToken | None = None,
+        tree: Any = None,
+    ) -> Iterator[PatchEdit]:
+        """Yield edits one hunk at a time, as soon as each hunk is complete.
+
+        The HF backend decodes in a background thread and parses the patch DSL
+        incrementally; the native and heuristic backends yield their edits once
+        computed. Cancelling `cancel` ends the stream early without an error.
+        """
+        request = PatchRequest(
+            code,
+            start_line,
+            end_line,
+            list(diagnostics or []),
+            instruction or "",
+            max_edits,
+            cancel,
+            tree,
+        )
+        try:
+            result = self._cascade(request)
+        except GenerationCancelled:
+            return
+        if result is not None:
+            yield from result[0]
+            return
+        if self.backend == "native":
+            edits, _ = self._generate_with_hf_batch([request])[0]
+            yield from edits
+            return
         if self._hf_model:
-            return self._generate_with_hf(code, start_line, end_line, diagnostics, instruction)
+            yield from self._stream_with_hf(request)
+            return
+        try:
+            edits, _ = self._generate_with_heuristics(request)
+        except GenerationCancelled:
+            return
+        yield from edits
 
-        lines = code.splitlines()
-        slice_start = max(1, start_line)
-        slice_end = min(len(lines), end_line)
-        snippet = "\n".join(lines[slice_start - 1 : slice_end])
+    @property
+    def supports_batching(self) -> bool:
+        """True when several requests can share one decode call."""
+        return self.backend == "hf" and not self.speculative
 
-        edits: List[PatchEdit] = []
-        edits.extend(self._fix_name_errors(snippet, slice_start, diagnostics))
-        edits.extend(self._add_missing_imports(snippet, slice_start, diagnostics))
+    def generate_patch_batch(self, requests: Sequence[PatchRequest]) -> List[PatchResult]:
+        """Return one `(edits, patch_dsl)` pair per request, in order.
 
-        if not edits and instruction:
-            edits.extend(self._style_pass(snippet, slice_start, instruction))
+        The HF backend left-pads all prompts into a single `generate` call; the
+        native and heuristic backends, and speculative HF decoding, simply run
+        the requests one after another.
+        Requests the pre-check or cascade answer are left out of the decode.
+        A request cancelled through its `cancel` token gets an empty result
+        without affecting the rest of the batch.
+        """
+        if self._hf_model and not (self.cascade or self.precheck):
+            return self._generate_with_hf_batch(requests)
+        answered: List[PatchResult | None] = []
+        for request in requests:
+            try:
+                answered.append(self._cascade(request))
+            except GenerationCancelled:
+                answered.append(([], ""))
+        escalated = [i for i, result in enumerate(answered) if result is None]
+        if escalated and self._hf_model:
+            decoded = self._generate_with_hf_batch([requests[i] for i in escalated])
+            for i, result in zip(escalated, decoded):
+                answered[i] = result
+        elif escalated:
+            for i in escalated:
+                try:
+                    answered[i] = self._generate_with_heuristics(requests[i])
+                except GenerationCancelled:
+                    answered[i] = ([], "")
+        return answered  # type: ignore[return-value]
 
+    def _generate_with_heuristics(self, request: PatchRequest) -> PatchResult:
+        lines, slice_start, snippet = _region(request)
+        edits, _ = self._rule_edits(request)
         if not edits:
             # Fallback: no-op message to keep the pipeline flowing.
             snippet_lines = snippet.splitlines()
@@ -99,14 +347,119 @@ class NovaEditModel:
                     replacement=snippet + "\n# TODO: review diagnostics above\n",
                 )
             )
+        return self._heuristic_result(lines, edits, request.max_edits)
+
+    def _cascade(self, request: PatchRequest) -> PatchResult | None:
+        """Answer `request` from the cheapest enabled tier; None leaves it to the backend.
+
+        The NO_EDIT pre-check comes first, then (on model backends) the rules
+        when they are confident. The tier that ends up answering is recorded.
+        """
+        if not (self.precheck or self.cascade):
+            return None
+        result: PatchResult | None = None
+        if self.precheck and self._is_clean(request):
+            tier, result = "no_edit", ([], "")
+        elif self._hf_model is None:
+            tier = "heuristic"
+        elif self.cascade:
+            edits, confident = self._rule_edits(request)
+            tier = "heuristic" if edits and confident else "model"
+            if tier == "heuristic":
+                lines, _, _ = _region(request)
+                result = self._heuristic_result(lines, edits, request.max_edits)
+        else:
+            tier = "model"
+        self.cascade_stats.record(tier)
+        if self.observer is not None:
+            self.observer.tier(tier)
+        return result
+
+    def _is_clean(self, request: PatchRequest) -> bool:
+        """True when nothing asks for an edit and the adapter (and model) see nothing to fix."""
+        if request.diagnostics or not HARMLESS_INSTRUCTION_PATTERN.match(request.instruction):
+            return False
+        with timed(self.observer, "precheck"):
+            raise_if_cancelled(request.cancel)
+            # The whole file is checked: a region can only be judged in context.
+            if self.adapter is not None and self.adapter.run_diagnostics(
+                request.code, tree=request.tree
+            ):
+                return False
+            if self._hf_model is None:
+                return True
+            return self._ranks_no_edit_first(request)
+
+    def _ranks_no_edit_first(self, request: PatchRequest) -> bool:
+        """One forward pass over the prompt: is `<NO_EDIT>` likelier than `<EDIT>` next?
+
+        Tokenizers without both tokens leave the decision to the adapter. The
+        prompt's KV cache goes into the prefix cache, so a request that does
+        need an edit only prefills it once.
+        """
+        assert self._hf_model and self._hf_tokenizer
+        import torch
+        tokenizer = self._hf_tokenizer
+        ids = tokenizer.convert_tokens_to_ids([NO_EDIT_TOKEN, EDIT_TOKEN])
+        if any(i is None or i == tokenizer.unk_token_id for i in ids):
+            return True
+        prompt = self._format_prompt(self._context(request), request.instruction)
+        input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"].to(self.device)
+        tokens = input_ids[0].tolist()
+        cached, past = self.prefix_cache.lookup(tokens) if self.prefix_cache else (0, None)
+        with torch.no_grad():
+            output = self._hf_model(
+                input_ids=input_ids[:, cached:],
+                past_key_values=past,
+                use_cache=self.prefix_cache is not None,
+            )
+        if self.observer is not None:
+            self.observer.tokens(len(tokens) - cached, 0)
+        if self.prefix_cache is not None and output.past_key_values is not None:
+            self.prefix_cache.store(tokens, output.past_key_values)
+        logits = output.logits[0, -1]
+        return bool(logits[ids[0]] > logits[ids[1]])
+
+    def _rule_edits(self, request: PatchRequest) -> Tuple[List[PatchEdit], bool]:
+        """Edits from the heuristic rules, and whether they confidently cover every diagnostic.
+
+        Guessed fixes (placeholder definitions, the type hint pass) and
+        diagnostics no rule recognises are not confident.
+        """
+        diagnostics, instruction = request.diagnostics, request.instruction
+        _, slice_start, snippet = _region(request)
+        edits: List[PatchEdit] = []
+        with timed(self.observer, "heuristics"):
+            raise_if_cancelled(request.cancel)
+            name_edits, unresolved = self._fix_name_errors(snippet, slice_start, diagnostics)
+            edits.extend(name_edits)
+            raise_if_cancelled(request.cancel)
+            edits.extend(self._add_missing_imports(snippet, slice_start, diagnostics))
+            confident = not unresolved and all(
+                UNDEFINED_NAME_PATTERN.search(d) or MISSING_IMPORT_PATTERN.search(d)
+                for d in diagnostics
+            )
 
-        patch_dsl = build_patch_dsl(lines, edits)
+            if not edits and instruction:
+                raise_if_cancelled(request.cancel)
+                edits.extend(self._style_pass(snippet, slice_start, instruction))
+                confident = False
+        return edits, confident
+
+    def _heuristic_result(
+        self, lines: List[str], edits: List[PatchEdit], max_edits: int | None
+    ) -> PatchResult:
+        edits = edits[:max_edits]
+        with timed(self.observer, "patch_dsl"):
+            patch_dsl = build_patch_dsl(lines, edits)
         return edits, patch_dsl
 
     def _fix_name_errors(
         self, snippet: str, snippet_start_line: int, diagnostics: Sequence[str]
-    ) -> List[PatchEdit]:
+    ) -> Tuple[List[PatchEdit], List[str]]:
+        """Edits for undefined names, and the names only fixed by a guess or not at all."""
         edits: List[PatchEdit] = []
+        unresolved: List[str] = []
         snippet_lines = snippet.splitlines()
         all_names = NAME_TOKEN_PATTERN.findall(snippet)
         defined_names = {name for name in all_names if not name.isupper()}
@@ -117,11 +470,16 @@ class NovaEditModel:
             if not match:
                 continue
             missing = match.group(1)
-            candidate = self._find_best_name_match(missing, defined_names_list)
+            # The undefined name itself appears in the snippet; it is never its own fix.
+            candidates = [name for name in defined_names_list if name != missing]
+            candidate = self._find_best_name_match(missing, candidates)
+            usage = re.compile(rf"\b{re.escape(missing)}\b")
+            if not candidate or not usage.search(snippet):
+                unresolved.append(missing)
             for idx, line in enumerate(snippet_lines):
-                if missing in line:
+                if usage.search(line):
                     absolute_line = snippet_start_line + idx
-                    replacement_line = line.replace(missing, candidate or f"{missing}_value")
+                    replacement_line = usage.sub(candidate or f"{missing}_value", line)
                     edits.append(
                         PatchEdit(
                             start_line=absolute_line,
@@ -141,7 +499,7 @@ class NovaEditModel:
                         replacement=replacement,
                     )
                 )
-        return edits
+        return edits, unresolved
 
     def _add_missing_imports(
         self, snippet: str, snippet_start_line: int, diagnostics: Sequence[str]
@@ -206,49 +564,308 @@ class NovaEditModel:
         return code
 
     def _load_hf_model(self, model_id: str) -> None:
-        if AutoModelForCausalLM is None or AutoTokenizer is None or torch is None:
-            raise ImportError("Install transformers and torch to load Hugging Face models.")
+        try:
+            import torch  # type: ignore  # noqa: F401
+            from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer  # type: ignore
+        except Exception as exc:  # pragma: no cover - optional dependency
+            raise ImportError(
+                "Install transformers and torch to load Hugging Face models."
+            ) from exc
         self._hf_tokenizer = AutoTokenizer.from_pretrained(model_id)
-        self._hf_model = AutoModelForCausalLM.from_pretrained(model_id).to(self.device)
-        self._hf_model.eval()
+        # Batched decoding needs prompts aligned on the right edge.
+        self._hf_tokenizer.padding_side = "left"
+        if self._hf_tokenizer.pad_token_id is None:
+            self._hf_tokenizer.pad_token = self._hf_tokenizer.eos_token
+        self._hf_model = self._prepare_weights(
+            model_id,
+            load=lambda: AutoModelForCausalLM.from_pretrained(model_id),
+            build=lambda: AutoModelForCausalLM.from_config(AutoConfig.from_pretrained(model_id)),
+        )
+        self.backend = "hf"
 
-    def _generate_with_hf(
-        self,
-        code: str,
-        start_line: int,
-        end_line: int,
-        diagnostics: Sequence[str],
-        instruction: str,
-    ) -> Tuple[List[PatchEdit], str]:
+    def _load_native_model(self, model_dir: str) -> None:
+        try:
+            from transformers import PreTrainedTokenizerFast  # type: ignore
+
+            from novaedit.model.transformer import (
+                CONFIG_FILE,
+                TOKENIZER_FILE,
+                NovaEditForCausalLM,
+            )
+        except Exception as exc:  # pragma: no cover - optional dependency
+            raise ImportError(
+                "Install transformers and torch to load native NovaEdit models."
+            ) from exc
+        # Wrapped in the HF tokenizer API so prompt handling is shared with the HF backend.
+        self._hf_tokenizer = PreTrainedTokenizerFast(
+            tokenizer_file=str(Path(model_dir) / TOKENIZER_FILE),
+            bos_token="<bos>",
+            eos_token="<eos>",
+        )
+        self._hf_tokenizer.pad_token = self._hf_tokenizer.eos_token
+        self._hf_model = self._prepare_weights(
+            model_dir,
+            load=lambda: NovaEditForCausalLM.from_pretrained(model_dir),
+            build=lambda: NovaEditForCausalLM(ModelConfig.from_yaml(Path(model_dir) / CONFIG_FILE)),
+        )
+        self.config = self._hf_model.config
+        self.backend = "native"
+
+    def _prepare_weights(self, source: str, load, build):
+        """Load a model with `load()`, quantized if configured, and put it in eval mode.
+
+        With a quantization cache, `build()` (the bare architecture) is used
+        instead to restore previously quantized weights without loading fp32 ones;
+        with `mmap_weights` it is filled with memory-mapped checkpoint tensors.
+        """
+        if self.quantization == "none":
+            if self.mmap_weights and self.device == "cpu":
+                model = load_mmapped(build, safetensors_files(source))
+                if model is not None:
+                    self.weights_mmapped = True
+                    return model.eval()
+            return load().to(self.device).eval()
+        cache_path = (
+            quantized_cache_path(self.quant_cache_dir, source, self.quantization)
+            if self.quant_cache_dir
+            else None
+        )
+        model = load_quantized(cache_path, build) if cache_path else None
+        if model is None:
+            model = quantize_model(load().eval(), self.quantization)
+            if cache_path:
+                save_quantized(model, cache_path)
+        return model.eval()
+
+    def _generate_with_hf_batch(self, requests: Sequence[PatchRequest]) -> List[PatchResult]:
+        assert self._hf_model and self._hf_tokenizer
+        import torch
+        from transformers import StoppingCriteriaList
+        if not requests:
+            return []
+        observer = self.observer
+        with timed(observer, "prompt"):
+            contexts = [self._context(r) for r in requests]
+            prompts = [self._format_prompt(c, r.instruction) for c, r in zip(contexts, requests)]
+            budgets = [self._patch_budget(c) for c in contexts]
+        # Speculation verifies drafts for one sequence at a time, so it never pads a batch.
+        if (
+            self.backend == "native"
+            or self.speculative
+            or (len(requests) == 1 and self.prefix_cache)
+        ):
+            rows = []
+            for prompt, request, budget in zip(prompts, requests, budgets):
+                with timed(observer, "tokenize"):
+                    input_ids = self._hf_tokenizer(prompt, return_tensors="pt")["input_ids"]
+                with timed(observer, "generate"):
+                    input_ids = input_ids.to(self.device)
+                    rows.append(self._generate_single(input_ids, request, budget))
+                if observer is not None:
+                    observer.tokens(input_ids.shape[1], len(rows[-1]))
+        else:
+            with timed(observer, "tokenize"):
+                inputs = self._hf_tokenizer(prompts, return_tensors="pt", padding=True)
+                inputs = inputs.to(self.device)
+            prompt_len = inputs["input_ids"].shape[1]
+            stopping = PatchStoppingCriteria(
+                self._hf_tokenizer,
+                prompt_len,
+                [r.max_edits for r in requests],
+                [r.cancel for r in requests],
+            )
+            with timed(observer, "generate"), torch.no_grad():
+                output = self._hf_model.generate(
+                    **inputs,
+                    max_new_tokens=max(budgets),
+                    stopping_criteria=StoppingCriteriaList([stopping]),
+                    do_sample=False,
+                    pad_token_id=self._hf_tokenizer.pad_token_id,
+                    eos_token_id=self._hf_tokenizer.eos_token_id,
+                )
+            rows = [row[prompt_len:] for row in output]
+            if observer is not None:
+                # Rows that stop early are filled with padding, which is not counted.
+                pad = self._hf_tokenizer.pad_token_id
+                observer.tokens(
+                    int(inputs["attention_mask"].sum()),
+                    sum(int((row != pad).sum()) for row in rows),
+                )
+        results: List[PatchResult] = []
+        for request, context, row in zip(requests, contexts, rows):
+            if is_cancelled(request.cancel):
+                results.append(([], ""))
+                continue
+            with timed(observer, "parse"):
+                generated = self._hf_tokenizer.decode(row, skip_special_tokens=False)
+                # crude cut on PATCH_END or eos; eos also trails shorter rows as padding
+                patch_text = generated.split(PATCH_END)[0]
+                if self._hf_tokenizer.eos_token:
+                    patch_text = patch_text.split(self._hf_tokenizer.eos_token)[0]
+                edits = context.to_absolute(self._parse_patch_text(patch_text.strip()))
+                # A stop on max_edits leaves the start of one extra hunk behind.
+                edits = edits[: request.max_edits]
+            with timed(observer, "patch_dsl"):
+                patch_dsl = build_patch_dsl(request.code.splitlines(), edits)
+            results.append((edits, patch_dsl))
+        return results
+
+    def _generate_single(self, input_ids, request: PatchRequest, max_new_tokens: int) -> List[int]:
+        """Decode one unpadded prompt, reusing and refreshing the prefix cache."""
+        assert self._hf_model and self._hf_tokenizer
+        import torch
+        from transformers import StoppingCriteriaList
+        tokenizer = self._hf_tokenizer
+        prompt = input_ids[0].tolist()
+        _, past = self.prefix_cache.lookup(prompt) if self.prefix_cache else (0, None)
+        if self.speculative or self.backend == "native":
+            # Without drafts this is plain greedy decoding, which the native model needs
+            # since it has no `generate`.
+            tracker = PatchTracker(tokenizer, request.max_edits)
+            new_tokens, cache = prompt_lookup_generate(
+                self._hf_model,
+                input_ids,
+                max_new_tokens=max_new_tokens,
+                eos_token_id=tokenizer.eos_token_id,
+                should_stop=lambda ids: is_cancelled(request.cancel) or tracker.update(ids),
+                stats=self.speculative_stats if self.speculative else None,
+                num_draft_tokens=DRAFT_TOKENS if self.speculative else 0,
+                past_key_values=past,
+            )
+        else:
+            stopping = PatchStoppingCriteria(
+                tokenizer, len(prompt), [request.max_edits], [request.cancel]
+            )
+            with torch.no_grad():
+                output = self._hf_model.generate(
+                    input_ids=input_ids,
+                    attention_mask=torch.ones_like(input_ids),
+                    past_key_values=past,
+                    max_new_tokens=max_new_tokens,
+                    stopping_criteria=StoppingCriteriaList([stopping]),
+                    do_sample=False,
+                    pad_token_id=tokenizer.pad_token_id,
+                    eos_token_id=tokenizer.eos_token_id,
+                    return_dict_in_generate=True,
+                )
+            new_tokens = output.sequences[0, len(prompt) :].tolist()
+            cache = output.past_key_values
+        if self.prefix_cache and cache is not None:
+            # Keep only the prompt part; generated tokens are request-specific.
+            excess = cache.get_seq_length() - len(prompt)
+            if excess > 0:
+                cache.crop(-excess)
+            self.prefix_cache.store(prompt, cache)
+        return new_tokens
+
+    def _stream_with_hf(self, request: PatchRequest) -> Iterator[PatchEdit]:
         assert self._hf_model and self._hf_tokenizer
-        prompt = self._format_prompt(code, start_line, end_line, diagnostics, instruction)
+        from transformers import StoppingCriteriaList, TextIteratorStreamer
+        context = self._context(request)
+        prompt = self._format_prompt(context, request.instruction)
         inputs = self._hf_tokenizer(prompt, return_tensors="pt").to(self.device)
-        with torch.no_grad():
-            output = self._hf_model.generate(
+        streamer = TextIteratorStreamer(self._hf_tokenizer, skip_prompt=True)
+        stopping = PatchStoppingCriteria(
+            self._hf_tokenizer, inputs["input_ids"].shape[1], [request.max_edits], [request.cancel]
+        )
+        worker = threading.Thread(
+            target=self._hf_model.generate,
+            kwargs=dict(
                 **inputs,
-                max_new_tokens=256,
+                streamer=streamer,
+                max_new_tokens=self._patch_budget(context),
+                stopping_criteria=StoppingCriteriaList([stopping]),
                 do_sample=False,
-                pad_token_id=self._hf_tokenizer.eos_token_id,
+                pad_token_id=self._hf_tokenizer.pad_token_id,
                 eos_token_id=self._hf_tokenizer.eos_token_id,
-            )
-        generated = self._hf_tokenizer.decode(output[0][inputs["input_ids"].shape[1] :])
-        # crude cut on PATCH_END or eos
-        patch_text = generated.split("<PATCH_END>")[0].strip()
-        edits = self._parse_patch_text(patch_text)
-        patch_dsl = build_patch_dsl(code.splitlines(), edits)
-        return edits, patch_dsl
+            ),
+            daemon=True,
+        )
+        worker.start()
+        terminators = [t for t in (PATCH_END, self._hf_tokenizer.eos_token) if t]
+        parser = PatchStreamParser()
+        generated = ""
+        fed = 0
+        emitted = 0
+        try:
+            for chunk in streamer:
+                generated += chunk
+                stops = [i for i in (generated.find(t) for t in terminators) if i >= 0]
+                if stops:
+                    generated = generated[: min(stops)]
+                    break
+                # Only hand complete lines to the parser; hunks end at the next header.
+                upto = generated.rfind("\n") + 1
+                if upto > fed:
+                    for edit in parser.feed(generated[fed:upto]):
+                        emitted += 1
+                        yield from context.to_absolute(
+                            [PatchEdit(edit.start_line, edit.end_line, edit.replacement)]
+                        )
+                    fed = upto
+            if request.max_edits is not None and emitted >= request.max_edits:
+                # Decoding stopped on the header of a hunk we were not asked for.
+                return
+            if is_cancelled(request.cancel):
+                return
+            for edit in parser.feed(generated[fed:]) + parser.close():
+                yield from context.to_absolute(
+                    [PatchEdit(edit.start_line, edit.end_line, edit.replacement)]
+                )
+        except ValueError:
+            # Malformed hunk header: stop where the batch parser would stop.
+            return
+
+    def _patch_budget(self, context: PromptContext) -> int:
+        """`max_new_tokens` scaled to the size of the prompted region."""
+        return patch_token_budget(context.tokens)
+
+    def _context(self, request: PatchRequest) -> PromptContext:
+        """The lines of the request's region that fit the prompt's token budget.
+
+        The budget leaves room in the model's context window for the rest of
+        the prompt and the patch, and is further capped by `max_prompt_tokens`.
+        """
+        assert self._hf_tokenizer
+        tokenizer = self._hf_tokenizer
+
+        def count_tokens(texts: List[str]) -> List[int]:
+            return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+        budget = None
+        limit = self._max_positions()
+        if limit or self.max_prompt_tokens:
+            bare = PromptContext(request.start_line, request.end_line, "", request.diagnostics, 0)
+            overhead = count_tokens([self._format_prompt(bare, request.instruction)])[0]
+            caps = []
+            if limit:
+                caps.append(context_token_budget(limit - overhead))
+            if self.max_prompt_tokens:
+                caps.append(self.max_prompt_tokens - overhead)
+            budget = max(0, min(caps))
+        return build_context(
+            request.code,
+            request.start_line,
+            request.end_line,
+            request.diagnostics,
+            count_tokens,
+            budget,
+            self.adapter,
+            request.tree,
+        )
+
+    def _max_positions(self) -> int | None:
+        if self.backend == "native":
+            return self.config.max_seq_len
+        return getattr(self._hf_model.config, "max_position_embeddings", None)
 
-    def _format_prompt(
-        self, code: str, start_line: int, end_line: int, diagnostics: Sequence[str], instruction: str
-    ) -> str:
-        lines = code.splitlines()
-        snippet = "\n".join(lines[start_line - 1 : end_line])
-        diag_text = "\n".join(diagnostics)
+    def _format_prompt(self, context: PromptContext, instruction: str) -> str:
+        diag_text = "\n".join(context.diagnostics)
         return (
             f"<LANG={self.language}>\n"
-            f"<REGION_START_LINE> {start_line} </REGION_START_LINE>\n"
-            f"<REGION_END_LINE> {end_line} </REGION_END_LINE>\n"
-            f"<CODE_START>\n{snippet}\n<CODE_END>\n"
+            f"<REGION_START_LINE> {context.start_line} </REGION_START_LINE>\n"
+            f"<REGION_END_LINE> {context.end_line} </REGION_END_LINE>\n"
+            f"<CODE_START>\n{context.snippet}\n<CODE_END>\n"
             f"<DIAG_START>\n{diag_text}\n<DIAG_END>\n"
             f"<INSTR_START>\n{instruction}\n<INSTR_END>\n"
             f"<PATCH_START>\n"
@@ -285,6 +902,25 @@ class NovaEditModel:
         return edits
 
 
+def _region(request: PatchRequest) -> Tuple[List[str], int, str]:
+    """The request's code lines, its clamped 1-based start line and the region's text."""
+    lines = request.code.splitlines()
+    slice_start = max(1, request.start_line)
+    slice_end = min(len(lines), request.end_line)
+    return lines, slice_start, "\n".join(lines[slice_start - 1 : slice_end])
+
+
+def _default_device(prefer_cuda: bool) -> str:
+    if prefer_cuda:
+        try:
+            import torch  # type: ignore
+        except Exception:  # pragma: no cover - optional dependency
+            return "cpu"
+        if torch.cuda.is_available():
+            return "cuda"
+    return "cpu"
+
+
 def build_patch_dsl(original_lines: List[str], edits: Sequence[PatchEdit]) -> str:
     chunks: List[str] = []
     for edit in edits:
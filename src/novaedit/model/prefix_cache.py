@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import copy
+import itertools
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+class _Node:
+    __slots__ = ("children", "entries")
+
+    def __init__(self) -> None:
+        self.children: Dict[int, _Node] = {}
+        self.entries: Set[int] = set()
+
+
+def cache_nbytes(cache: Any) -> int:
+    """Approximate memory held by a past-key-values cache object."""
+    if hasattr(cache, "nbytes"):
+        return int(cache.nbytes)
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (layer.keys, layer.values) if t is not None]
+    else:  # transformers < 4.54 keeps flat per-layer lists
+        tensors = list(getattr(cache, "key_cache", [])) + list(getattr(cache, "value_cache", []))
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class PrefixCache:
+    """Past-key-values of recent prompts, looked up by longest shared token prefix.
+
+    Prompts are inserted into a token trie; every trie node remembers which
+    stored entries pass through it, so a lookup walks the new prompt down the
+    trie and can reuse any entry below the deepest node it reaches, cropped to
+    the shared prefix. Entries are evicted least-recently-used once their
+    total size exceeds `max_bytes`. Stored caches are never handed out
+    directly: lookups return a private copy the caller may extend.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._root = _Node()
+        self._entries: "OrderedDict[int, Tuple[List[int], Any, int]]" = OrderedDict()
+        self._ids = itertools.count()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    def lookup(self, tokens: List[int]) -> Tuple[int, Optional[Any]]:
+        """Return `(prefix_length, cache)` for the longest reusable prefix of `tokens`.
+
+        At least one token is always left uncached so the caller gets logits
+        for the last prompt position. Returns `(0, None)` on a miss.
+        """
+        with self._lock:
+            node, depth, entry_id = self._root, 0, None
+            for token in tokens[: len(tokens) - 1]:
+                child = node.children.get(token)
+                if child is None:
+                    break
+                node, depth = child, depth + 1
+                entry_id = next(iter(child.entries))
+            if entry_id is None:
+                self.misses += 1
+                return 0, None
+            stored_tokens, stored_cache, _ = self._entries[entry_id]
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            self.reused_tokens += depth
+        # Stored caches are never mutated, so copying outside the lock is safe.
+        cache = copy.deepcopy(stored_cache)
+        excess = len(stored_tokens) - depth
+        if excess:
+            cache.crop(-excess)
+        return depth, cache
+
+    def store(self, tokens: List[int], cache: Any) -> None:
+        """Keep `cache`, which must cover exactly `tokens`. The caller gives up ownership."""
+        size = cache_nbytes(cache)
+        if size > self.max_bytes or not tokens:
+            return
+        with self._lock:
+            entry_id = next(self._ids)
+            node = self._root
+            for token in tokens:
+                node = node.children.setdefault(token, _Node())
+                node.entries.add(entry_id)
+            self._entries[entry_id] = (list(tokens), cache, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._evict(next(iter(self._entries)))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reused_tokens": self.reused_tokens,
+        }
+
+    def _evict(self, entry_id: int) -> None:
+        tokens, _, size = self._entries.pop(entry_id)
+        self._bytes -= size
+        node = self._root
+        for token in tokens:
+            child = node.children[token]
+            child.entries.discard(entry_id)
+            if not child.entries:
+                # Nothing else shares this suffix; drop the whole branch.
+                del node.children[token]
+                return
+            node = child
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+import hashlib
+import itertools
+import os
+import warnings
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+QUANT_MODES = ("none", "int8")
+# Suffixes of the per-layer tensors `save_quantized` writes for int8 linears.
+_QWEIGHT = "qweight"
+_QSCALE = "qscale"
+_QZERO = "qzero_point"
+_QBIAS = "qbias"
+
+
+def check_quant_mode(mode: Optional[str]) -> str:
+    """Normalise a quantization mode (`None`/empty means `"none"`)."""
+    mode = (mode or "none").lower()
+    if mode not in QUANT_MODES:
+        raise ValueError(f"Unknown quantization mode {mode!r}; expected one of {QUANT_MODES}")
+    return mode
+
+
+def quantize_model(model: Any, mode: str) -> Any:
+    """Return `model` with its `nn.Linear` layers quantized for CPU inference.
+
+    `int8` uses dynamic quantization: weights are stored as int8 with a
+    per-tensor scale and activations are quantized on the fly, so matmuls run
+    through the int8 CPU kernels. Embeddings and norms stay in float.
+    """
+    mode = check_quant_mode(mode)
+    if mode == "none":
+        return model
+    try:
+        import torch  # type: ignore
+        from torch.ao.quantization import quantize_dynamic  # type: ignore
+    except Exception as exc:  # pragma: no cover - optional dependency
+        raise ImportError("Install torch to use quantized inference.") from exc
+    with warnings.catch_warnings():
+        # torch marks eager-mode quantization as deprecated in favour of torchao.
+        warnings.simplefilter("ignore")
+        return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def model_nbytes(model: Any) -> int:
+    """Bytes held by a model's parameters and buffers, including packed int8 weights."""
+    import torch
+
+    total = 0
+    for value in model.state_dict().values():
+        values = value if isinstance(value, tuple) else (value,)
+        for tensor in values:
+            if isinstance(tensor, torch.Tensor):
+                total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def quantized_cache_path(cache_dir: str | Path, source: str, mode: str) -> Path:
+    """Location of the cached quantized weights for checkpoint `source`.
+
+    The key covers the checkpoint, the mode and the torch version, since
+    int8 packing is not guaranteed to be portable across torch releases.
+    """
+    import torch
+
+    resolved = Path(source)
+    if resolved.exists():
+        weights = sorted(p for p in resolved.iterdir() if p.is_file())
+        stamps = ",".join(f"{p.name}:{p.stat().st_mtime_ns}" for p in weights)
+        source = f"{resolved.resolve()}|{stamps}"
+    digest = hashlib.sha256(f"{source}|{mode}|{torch.__version__}".encode("utf-8")).hexdigest()
+    return Path(cache_dir) / f"{digest[:32]}-{mode}.safetensors"
+
+
+def save_quantized(model: Any, path: Path) -> None:
+    """Write the weights of a `quantize_model` result as plain tensors (safetensors).
+
+    Each int8 linear layer is stored as its integer weight, scale, zero point
+    and bias; every other parameter and buffer is stored as is.
+    """
+    import torch
+    from safetensors.torch import save_file
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+
+    tensors: Dict[str, Any] = {}
+    for name, module in model.named_modules():
+        if isinstance(module, DynamicQuantizedLinear):
+            weight, bias = module._weight_bias()
+            tensors[f"{name}.{_QWEIGHT}"] = weight.int_repr()
+            tensors[f"{name}.{_QSCALE}"] = torch.tensor(weight.q_scale(), dtype=torch.float64)
+            tensors[f"{name}.{_QZERO}"] = torch.tensor(weight.q_zero_point())
+            if bias is not None:
+                tensors[f"{name}.{_QBIAS}"] = bias
+    seen = set()
+    for name, tensor in itertools.chain(model.named_parameters(), model.named_buffers()):
+        tensor = tensor.detach().contiguous()
+        if tensor.data_ptr() in seen:  # tied weights: safetensors refuses shared storage
+            tensor = tensor.clone()
+        seen.add(tensor.data_ptr())
+        tensors[name] = tensor
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(f".{os.getpid()}.tmp")
+    save_file(tensors, str(tmp))
+    os.replace(tmp, path)
+
+
+def load_quantized(path: Path, build: Callable[[], Any]) -> Optional[Any]:
+    """Rebuild a model saved by `save_quantized`, or return None if there is no usable file.
+
+    `build()` must construct the full-precision architecture; it runs on the
+    meta device, so no full-precision weights are allocated or initialised.
+    """
+    if not path.exists():
+        return None
+    import torch
+    from safetensors.torch import load_file
+
+    try:
+        tensors = load_file(str(path))
+        with torch.device("meta"):
+            model = build()
+        for name, module in list(model.named_modules()):
+            if isinstance(module, torch.nn.Linear):
+                _set_module(model, name, _load_linear(module, name, tensors))
+        for name, tensor in tensors.items():
+            owner, _, attr = name.rpartition(".")
+            module = model.get_submodule(owner)
+            if attr in module._parameters:
+                module._parameters[attr] = torch.nn.Parameter(tensor, requires_grad=False)
+            elif attr in module._buffers:
+                module._buffers[attr] = tensor
+    except Exception:
+        return None
+    if any(t.is_meta for t in itertools.chain(model.parameters(), model.buffers())):
+        return None
+    return model
+
+
+def _load_linear(linear: Any, name: str, tensors: Dict[str, Any]) -> Any:
+    import torch
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+
+    qweight = torch._make_per_tensor_quantized_tensor(
+        tensors.pop(f"{name}.{_QWEIGHT}"),
+        float(tensors.pop(f"{name}.{_QSCALE}")),
+        int(tensors.pop(f"{name}.{_QZERO}")),
+    )
+    bias = tensors.pop(f"{name}.{_QBIAS}", None)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        quantized = DynamicQuantizedLinear(
+            linear.in_features, linear.out_features, bias_=bias is not None, dtype=torch.qint8
+        )
+    quantized.set_weight_bias(qweight, bias)
+    return quantized
+
+
+def _set_module(model: Any, name: str, module: Any) -> None:
+    owner, _, attr = name.rpartition(".")
+    setattr(model.get_submodule(owner), attr, module)
@@ -1,19 +1,10 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Iterable, List, Optional
+from typing import TYPE_CHECKING, Iterable, List, Optional
 
-try:
+if TYPE_CHECKING:  # pragma: no cover
     from tokenizers import Tokenizer
-    from tokenizers.models import BPE
-    from tokenizers.pre_tokenizers import Whitespace
-    from tokenizers.trainers import BpeTrainer
-except ImportError:  # pragma: no cover - optional dependency
-    Tokenizer = None  # type: ignore
-    BPE = None  # type: ignore
-    Whitespace = None  # type: ignore
-    BpeTrainer = None  # type: ignore
-
 
 SPECIAL_TOKENS = [
     "<bos>",
@@ -36,28 +27,26 @@ class NovaEditTokenizer:
     """Tiny wrapper around Hugging Face `tokenizers` with sensible defaults."""
 
     def __init__(self, tokenizer: Optional["Tokenizer"] = None):
-        if tokenizer is None and Tokenizer is None:
-            raise ImportError("tokenizers is not installed; install novaedit[train].")
-        self._tokenizer = tokenizer or Tokenizer(BPE())
+        if tokenizer is None:
+            tokenizers = _tokenizers()
+            tokenizer = tokenizers.Tokenizer(tokenizers.models.BPE())
+        self._tokenizer = tokenizer
 
     @classmethod
     def from_file(cls, path: str | Path) -> "NovaEditTokenizer":
-        if Tokenizer is None:
-            raise ImportError("tokenizers is not installed; install novaedit[train].")
-        tokenizer = Tokenizer.from_file(str(path))
+        tokenizer = _tokenizers().Tokenizer.from_file(str(path))
         return cls(tokenizer)
 
     def train_from_files(
         self, files: Iterable[str | Path], vocab_size: int = 32000, min_frequency: int = 2
     ) -> None:
-        if Tokenizer is None or BpeTrainer is None or Whitespace is None:
-            raise ImportError("tokenizers is not installed; install novaedit[train].")
-        trainer = BpeTrainer(
+        tokenizers = _tokenizers()
+        trainer = tokenizers.trainers.BpeTrainer(
             vocab_size=vocab_size,
             min_frequency=min_frequency,
             special_tokens=SPECIAL_TOKENS,
         )
-        self._tokenizer.pre_tokenizer = Whitespace()
+        self._tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
         self._tokenizer.train([str(f) for f in files], trainer=trainer)
 
     def save(self, path: str | Path) -> None:
@@ -74,3 +63,15 @@ class NovaEditTokenizer:
     @property
     def vocab_size(self) -> int:
         return self._tokenizer.get_vocab_size()
+
+
+def _tokenizers():
+    """Import `tokenizers` on first use; importing NovaEdit does not need it."""
+    try:
+        import tokenizers
+        import tokenizers.models
+        import tokenizers.pre_tokenizers
+        import tokenizers.trainers
+    except ImportError as exc:  # pragma: no cover - optional dependency
+        raise ImportError("tokenizers is not installed; install novaedit[train].") from exc
+    return tokenizers
@@ -0,0 +1,232 @@
+"""Inference-oriented PyTorch implementation of the NovaEdit decoder.
+
+Architecture follows `ModelConfig`: pre-norm decoder blocks with RMSNorm,
+rotary position embeddings, grouped-query attention (`n_kv_heads` shared KV
+heads) and a SwiGLU feed-forward. The KV cache is preallocated once per
+sequence batch and only ever stores the `n_kv_heads` shared heads.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+try:
+    import torch  # type: ignore
+    import torch.nn.functional as F  # type: ignore
+    from torch import nn  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    torch = None  # type: ignore
+    F = None  # type: ignore
+    nn = None  # type: ignore
+
+from novaedit.model.config import ModelConfig
+
+CONFIG_FILE = "config.yaml"
+WEIGHTS_FILE = "model.safetensors"
+TOKENIZER_FILE = "tokenizer.json"
+
+_Module = nn.Module if nn is not None else object
+
+
+class KVCache:
+    """Preallocated key/value buffers for every layer of one batch of sequences.
+
+    Buffers have shape `(n_layers, batch, n_kv_heads, max_seq_len, head_dim)`;
+    `update` writes new positions in place, so decoding never reallocates.
+    Supports the subset of the Hugging Face cache API the decode loops use
+    (`get_seq_length`, `crop`).
+    """
+
+    def __init__(self, config: ModelConfig, batch_size: int = 1, device=None, dtype=None):
+        head_dim = config.d_model // config.n_heads
+        shape = (config.n_layers, batch_size, config.n_kv_heads, config.max_seq_len, head_dim)
+        self.keys = torch.zeros(shape, device=device, dtype=dtype)
+        self.values = torch.zeros(shape, device=device, dtype=dtype)
+        self.length = 0
+
+    @property
+    def capacity(self) -> int:
+        return self.keys.shape[3]
+
+    @property
+    def nbytes(self) -> int:
+        return 2 * self.keys.numel() * self.keys.element_size()
+
+    def get_seq_length(self) -> int:
+        return self.length
+
+    def crop(self, max_length: int) -> None:
+        """Keep the first `max_length` positions; negative values drop from the end."""
+        if max_length < 0:
+            max_length = self.length + max_length
+        self.length = max(0, min(self.length, max_length))
+
+    def update(self, layer: int, key, value) -> Tuple[Any, Any]:
+        """Store `key`/`value` after the current length; return all cached positions."""
+        start = self.length
+        end = start + key.shape[2]
+        if end > self.capacity:
+            raise ValueError(f"KV cache overflow: {end} > max_seq_len {self.capacity}")
+        self.keys[layer, :, :, start:end] = key
+        self.values[layer, :, :, start:end] = value
+        return self.keys[layer, :, :, :end], self.values[layer, :, :, :end]
+
+
+@dataclass
+class CausalLMOutput:
+    logits: Any
+    past_key_values: Optional[KVCache]
+
+
+class RMSNorm(_Module):
+    def __init__(self, dim: int, eps: float = 1e-6):
+        super().__init__()
+        self.eps = eps
+        self.weight = nn.Parameter(torch.ones(dim))
+
+    def forward(self, x):
+        return x * torch.rsqrt(x.pow(2).mean(-1, keepdim=True) + self.eps) * self.weight
+
+
+def apply_rope(x, cos, sin):
+    """Rotate `x` (`..., seq, head_dim`) by `cos`/`sin` tables of width `head_dim // 2`.
+
+    Uses the half-split layout: dimension `i` is paired with `i + head_dim // 2`.
+    """
+    half = x.shape[-1] // 2
+    x1, x2 = x[..., :half], x[..., half:]
+    return torch.cat((x1 * cos - x2 * sin, x2 * cos + x1 * sin), dim=-1)
+
+
+class Attention(_Module):
+    def __init__(self, config: ModelConfig):
+        super().__init__()
+        if config.n_heads % config.n_kv_heads:
+            raise ValueError("n_heads must be a multiple of n_kv_heads")
+        self.n_heads = config.n_heads
+        self.n_kv_heads = config.n_kv_heads
+        self.head_dim = config.d_model // config.n_heads
+        kv_dim = self.n_kv_heads * self.head_dim
+        # One fused projection for q, k and v.
+        self.qkv = nn.Linear(config.d_model, config.d_model + 2 * kv_dim, bias=False)
+        self.out = nn.Linear(config.d_model, config.d_model, bias=False)
+
+    def forward(self, x, cos, sin, layer: int, cache: Optional[KVCache], mask):
+        batch, seq, _ = x.shape
+        q_dim = self.n_heads * self.head_dim
+        kv_dim = self.n_kv_heads * self.head_dim
+        q, k, v = self.qkv(x).split((q_dim, kv_dim, kv_dim), dim=-1)
+        q = q.view(batch, seq, self.n_heads, self.head_dim).transpose(1, 2)
+        k = k.view(batch, seq, self.n_kv_heads, self.head_dim).transpose(1, 2)
+        v = v.view(batch, seq, self.n_kv_heads, self.head_dim).transpose(1, 2)
+        # Rotate queries and keys in a single call.
+        qk = apply_rope(torch.cat((q, k), dim=1), cos, sin)
+        q, k = qk[:, : self.n_heads], qk[:, self.n_heads :]
+        if cache is not None:
+            k, v = cache.update(layer, k, v)
+        groups = self.n_heads // self.n_kv_heads
+        if groups > 1:
+            k = k.repeat_interleave(groups, dim=1)
+            v = v.repeat_interleave(groups, dim=1)
+        attn = F.scaled_dot_product_attention(q, k, v, attn_mask=mask)
+        return self.out(attn.transpose(1, 2).reshape(batch, seq, -1))
+
+
+class FeedForward(_Module):
+    def __init__(self, config: ModelConfig):
+        super().__init__()
+        self.d_ff = config.d_ff
+        # Gate and up projections fused into one matmul.
+        self.gate_up = nn.Linear(config.d_model, 2 * config.d_ff, bias=False)
+        self.down = nn.Linear(config.d_ff, config.d_model, bias=False)
+
+    def forward(self, x):
+        gate, up = self.gate_up(x).split(self.d_ff, dim=-1)
+        return self.down(F.silu(gate) * up)
+
+
+class Block(_Module):
+    def __init__(self, config: ModelConfig):
+        super().__init__()
+        self.attn_norm = RMSNorm(config.d_model)
+        self.attn = Attention(config)
+        self.ffn_norm = RMSNorm(config.d_model)
+        self.ffn = FeedForward(config)
+
+    def forward(self, x, cos, sin, layer: int, cache: Optional[KVCache], mask):
+        x = x + self.attn(self.attn_norm(x), cos, sin, layer, cache, mask)
+        return x + self.ffn(self.ffn_norm(x))
+
+
+class NovaEditForCausalLM(_Module):
+    """Decoder-only NovaEdit language model.
+
+    `forward(input_ids, past_key_values=None, use_cache=True)` mirrors the
+    Hugging Face calling convention closely enough for the decode loops in
+    `novaedit.model.generation`.
+    """
+
+    def __init__(self, config: ModelConfig):
+        if torch is None:
+            raise ImportError("Install torch to use the native NovaEdit model.")
+        super().__init__()
+        self.config = config
+        self.embed = nn.Embedding(config.vocab_size, config.d_model)
+        self.layers = nn.ModuleList(Block(config) for _ in range(config.n_layers))
+        self.norm = RMSNorm(config.d_model)
+        self.lm_head = nn.Linear(config.d_model, config.vocab_size, bias=False)
+        head_dim = config.d_model // config.n_heads
+        # Computed on the CPU even when built under the meta device (see
+        # `novaedit.model.weights`): checkpoints do not hold the rotary tables.
+        steps = torch.arange(0, head_dim, 2, device="cpu").float()
+        inv_freq = 1.0 / (config.rope_base ** (steps / head_dim))
+        angles = torch.outer(torch.arange(config.max_seq_len, device="cpu").float(), inv_freq)
+        self.register_buffer("rope_cos", angles.cos(), persistent=False)
+        self.register_buffer("rope_sin", angles.sin(), persistent=False)
+
+    def new_cache(self, batch_size: int = 1) -> KVCache:
+        weight = self.embed.weight
+        return KVCache(self.config, batch_size, device=weight.device, dtype=weight.dtype)
+
+    def forward(self, input_ids, past_key_values: Optional[KVCache] = None, use_cache: bool = True):
+        cache = past_key_values
+        if cache is None and use_cache:
+            cache = self.new_cache(input_ids.shape[0])
+        start = cache.get_seq_length() if cache is not None else 0
+        seq = input_ids.shape[1]
+        cos = self.rope_cos[start : start + seq]
+        sin = self.rope_sin[start : start + seq]
+        mask = None
+        if seq > 1:
+            # Causal mask over cached + new positions.
+            positions = torch.arange(start + seq, device=input_ids.device)
+            mask = positions[None, :] <= positions[start:, None]
+        x = self.embed(input_ids)
+        for layer, block in enumerate(self.layers):
+            x = block(x, cos, sin, layer, cache, mask)
+        if cache is not None:
+            cache.length = start + seq
+        logits = self.lm_head(self.norm(x))
+        return CausalLMOutput(logits=logits, past_key_values=cache)
+
+    def save_pretrained(self, path: str | Path) -> None:
+        from safetensors.torch import save_file
+
+        import yaml
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / CONFIG_FILE).write_text(yaml.safe_dump(self.config.to_dict()))
+        state = {k: v.contiguous() for k, v in self.state_dict().items()}
+        save_file(state, str(path / WEIGHTS_FILE))
+
+    @classmethod
+    def from_pretrained(cls, path: str | Path, device: str | None = None) -> "NovaEditForCausalLM":
+        from safetensors.torch import load_file
+
+        path = Path(path)
+        model = cls(ModelConfig.from_yaml(path / CONFIG_FILE))
+        model.load_state_dict(load_file(str(path / WEIGHTS_FILE)))
+        return model.to(device or "cpu").eval()
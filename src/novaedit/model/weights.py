@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence
+
+WEIGHTS_PATTERN = "*.safetensors"
+
+
+def safetensors_files(source: str) -> List[Path]:
+    """Safetensors files holding the weights of checkpoint `source` (a directory or Hub id)."""
+    path = Path(source)
+    if not path.is_dir():
+        from huggingface_hub import snapshot_download
+
+        path = Path(snapshot_download(source, allow_patterns=[WEIGHTS_PATTERN, "*.json"]))
+    return sorted(path.glob(WEIGHTS_PATTERN))
+
+
+def load_mmapped(build: Callable[[], Any], files: Sequence[Path]) -> Optional[Any]:
+    """Build a model whose parameters are views of the memory-mapped safetensors `files`.
+
+    `build()` constructs the architecture under the meta device, so no weights
+    are allocated or initialised; the tensors safetensors maps from the files
+    are then assigned in place of them. The weights live in the page cache
+    rather than in process memory, so every process serving the same files
+    shares one copy. Returns None when the files do not cover every parameter
+    (e.g. renamed keys) or a computed buffer cannot be restored, so callers can
+    fall back to a regular load.
+    """
+    if not files:
+        return None
+    import torch
+    from safetensors.torch import load_file
+
+    # The device context only applies to the calling thread.
+    with torch.device("meta"):
+        model = build()
+    state = {}
+    for path in files:
+        state.update(load_file(str(path)))
+    model.load_state_dict(state, strict=False, assign=True)
+    if hasattr(model, "tie_weights"):
+        model.tie_weights()
+    if any(p.is_meta for p in model.parameters()) or not _restore_buffers(model):
+        return None
+    return model
+
+
+def _restore_buffers(model: Any) -> bool:
+    """Recompute the buffers left on the meta device; False if any cannot be.
+
+    Checkpoints do not hold non-persistent buffers such as rotary tables.
+    Hugging Face models recompute them in `_init_weights`; a buffer it leaves
+    untouched (still all zeros) is reported as not restored.
+    """
+    import torch
+
+    owners = {}
+    for name, buffer in list(model.named_buffers()):
+        if not buffer.is_meta:
+            continue
+        module_name, _, buffer_name = name.rpartition(".")
+        module = model.get_submodule(module_name)
+        module.register_buffer(
+            buffer_name,
+            torch.zeros_like(buffer, device="cpu"),
+            persistent=buffer_name not in module._non_persistent_buffers_set,
+        )
+        owners.setdefault(module_name, []).append(buffer_name)
+    if not owners:
+        return True
+    init = getattr(model, "_init_weights", None)
+    if init is None:
+        return False
+    with torch.no_grad():
+        for module_name, names in owners.items():
+            module = model.get_submodule(module_name)
+            # Re-initialising a module with parameters would overwrite the loaded weights.
+            if next(module.parameters(recurse=False), None) is not None:
+                return False
+            init(module)
+            if any(not getattr(module, n).any() for n in names):
+                return False
+    return True
@@ -1,3 +1,13 @@
-from novaedit.server.main import app, get_app
+from typing import Any
 
 __all__ = ["app", "get_app"]
+
+
+def __getattr__(name: str) -> Any:
+    # Importing `novaedit.server.main` loads the model, so only do it on demand;
+    # submodules such as `novaedit.server.documents` are usable on their own.
+    if name in __all__:
+        from novaedit.server import main
+
+        return getattr(main, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
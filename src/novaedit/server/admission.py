@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+PRIORITIES = ("interactive", "batch")
+
+
+class QueueFullError(RuntimeError):
+    """Raised when the admission queue is already at its configured depth."""
+
+
+class DeadlineExceededError(RuntimeError):
+    """Raised when a request's deadline passes before it is admitted."""
+
+
+@dataclass(order=True)
+class _Waiter:
+    rank: int
+    seq: int
+    deadline: Optional[float] = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class AdmissionQueue:
+    """Bounded, priority-ordered wait queue in front of the model.
+
+    At most `max_concurrent` requests run at once; up to `max_depth` more wait
+    for a slot, lower-rank priorities first (see `PRIORITIES`) and FIFO within a
+    priority. Waiters whose deadline passes are dropped before they ever reach
+    the model. Deadlines use the event loop clock (`loop.time()`).
+    """
+
+    def __init__(self, max_concurrent: int, max_depth: int):
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent must be >= 1")
+        self.max_concurrent = max_concurrent
+        self.max_depth = max_depth
+        self._running = 0
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self.admitted = 0
+        self.rejected = 0
+        self.expired = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    @property
+    def depth(self) -> int:
+        return sum(1 for w in self._waiters if not w.future.done())
+
+    async def acquire(
+        self, priority: str = "interactive", deadline: Optional[float] = None
+    ) -> float:
+        """Wait for a slot and return how long the request was queued, in seconds."""
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if deadline is not None and deadline <= now:
+            self.expired += 1
+            raise DeadlineExceededError("Request deadline passed before admission")
+        if self._running < self.max_concurrent and self.depth == 0:
+            self._running += 1
+            self._record_wait(0.0)
+            return 0.0
+        if self.depth >= self.max_depth:
+            self.rejected += 1
+            raise QueueFullError("Admission queue is full")
+
+        rank = PRIORITIES.index(priority) if priority in PRIORITIES else len(PRIORITIES)
+        waiter = _Waiter(rank, next(self._seq), deadline, now, loop.create_future())
+        heapq.heappush(self._waiters, waiter)
+        timer = loop.call_at(deadline, self._expire, waiter) if deadline is not None else None
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            # The slot may have been handed over just before we were cancelled.
+            if waiter.future.done() and not waiter.future.cancelled():
+                if waiter.future.exception() is None:
+                    self.release()
+            raise
+        finally:
+            if timer is not None:
+                timer.cancel()
+        return loop.time() - now
+
+    def release(self) -> None:
+        self._running -= 1
+        self._dispatch()
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "running": self._running,
+            "max_concurrent": self.max_concurrent,
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "expired": self.expired,
+            "wait_seconds_avg": self.wait_seconds_total / self.admitted if self.admitted else 0.0,
+            "wait_seconds_max": self.wait_seconds_max,
+        }
+
+    def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while self._waiters and self._running < self.max_concurrent:
+            waiter = heapq.heappop(self._waiters)
+            if waiter.future.done():
+                continue
+            now = loop.time()
+            if waiter.deadline is not None and waiter.deadline <= now:
+                self._expire(waiter)
+                continue
+            self._running += 1
+            self._record_wait(now - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _expire(self, waiter: _Waiter) -> None:
+        if waiter.future.done():
+            return
+        self.expired += 1
+        waiter.future.set_exception(DeadlineExceededError("Request deadline passed while queued"))
+
+    def _record_wait(self, seconds: float) -> None:
+        self.admitted += 1
+        self.wait_seconds_total += seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, seconds)
@@ -1,13 +1,22 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, Literal, Optional
 
 from pydantic import BaseModel, Field
 
 
 class EditRequest(BaseModel):
     language: str = Field(default="python", description="Source language, e.g. python")
-    code: str = Field(..., max_length=20000, description="Code snippet to edit.")
+    code: Optional[str] = Field(
+        default=None,
+        max_length=20000,
+        description="Code snippet to edit; omit it to edit an open session document.",
+    )
+    session_id: Optional[str] = None
+    document_uri: Optional[str] = None
+    document_version: Optional[int] = Field(
+        default=None, description="Fail with 409 unless the open document is at this version."
+    )
     file_path: Optional[str] = None
     start_line: int = Field(default=1, ge=1)
     end_line: int = Field(default=1, ge=1)
@@ -15,6 +24,10 @@ class EditRequest(BaseModel):
     instruction: Optional[str] = ""
     max_edits: int = Field(default=5, ge=1, le=50)
     temperature: float = 0.2
+    priority: Literal["interactive", "batch"] = Field(
+        default="interactive",
+        description="Admission priority; interactive quick-fixes are served before batch traffic.",
+    )
 
 
 class StructuredEdit(BaseModel):
@@ -27,3 +40,85 @@ class EditResponse(BaseModel):
     edits: List[StructuredEdit]
     raw_patch_dsl: str
     model_version: str = "novaedit-baseline-0.1.0"
+
+
+class EditRegion(BaseModel):
+    start_line: int = Field(default=1, ge=1)
+    end_line: int = Field(default=1, ge=1)
+    diagnostics: List[str] = Field(default_factory=list)
+    instruction: Optional[str] = ""
+    max_edits: int = Field(default=5, ge=1, le=50)
+
+
+class BatchDocument(BaseModel):
+    language: str = Field(default="python", description="Source language, e.g. python")
+    code: str = Field(..., max_length=200000, description="Whole file to edit.")
+    file_path: Optional[str] = None
+    regions: List[EditRegion] = Field(..., min_length=1)
+
+
+class BatchEditRequest(BaseModel):
+    documents: List[BatchDocument] = Field(..., min_length=1)
+    temperature: float = 0.2
+    priority: Literal["interactive", "batch"] = Field(
+        default="batch",
+        description="Admission priority; the whole batch takes one slot.",
+    )
+
+
+class DocumentEditResponse(BaseModel):
+    file_path: Optional[str] = None
+    regions: List[EditResponse] = Field(description="One response per requested region.")
+    edits: List[StructuredEdit] = Field(description="Non-overlapping merge of the region edits.")
+    raw_patch_dsl: str
+    conflicts: List[int] = Field(
+        default_factory=list,
+        description="Indices of regions with edits dropped because they overlapped earlier ones.",
+    )
+
+
+class BatchEditResponse(BaseModel):
+    documents: List[DocumentEditResponse]
+    model_version: str = "novaedit-baseline-0.1.0"
+
+
+class Position(BaseModel):
+    line: int = Field(ge=0, description="0-based line.")
+    character: int = Field(ge=0, description="0-based character offset in the line.")
+
+
+class Range(BaseModel):
+    start: Position
+    end: Position
+
+
+class TextDocumentChange(BaseModel):
+    range: Optional[Range] = Field(default=None, description="Omit to replace the whole text.")
+    text: str
+
+
+class DidOpenRequest(BaseModel):
+    session_id: str = Field(..., min_length=1, max_length=128)
+    uri: str = Field(..., min_length=1)
+    language: str = "python"
+    version: int = 0
+    text: str = Field(..., max_length=1_000_000)
+
+
+class DidChangeRequest(BaseModel):
+    session_id: str
+    uri: str
+    version: int
+    changes: List[TextDocumentChange] = Field(..., min_length=1)
+
+
+class DidCloseRequest(BaseModel):
+    session_id: str
+    uri: str
+
+
+class DocumentState(BaseModel):
+    session_id: str
+    uri: str
+    version: int
+    lines: int
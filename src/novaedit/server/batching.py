@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from typing import Callable, List, Optional, Sequence, Set, Tuple
+
+from novaedit.model.modeling_novaedit import PatchRequest, PatchResult
+
+BatchRunner = Callable[[Sequence[PatchRequest]], List[PatchResult]]
+
+
+class MicroBatcher:
+    """Collect concurrent edit requests into a single batched model call.
+
+    Requests are held until either `max_batch_size` of them are pending or
+    `max_wait` seconds have passed since the first one arrived; the whole group
+    is then handed to `run_batch` in the executor and every caller receives its
+    own result.
+    """
+
+    def __init__(
+        self,
+        run_batch: BatchRunner,
+        max_batch_size: int = 8,
+        max_wait: float = 0.01,
+        executor: Optional[Executor] = None,
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.executor = executor
+        self._pending: List[Tuple[PatchRequest, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, request: PatchRequest) -> PatchResult:
+        loop = asyncio.get_running_loop()
+        future: asyncio.Future = loop.create_future()
+        self._pending.append((request, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[: self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size :]
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[PatchRequest, asyncio.Future]]) -> None:
+        # Callers that already timed out do not need model time.
+        live = [(request, future) for request, future in batch if not future.done()]
+        if not live:
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            results = await loop.run_in_executor(
+                self.executor, self.run_batch, [request for request, _ in live]
+            )
+        except Exception as exc:
+            for _, future in live:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+        for (_, future), result in zip(live, results):
+            if not future.done():
+                future.set_result(result)
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from novaedit.model.modeling_novaedit import PatchEdit, PatchRequest, PatchResult
+
+# Rough per-entry bookkeeping cost on top of the patch text itself.
+ENTRY_OVERHEAD_BYTES = 256
+
+
+def request_cache_key(
+    request: PatchRequest,
+    language: str,
+    max_edits: int,
+    model_key: str,
+    whole_buffer: bool = False,
+) -> str:
+    """Hash the parts of a request that determine the generated patch.
+
+    Only the requested region is hashed, unless `whole_buffer` is set for
+    models whose answer also depends on the rest of the buffer (the NO_EDIT
+    pre-check, the cascade, prompt context building). Lines are hashed
+    verbatim, since cached replacements carry the original whitespace; only
+    the line-ending style is ignored. The model identity is mixed in so a new
+    checkpoint or release never serves stale patches.
+    """
+    lines = request.code.splitlines()
+    region = lines[max(0, request.start_line - 1) : request.end_line]
+    payload = {
+        "model": model_key,
+        "language": language.lower(),
+        "start_line": request.start_line,
+        "end_line": request.end_line,
+        "region": region,
+        "diagnostics": [d.strip() for d in request.diagnostics],
+        "instruction": request.instruction.strip(),
+        "max_edits": max_edits,
+    }
+    if whole_buffer:
+        buffer = "\n".join(lines).encode("utf-8")
+        payload["buffer"] = hashlib.sha256(buffer).hexdigest()
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class PatchCache:
+    """LRU cache of `(edits, patch_dsl)` results with a TTL and optional disk tier.
+
+    The in-memory tier is bounded by an approximate byte budget. When
+    `disk_dir` is set every entry is also written there as JSON, so a restarted
+    server starts warm; disk entries obey the same TTL.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        disk_dir: str | Path | None = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, PatchResult, int]]" = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: str) -> Optional[PatchResult]:
+        now = self.clock()
+        entry = self._entries.get(key)
+        if entry is not None:
+            created, result, _ = entry
+            if now - created <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return result
+            self._evict(key)
+        loaded = self._read_disk(key, now)
+        if loaded is not None:
+            created, result = loaded
+            self._store(key, created, result)
+            self.disk_hits += 1
+            return result
+        self.misses += 1
+        return None
+
+    def put(self, key: str, result: PatchResult) -> None:
+        created = self.clock()
+        self._store(key, created, result)
+        self._write_disk(key, created, result)
+
+    def stats(self) -> Dict[str, object]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def _store(self, key: str, created: float, result: PatchResult) -> None:
+        edits, patch_dsl = result
+        size = ENTRY_OVERHEAD_BYTES + len(patch_dsl) + sum(len(e.replacement) for e in edits)
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._evict(key)
+        self._entries[key] = (created, result, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            self._evict(next(iter(self._entries)))
+
+    def _evict(self, key: str) -> None:
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _disk_path(self, key: str) -> Path:
+        assert self.disk_dir is not None
+        return self.disk_dir / key[:2] / f"{key}.json"
+
+    def _read_disk(self, key: str, now: float) -> Optional[Tuple[float, PatchResult]]:
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            data = json.loads(path.read_text())
+        except (OSError, ValueError):
+            return None
+        created = float(data["created"])
+        if now - created > self.ttl:
+            path.unlink(missing_ok=True)
+            return None
+        edits = [PatchEdit(**edit) for edit in data["edits"]]
+        return created, (edits, data["patch_dsl"])
+
+    def _write_disk(self, key: str, created: float, result: PatchResult) -> None:
+        if not self.disk_dir:
+            return
+        edits, patch_dsl = result
+        data = {
+            "created": created,
+            "edits": [
+                {"start_line": e.start_line, "end_line": e.end_line, "replacement": e.replacement}
+                for e in edits
+            ],
+            "patch_dsl": patch_dsl,
+        }
+        path = self._disk_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, path)
@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+
+class UnknownDocumentError(LookupError):
+    """Raised when a session has no open document under the given URI."""
+
+
+class DocumentVersionError(RuntimeError):
+    """Raised when a change or edit request refers to a version the server does not hold."""
+
+
+@dataclass
+class TextChange:
+    """Replace `text` over a 0-based `(line, character)` range; no range replaces everything.
+
+    Ranges follow LSP `didChange` content changes, except that characters count
+    Python code points rather than UTF-16 code units.
+    """
+
+    text: str
+    start_line: Optional[int] = None
+    start_character: int = 0
+    end_line: Optional[int] = None
+    end_character: int = 0
+
+
+@dataclass
+class Document:
+    uri: str
+    language: str
+    version: int
+    text: str
+    # `(version, tree)` of the last parse.
+    _ast: Optional[Tuple[int, Any]] = field(default=None, repr=False)
+
+    def parse(self, parse_ast: Callable[[str], Any]) -> Any:
+        """AST of the current version, parsed at most once per version with `parse_ast`.
+
+        Safe to call from a worker thread while the document changes: `change`
+        writes the text before the version, so a parse is never cached under a
+        version whose text it did not see.
+        """
+        version = self.version
+        cached = self._ast
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        tree = parse_ast(self.text)
+        self._ast = (version, tree)
+        return tree
+
+
+@dataclass
+class _Session:
+    documents: Dict[str, Document] = field(default_factory=dict)
+    last_used: float = 0.0
+
+
+class DocumentStore:
+    """Open documents per client session, kept in sync with `didOpen`/`didChange`-style calls.
+
+    Clients open a document once and then send versioned incremental changes,
+    so edit requests only need to name the session, URI and version instead of
+    carrying the whole buffer. Sessions unused for `idle_seconds` are dropped,
+    and the least recently used ones once there are more than `max_sessions`;
+    documents may not grow beyond `max_chars`. Zero disables any of the limits.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 0,
+        idle_seconds: float = 0,
+        max_chars: int = 0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self.max_chars = max_chars
+        self.clock = clock
+        self._sessions: "OrderedDict[str, _Session]" = OrderedDict()
+        self.opens = 0
+        self.changes = 0
+        self.evictions = 0
+
+    def open(self, session_id: str, uri: str, language: str, version: int, text: str) -> Document:
+        """Start tracking `uri`, replacing any document already open under it."""
+        self._check_size(text)
+        session = self._session(session_id, create=True)
+        document = Document(uri=uri, language=language, version=version, text=text)
+        session.documents[uri] = document
+        self.opens += 1
+        self._evict_over_budget()
+        return document
+
+    def change(
+        self, session_id: str, uri: str, version: int, changes: Sequence[TextChange]
+    ) -> Document:
+        """Apply `changes` in order and move the document to `version`, which must be newer."""
+        document = self.get(session_id, uri)
+        if version <= document.version:
+            raise DocumentVersionError(
+                f"Version {version} is not newer than open version {document.version}"
+            )
+        text = document.text
+        for change in changes:
+            text = apply_change(text, change)
+        self._check_size(text)
+        document.text = text
+        document.version = version
+        self.changes += 1
+        return document
+
+    def close(self, session_id: str, uri: str) -> None:
+        session = self._session(session_id)
+        if session.documents.pop(uri, None) is None:
+            raise UnknownDocumentError(f"Document is not open: {uri}")
+        if not session.documents:
+            del self._sessions[session_id]
+
+    def get(self, session_id: str, uri: str, version: Optional[int] = None) -> Document:
+        """Return the open document, checking its version when one is given."""
+        document = self._session(session_id).documents.get(uri)
+        if document is None:
+            raise UnknownDocumentError(f"Document is not open: {uri}")
+        if version is not None and version != document.version:
+            raise DocumentVersionError(
+                f"Requested version {version} but the open version is {document.version}"
+            )
+        return document
+
+    def stats(self) -> Dict[str, object]:
+        documents = [d for s in self._sessions.values() for d in s.documents.values()]
+        return {
+            "sessions": len(self._sessions),
+            "documents": len(documents),
+            "chars": sum(len(d.text) for d in documents),
+            "opens": self.opens,
+            "changes": self.changes,
+            "evictions": self.evictions,
+        }
+
+    def _check_size(self, text: str) -> None:
+        if self.max_chars > 0 and len(text) > self.max_chars:
+            raise ValueError(f"Document too large; limit {self.max_chars} characters")
+
+    def _session(self, session_id: str, create: bool = False) -> _Session:
+        self._evict_idle()
+        session = self._sessions.get(session_id)
+        if session is None:
+            if not create:
+                raise UnknownDocumentError(f"Unknown session: {session_id}")
+            session = self._sessions[session_id] = _Session()
+        session.last_used = self.clock()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def _evict_idle(self) -> None:
+        if self.idle_seconds <= 0:
+            return
+        now = self.clock()
+        idle = [
+            session_id
+            for session_id, session in self._sessions.items()
+            if now - session.last_used > self.idle_seconds
+        ]
+        for session_id in idle:
+            del self._sessions[session_id]
+        self.evictions += len(idle)
+
+    def _evict_over_budget(self) -> None:
+        while self.max_sessions > 0 and len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+
+def apply_change(text: str, change: TextChange) -> str:
+    """Return `text` with one `TextChange` applied; raise ValueError if its range is invalid."""
+    if change.start_line is None or change.end_line is None:
+        return change.text
+    start = _offset(text, change.start_line, change.start_character)
+    end = _offset(text, change.end_line, change.end_character)
+    if end < start:
+        raise ValueError("Change range ends before it starts")
+    return text[:start] + change.text + text[end:]
+
+
+def _offset(text: str, line: int, character: int) -> int:
+    start = 0
+    for _ in range(line):
+        newline = text.find("\n", start)
+        if newline < 0:
+            raise ValueError(f"Line {line} is past the end of the document")
+        start = newline + 1
+    end = text.find("\n", start)
+    # As in LSP, a character past the end of the line means the end of the line.
+    return start + min(character, (len(text) if end < 0 else end) - start)
@@ -1,28 +1,132 @@
 from __future__ import annotations
 
 import asyncio
+import hmac
+import json
 import logging
 import os
-from functools import partial
-from typing import List
+import time
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import replace
+from functools import partial, wraps
+from typing import (
+    Any,
+    Awaitable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel, ValidationError
+from starlette.concurrency import iterate_in_threadpool
 
 from novaedit import __version__
-from novaedit.model import NovaEditModel
-from novaedit.server.api_schemas import EditRequest, EditResponse, StructuredEdit
+from novaedit.languages import adapter_for
+from novaedit.languages.python.patch_apply import merge_edits
+from novaedit.model import CancelToken, NovaEditModel, PatchEdit, PatchRequest
+from novaedit.model.capacity import CapacityPlan, model_config, plan_capacity
+from novaedit.model.modeling_novaedit import CascadeStats, PatchResult, build_patch_dsl
+from novaedit.server.admission import AdmissionQueue, DeadlineExceededError, QueueFullError
+from novaedit.server.api_schemas import (
+    BatchEditRequest,
+    BatchEditResponse,
+    DidChangeRequest,
+    DidCloseRequest,
+    DidOpenRequest,
+    DocumentEditResponse,
+    DocumentState,
+    EditRequest,
+    EditResponse,
+    StructuredEdit,
+)
+from novaedit.server.batching import MicroBatcher
+from novaedit.server.cache import PatchCache, request_cache_key
+from novaedit.server.documents import (
+    Document,
+    DocumentStore,
+    DocumentVersionError,
+    TextChange,
+    UnknownDocumentError,
+)
+from novaedit.server.memory import process_memory
+from novaedit.server.metrics import CONTENT_TYPE, Metrics, MetricsMiddleware
+from novaedit.server.profiler import RequestCountdown, SamplingProfiler
+from novaedit.server.registry import ModelRegistry
+from novaedit.server.singleflight import SingleFlight
+from novaedit.server.workers import ProcessWorkerPool
 
-app = FastAPI(title="NovaEdit", version=__version__)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Start process workers before serving traffic and stop them on shutdown."""
+    if workers is not None:
+        await asyncio.get_running_loop().run_in_executor(None, workers.warm_up)
+    try:
+        yield
+    finally:
+        if workers is not None:
+            workers.shutdown()
+
+
+app = FastAPI(title="NovaEdit", version=__version__, lifespan=lifespan)
 
 MODEL_LANGUAGE = os.getenv("NOVAEDIT_LANGUAGE", "python")
 MODEL_ID = os.getenv("NOVAEDIT_MODEL_ID")
+# Per-language checkpoint overrides, e.g. "javascript=org/js-model,python=org/py-model".
+MODEL_IDS: Dict[str, str] = {
+    lang.strip(): model_id.strip()
+    for lang, _, model_id in (
+        item.partition("=") for item in os.getenv("NOVAEDIT_MODEL_IDS", "").split(",")
+    )
+    if model_id.strip()
+}
+MODEL_IDLE_SECONDS = float(os.getenv("NOVAEDIT_MODEL_IDLE_SECONDS", "900"))
+MODEL_MEMORY_MB = float(os.getenv("NOVAEDIT_MODEL_MEMORY_MB", "0"))
+NATIVE_MODEL_DIR = os.getenv("NOVAEDIT_NATIVE_MODEL_DIR")
+QUANT = os.getenv("NOVAEDIT_QUANT", "none").lower()
+QUANT_CACHE_DIR = os.getenv("NOVAEDIT_QUANT_CACHE_DIR")
+MMAP_WEIGHTS = os.getenv("NOVAEDIT_MMAP_WEIGHTS", "false").lower() in {"1", "true", "yes"}
 MODEL_DEVICE = os.getenv("NOVAEDIT_DEVICE")
+SPECULATIVE = os.getenv("NOVAEDIT_SPECULATIVE", "false").lower() in {"1", "true", "yes"}
+CASCADE = os.getenv("NOVAEDIT_CASCADE", "false").lower() in {"1", "true", "yes"}
+PRECHECK = os.getenv("NOVAEDIT_PRECHECK", "false").lower() in {"1", "true", "yes"}
+PREFIX_CACHE_MB = float(os.getenv("NOVAEDIT_PREFIX_CACHE_MB", "0"))
 SUPPORTED_LANGUAGES = {"python", "javascript"}
 MAX_CODE_LINES = int(os.getenv("NOVAEDIT_MAX_CODE_LINES", "2000"))
 MAX_CONCURRENT = int(os.getenv("NOVAEDIT_MAX_CONCURRENT", "8"))
+WORKERS = int(os.getenv("NOVAEDIT_WORKERS", "0"))
+MEMORY_BUDGET_MB = float(os.getenv("NOVAEDIT_MEMORY_BUDGET_MB", "0"))
+MAX_PROMPT_TOKENS = int(os.getenv("NOVAEDIT_MAX_PROMPT_TOKENS", "0"))
+PLAN_PROMPT_TOKENS = int(os.getenv("NOVAEDIT_PLAN_PROMPT_TOKENS", str(MAX_PROMPT_TOKENS or 1024)))
+PLAN_NEW_TOKENS = int(os.getenv("NOVAEDIT_PLAN_NEW_TOKENS", "256"))
+MAX_BATCH_SIZE = int(os.getenv("NOVAEDIT_MAX_BATCH_SIZE", "8"))
+BATCH_WAIT_MS = float(os.getenv("NOVAEDIT_BATCH_WAIT_MS", "10"))
+QUEUE_DEPTH = int(os.getenv("NOVAEDIT_QUEUE_DEPTH", "64"))
 REQUEST_TIMEOUT = float(os.getenv("NOVAEDIT_REQUEST_TIMEOUT", "15"))
+MAX_BATCH_REGIONS = int(os.getenv("NOVAEDIT_MAX_BATCH_REGIONS", "64"))
+BATCH_TIMEOUT = float(os.getenv("NOVAEDIT_BATCH_TIMEOUT", "60"))
+DISCONNECT_POLL_SECONDS = 0.1
+MAX_SESSIONS = int(os.getenv("NOVAEDIT_MAX_SESSIONS", "256"))
+SESSION_IDLE_SECONDS = float(os.getenv("NOVAEDIT_SESSION_IDLE_SECONDS", "1800"))
+MAX_DOCUMENT_CHARS = 1_000_000
+CACHE_MAX_MB = float(os.getenv("NOVAEDIT_CACHE_MAX_MB", "64"))
+CACHE_TTL = float(os.getenv("NOVAEDIT_CACHE_TTL", "600"))
+CACHE_DIR = os.getenv("NOVAEDIT_CACHE_DIR")
 LOG_REQUESTS = os.getenv("NOVAEDIT_LOG_REQUESTS", "false").lower() in {"1", "true", "yes"}
+# Enables the /admin endpoints; requests must send `Authorization: Bearer <token>`.
+ADMIN_TOKEN = os.getenv("NOVAEDIT_ADMIN_TOKEN", "")
+MAX_PROFILE_SECONDS = 60.0
+METRICS = os.getenv("NOVAEDIT_METRICS", "true").lower() in {"1", "true", "yes"}
 CORS_ORIGINS = os.getenv("NOVAEDIT_CORS_ORIGINS", "")
 ORIGINS: List[str] = [o.strip() for o in CORS_ORIGINS.split(",") if o.strip()]
 
@@ -35,66 +139,838 @@ if ORIGINS:
         allow_headers=["*"],
     )
 
-model = NovaEditModel(language=MODEL_LANGUAGE, hf_model_id=MODEL_ID, device=MODEL_DEVICE)
-semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+metrics = Metrics()
+if METRICS:
+    app.add_middleware(MetricsMiddleware, metrics=metrics)
+
+
+def _checkpoint_for(language: str) -> Optional[str]:
+    return NATIVE_MODEL_DIR or MODEL_IDS.get(language, MODEL_ID)
+
+
+def _load_checkpoint(checkpoint: Optional[str], language: str) -> NovaEditModel:
+    loaded = NovaEditModel(
+        language=language,
+        hf_model_id=None if NATIVE_MODEL_DIR else checkpoint,
+        device=MODEL_DEVICE,
+        speculative=SPECULATIVE,
+        prefix_cache_bytes=int(PREFIX_CACHE_MB * 1024 * 1024),
+        native_model_dir=NATIVE_MODEL_DIR,
+        quantization=QUANT,
+        quant_cache_dir=QUANT_CACHE_DIR,
+        mmap_weights=MMAP_WEIGHTS,
+        cascade=CASCADE,
+        precheck=PRECHECK,
+        max_prompt_tokens=MAX_PROMPT_TOKENS,
+    )
+    # Shared with every language view of this checkpoint.
+    loaded.observer = metrics if METRICS else None
+    return loaded
+
+
+# One micro-batcher per loaded language, dropped with the language's model.
+batchers: Dict[str, MicroBatcher] = {}
+registry = ModelRegistry(
+    _checkpoint_for,
+    _load_checkpoint,
+    idle_seconds=MODEL_IDLE_SECONDS,
+    max_bytes=int(MODEL_MEMORY_MB * 1024 * 1024),
+    pinned=[MODEL_LANGUAGE],
+    on_evict=lambda language: batchers.pop(language, None),
+)
+# The default language is loaded up front; others load on their first request.
+model = registry.get(MODEL_LANGUAGE)
 logger = logging.getLogger("novaedit.server")
+
+
+def _plan_capacity(loaded: NovaEditModel) -> Optional[CapacityPlan]:
+    try:
+        config = model_config(loaded)
+    except ValueError as exc:
+        logger.warning("NOVAEDIT_MEMORY_BUDGET_MB is ignored: %s", exc)
+        return None
+    if config is None:
+        logger.warning("NOVAEDIT_MEMORY_BUDGET_MB is ignored for the heuristic backend")
+        return None
+    try:
+        return plan_capacity(
+            config,
+            int(MEMORY_BUDGET_MB * 1024 * 1024),
+            PLAN_PROMPT_TOKENS,
+            PLAN_NEW_TOKENS,
+            quantization=loaded.quantization,
+            preallocated=loaded.backend == "native",
+        )
+    except ValueError as exc:
+        logger.warning("Keeping the configured limits: %s", exc)
+        return None
+
+
+# With a memory budget, limits that are not set explicitly come from the plan.
+capacity_plan = _plan_capacity(model) if MEMORY_BUDGET_MB > 0 else None
+if capacity_plan is not None:
+    if "NOVAEDIT_MAX_CONCURRENT" not in os.environ:
+        MAX_CONCURRENT = capacity_plan.max_concurrent
+    if "NOVAEDIT_MAX_BATCH_SIZE" not in os.environ:
+        MAX_BATCH_SIZE = capacity_plan.max_batch_size
+admission = AdmissionQueue(MAX_CONCURRENT, QUEUE_DEPTH)
+cache = PatchCache(max_bytes=int(CACHE_MAX_MB * 1024 * 1024), ttl=CACHE_TTL, disk_dir=CACHE_DIR)
+inflight = SingleFlight()
+documents = DocumentStore(MAX_SESSIONS, SESSION_IDLE_SECONDS, max_chars=MAX_DOCUMENT_CHARS)
+# Generations stopped early because nobody is waiting for the result any more.
+cancellations: Dict[str, int] = {"timeout": 0, "disconnect": 0}
+# Set while an admin profile is waiting for the next edit requests to finish.
+profile_countdown: Optional[RequestCountdown] = None
+profile_lock = asyncio.Lock()
 logging.basicConfig(level=logging.INFO if LOG_REQUESTS else logging.WARNING)
+# Process workers only pay off for the pure-Python heuristics; model backends
+# would need a copy of the weights per process.
+workers = (
+    ProcessWorkerPool(WORKERS, language=MODEL_LANGUAGE, cascade=CASCADE, precheck=PRECHECK)
+    if WORKERS > 0 and model.backend == "heuristic"
+    else None
+)
+if workers is not None:
+    workers.observer = metrics if METRICS else None
+if WORKERS > 0 and workers is None:
+    logger.warning("NOVAEDIT_WORKERS is ignored for the %s backend", model.backend)
+metrics.gauge("novaedit_queue_depth", "Requests waiting for admission.", lambda: admission.depth)
+metrics.gauge("novaedit_requests_running", "Admitted requests running.", lambda: admission.running)
+metrics.gauge(
+    "novaedit_inflight_generations", "Distinct generations in flight.", lambda: inflight.in_flight
+)
+metrics.gauge(
+    "novaedit_models_loaded",
+    "Languages with a loaded model.",
+    lambda: len(registry.stats()["languages"]),
+)
+metrics.gauge(
+    "novaedit_document_sessions", "Open document sessions.", lambda: documents.stats()["sessions"]
+)
+metrics.gauge(
+    "novaedit_process_resident_bytes",
+    "Resident memory of this server process.",
+    lambda: process_memory()["rss_bytes"] or 0,
+)
+
+
+def _cascade_stats() -> CascadeStats:
+    if workers is None:
+        return model.cascade_stats
+    # Requests answered in worker processes are counted by the pool.
+    return model.cascade_stats.merged(workers.cascade_stats)
 
 
 @app.get("/health")
 async def health() -> dict[str, object]:
-    backend = "hf" if MODEL_ID else "heuristic"
     return {
         "status": "ok",
         "version": __version__,
-        "backend": backend,
+        "backend": model.backend,
+        "quantization": model.quantization,
+        "weights_mmapped": model.weights_mmapped,
         "language": MODEL_LANGUAGE,
+        "max_batch_size": MAX_BATCH_SIZE if model.supports_batching else 1,
+        "max_concurrent": MAX_CONCURRENT,
+        "capacity": capacity_plan.to_dict() if capacity_plan else None,
+        "models": registry.stats(),
+        "queue": admission.stats(),
+        "cache": cache.stats(),
+        "inflight": inflight.stats(),
+        "documents": documents.stats(),
+        # This process only: each uvicorn worker answers for itself.
+        "memory": process_memory(),
+        "workers": workers.stats() if workers else None,
+        "cancellations": cancellations,
+        "speculative": model.speculative_stats.to_dict() if SPECULATIVE else None,
+        "cascade": _cascade_stats().to_dict() if CASCADE or PRECHECK else None,
+        "prefix_cache": model.prefix_cache.stats() if model.prefix_cache else None,
         "cors": ORIGINS,
     }
 
 
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> PlainTextResponse:
+    if not METRICS:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=CONTENT_TYPE)
+
+
+@app.post("/admin/profile", include_in_schema=False)
+async def profile(
+    http_request: Request,
+    seconds: float = 10.0,
+    requests: int = 0,
+    interval_ms: float = 5.0,
+    include_idle: bool = False,
+) -> PlainTextResponse:
+    """Sample every thread's stack for `seconds`, or until `requests` edit calls finish.
+
+    Returns collapsed stacks (`root;...;leaf count` per line) ready for
+    flamegraph.pl or speedscope. Never runs longer than `MAX_PROFILE_SECONDS`.
+    """
+    _check_admin(http_request)
+    if workers is not None:
+        # The sampler only sees this process's threads, not the edits running in workers.
+        raise HTTPException(
+            status_code=409, detail="Profiling is unavailable while edits run in worker processes"
+        )
+    if profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running")
+    if interval_ms < 1:
+        raise HTTPException(status_code=400, detail="interval_ms must be >= 1")
+    global profile_countdown
+    async with profile_lock:
+        profiler = SamplingProfiler(interval_ms / 1000, include_idle=include_idle)
+        profiler.start()
+        try:
+            if requests > 0:
+                profile_countdown = RequestCountdown(requests)
+                try:
+                    await asyncio.wait_for(profile_countdown.wait(), MAX_PROFILE_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(max(0.0, min(seconds, MAX_PROFILE_SECONDS)))
+        finally:
+            profile_countdown = None
+            await asyncio.get_running_loop().run_in_executor(None, profiler.stop)
+    return PlainTextResponse(
+        profiler.collapsed(), headers={"X-Profile-Samples": str(profiler.samples)}
+    )
+
+
 @app.post("/v1/edit", response_model=EditResponse)
-async def edit(request: EditRequest) -> EditResponse:
+async def edit(request: EditRequest, http_request: Request) -> EditResponse:
+    _observe_decode(http_request)
+    return await _unless_disconnected(http_request, _edit(request))
+
+
+def _profiled(handler: Callable[[Any], Awaitable[T]]) -> Callable[[Any], Awaitable[T]]:
+    """Count each finished call of an edit `handler` towards a `requests=N` profile."""
+
+    @wraps(handler)
+    async def counted(request: Any) -> T:
+        try:
+            return await handler(request)
+        finally:
+            _profiled_request_finished()
+
+    return counted
+
+
+def _profiled_request_finished() -> None:
+    if profile_countdown is not None:
+        profile_countdown.finished()
+
+
+@_profiled
+async def _edit(request: EditRequest) -> EditResponse:
+    """Answer one edit request from the response cache or a (possibly shared) generation."""
+    request, document = _resolve_document(request)
+    _validate_request(request)
+    patch_request = _to_patch_request(request, await _parsed(document))
+    cache_key = _cache_key(patch_request, request.language, request.max_edits)
+    cached = cache.get(cache_key) if cache.enabled else None
+    if cached is not None:
+        return _build_response(*cached, max_edits=request.max_edits)
+
+    # Identical concurrent requests share a single generation; it is cancelled
+    # once every client waiting for it has disconnected.
+    edits, patch_dsl = await inflight.run(
+        cache_key, partial(_generate, request, patch_request, cache_key)
+    )
+    return _build_response(edits, patch_dsl, max_edits=request.max_edits)
+
+
+@app.post("/v1/edit/stream")
+async def edit_stream(request: EditRequest, http_request: Request) -> StreamingResponse:
+    """Stream edits as NDJSON: one `{"edit": ...}` line per hunk, then a `{"done": true}` line."""
+    _observe_decode(http_request)
+    try:
+        request, document = _resolve_document(request)
+        _validate_request(request)
+        patch_request = _to_patch_request(request, await _parsed(document))
+        cache_key = _cache_key(patch_request, request.language, request.max_edits)
+        cached = cache.get(cache_key) if cache.enabled else None
+        if cached is not None:
+            _profiled_request_finished()
+            return StreamingResponse(
+                _ndjson_lines(iter(cached[0]), request, patch_request), media_type=NDJSON
+            )
+
+        language_model = await _model_for(request.language)
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + REQUEST_TIMEOUT
+        await _admit(request, deadline)
+    except BaseException:
+        # Rejected before streaming (400/404/429/504): counted like a failed `/v1/edit`.
+        _profiled_request_finished()
+        raise
+    cancel = CancelToken()
+    released = False
+
+    def release() -> None:
+        nonlocal released
+        if not released:
+            released = True
+            # Stops the decode thread if the stream ended early (timeout, disconnect).
+            cancel.cancel()
+            admission.release()
+            _profiled_request_finished()
+
+    edits = language_model.stream_patch(
+        code=patch_request.code,
+        start_line=patch_request.start_line,
+        end_line=patch_request.end_line,
+        diagnostics=patch_request.diagnostics,
+        instruction=patch_request.instruction,
+        max_edits=patch_request.max_edits,
+        cancel=cancel,
+        tree=patch_request.tree,
+    )
+    lines = _ndjson_lines(edits, request, patch_request, cache_key=cache_key, deadline=deadline)
+    # The release also runs as a background task in case the client disconnects
+    # before the body iterator ever starts.
+    return StreamingResponse(
+        _release_after(lines, release), media_type=NDJSON, background=BackgroundTask(release)
+    )
+
+
+@app.post("/v1/documents/open", response_model=DocumentState)
+async def did_open(request: DidOpenRequest) -> DocumentState:
+    """Start tracking a document for a session (LSP `textDocument/didOpen`)."""
+    _validate_language(request.language)
+    with _document_errors():
+        document = documents.open(
+            request.session_id, request.uri, request.language, request.version, request.text
+        )
+    return _document_state(request.session_id, document)
+
+
+@app.post("/v1/documents/change", response_model=DocumentState)
+async def did_change(request: DidChangeRequest) -> DocumentState:
+    """Apply incremental changes to an open document (LSP `textDocument/didChange`)."""
+    changes = [
+        TextChange(text=change.text)
+        if change.range is None
+        else TextChange(
+            text=change.text,
+            start_line=change.range.start.line,
+            start_character=change.range.start.character,
+            end_line=change.range.end.line,
+            end_character=change.range.end.character,
+        )
+        for change in request.changes
+    ]
+    with _document_errors():
+        document = documents.change(request.session_id, request.uri, request.version, changes)
+    return _document_state(request.session_id, document)
+
+
+@app.post("/v1/documents/close")
+async def did_close(request: DidCloseRequest) -> dict[str, bool]:
+    """Stop tracking a document (LSP `textDocument/didClose`)."""
+    with _document_errors():
+        documents.close(request.session_id, request.uri)
+    return {"closed": True}
+
+
+@app.post("/v1/edit:batch", response_model=BatchEditResponse)
+async def edit_batch(request: BatchEditRequest, http_request: Request) -> BatchEditResponse:
+    """Edit many regions of one or more files in a single call.
+
+    The batch takes one admission slot and its uncached regions are generated
+    together, per language; each document also gets a merged patch with
+    overlapping edits dropped.
+    """
+    _observe_decode(http_request)
+    return await _unless_disconnected(http_request, _edit_batch(request))
+
+
+@_profiled
+async def _edit_batch(request: BatchEditRequest) -> BatchEditResponse:
+    if sum(len(document.regions) for document in request.documents) > MAX_BATCH_REGIONS:
+        raise HTTPException(
+            status_code=400, detail=f"Too many regions; limit {MAX_BATCH_REGIONS} per batch."
+        )
+    jobs: List[List[Tuple[PatchRequest, str]]] = []
+    for document in request.documents:
+        _validate_code(document.language, document.code)
+        document_jobs = []
+        for region in document.regions:
+            if region.start_line > region.end_line:
+                raise HTTPException(status_code=400, detail="start_line must be <= end_line")
+            patch_request = PatchRequest(
+                code=document.code,
+                start_line=region.start_line,
+                end_line=region.end_line,
+                diagnostics=list(region.diagnostics),
+                instruction=region.instruction or "",
+                max_edits=region.max_edits,
+            )
+            cache_key = _cache_key(patch_request, document.language, region.max_edits)
+            document_jobs.append((patch_request, cache_key))
+        jobs.append(document_jobs)
+
+    results: Dict[str, PatchResult] = {}
+    misses: Dict[str, Tuple[str, PatchRequest]] = {}
+    for document, document_jobs in zip(request.documents, jobs):
+        for patch_request, cache_key in document_jobs:
+            cached = cache.get(cache_key) if cache.enabled else None
+            if cached is not None:
+                results[cache_key] = cached
+            else:
+                # Repeated regions are generated once.
+                misses[cache_key] = (document.language, patch_request)
+    if misses:
+        generated = await _generate_batch(request, misses)
+        results.update(generated)
+
+    responses = []
+    for document, document_jobs in zip(request.documents, jobs):
+        regions = [
+            results[cache_key][0][: patch_request.max_edits]
+            for patch_request, cache_key in document_jobs
+        ]
+        merged, conflicts = merge_edits(regions)
+        responses.append(
+            DocumentEditResponse(
+                file_path=document.file_path,
+                regions=[
+                    _build_response(
+                        edits,
+                        build_patch_dsl(document.code.splitlines(), edits),
+                        max_edits=patch_request.max_edits,
+                    )
+                    for edits, (patch_request, _) in zip(regions, document_jobs)
+                ],
+                edits=_structured_edits(merged),
+                raw_patch_dsl=build_patch_dsl(document.code.splitlines(), merged),
+                conflicts=conflicts,
+            )
+        )
+    return BatchEditResponse(documents=responses)
+
+
+@app.websocket("/v1/ws")
+async def edit_socket(websocket: WebSocket) -> None:
+    """Multiplex edit and document calls over one connection.
+
+    Each message is `{"id": ..., "type": ..., "params": {...}}`, where `type`
+    is one of `SOCKET_CALLS` and `params` is that call's HTTP request body.
+    Calls run concurrently and each is answered as soon as it finishes, in any
+    order, with `{"id": ..., "status": 200, "result": ...}` or `{"id": ...,
+    "status": <code>, "error": ...}`. `{"id": ..., "type": "cancel"}` stops a
+    pending call, which is then answered with status 499; closing the socket
+    cancels every pending call.
+    """
+    await websocket.accept()
+    pending: Dict[str, asyncio.Task] = {}
+    send_lock = asyncio.Lock()
+    closed = False
+
+    async def reply(message: Dict[str, object]) -> None:
+        async with send_lock:
+            if not closed:
+                await websocket.send_text(json.dumps(message))
+
+    async def run(call_id: str, work: Awaitable[object]) -> None:
+        try:
+            result = await work
+        except HTTPException as exc:
+            await reply({"id": call_id, "status": exc.status_code, "error": exc.detail})
+        except asyncio.CancelledError:
+            await reply({"id": call_id, "status": 499, "error": "Cancelled"})
+        except Exception:
+            logger.exception("WebSocket call %s failed", call_id)
+            await reply({"id": call_id, "status": 500, "error": "Internal server error"})
+        else:
+            if isinstance(result, BaseModel):
+                result = result.model_dump()
+            await reply({"id": call_id, "status": 200, "result": result})
+        finally:
+            pending.pop(call_id, None)
+
+    try:
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                call_id = str(message["id"])
+                call_type = message["type"]
+            except (ValueError, KeyError, TypeError):
+                await reply({"id": None, "status": 400, "error": "Malformed message"})
+                continue
+            if call_type == "cancel":
+                task = pending.get(call_id)
+                if task is not None:
+                    task.cancel()
+                continue
+            if call_id in pending:
+                await reply({"id": call_id, "status": 400, "error": "Duplicate call id"})
+                continue
+            if call_type not in SOCKET_CALLS:
+                await reply({"id": call_id, "status": 400, "error": f"Unknown type: {call_type}"})
+                continue
+            schema, handler = SOCKET_CALLS[call_type]
+            try:
+                params = schema.model_validate(message.get("params") or {})
+            except ValidationError as exc:
+                errors = json.loads(exc.json(include_url=False))
+                await reply({"id": call_id, "status": 422, "error": errors})
+                continue
+            pending[call_id] = asyncio.ensure_future(run(call_id, handler(params)))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        closed = True
+        for task in list(pending.values()):
+            task.cancel()
+
+
+@contextmanager
+def _document_errors() -> Iterator[None]:
+    try:
+        yield
+    except UnknownDocumentError as exc:
+        raise HTTPException(status_code=404, detail=str(exc))
+    except DocumentVersionError as exc:
+        raise HTTPException(status_code=409, detail=str(exc))
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+def _document_state(session_id: str, document: Document) -> DocumentState:
+    return DocumentState(
+        session_id=session_id,
+        uri=document.uri,
+        version=document.version,
+        lines=document.text.count("\n") + 1,
+    )
+
+
+def _resolve_document(request: EditRequest) -> Tuple[EditRequest, Optional[Document]]:
+    """Fill in `code` and `language` from the session document a request refers to."""
+    if request.code is not None:
+        return request, None
+    if not request.session_id or not request.document_uri:
+        raise HTTPException(
+            status_code=400, detail="Either code or session_id and document_uri is required"
+        )
+    with _document_errors():
+        document = documents.get(
+            request.session_id, request.document_uri, request.document_version
+        )
+    update = {"code": document.text, "language": document.language}
+    return request.model_copy(update=update), document
+
+
+async def _parsed(document: Optional[Document]) -> Any:
+    """AST of a session document, parsed once per version and off the event loop.
+
+    Only the NO_EDIT pre-check and model prompts read it; None otherwise.
+    """
+    if document is None or not (PRECHECK or _checkpoint_for(document.language)):
+        return None
+    adapter = adapter_for(document.language)
+    if adapter is None:
+        return None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, document.parse, adapter.parse_ast)
+
+
+def _validate_request(request: EditRequest) -> None:
     if request.start_line > request.end_line:
         raise HTTPException(status_code=400, detail="start_line must be <= end_line")
-    if request.language not in SUPPORTED_LANGUAGES:
-        raise HTTPException(status_code=400, detail=f"Unsupported language: {request.language}")
-    if request.code.count("\n") > MAX_CODE_LINES:
+    _validate_code(request.language, request.code)
+
+
+def _validate_code(language: str, code: str) -> None:
+    _validate_language(language)
+    if code.count("\n") > MAX_CODE_LINES:
         raise HTTPException(
             status_code=400,
             detail=f"Code snippet too large; limit {MAX_CODE_LINES} lines.",
         )
 
-    if semaphore.locked():
-        raise HTTPException(status_code=429, detail="Too many concurrent requests")
-    await semaphore.acquire()
+
+def _validate_language(language: str) -> None:
+    if language not in SUPPORTED_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Unsupported language: {language}")
+
+
+def _to_patch_request(request: EditRequest, tree: Any = None) -> PatchRequest:
+    return PatchRequest(
+        code=request.code,
+        start_line=request.start_line,
+        end_line=request.end_line,
+        diagnostics=list(request.diagnostics),
+        instruction=request.instruction or "",
+        max_edits=request.max_edits,
+        tree=tree,
+    )
+
+
+def _model_key(language: str) -> str:
+    """Identity of the model serving `language`, mixed into response cache keys."""
+    return f"{_checkpoint_for(language) or 'heuristic'}:{QUANT}@{__version__}"
+
+
+def _cache_key(patch_request: PatchRequest, language: str, max_edits: int) -> str:
+    # The pre-check and cascade read the whole buffer, and so do model prompts
+    # (the enclosing scope of a diagnostic); the region alone does not decide them.
+    whole_buffer = PRECHECK or CASCADE or _checkpoint_for(language) is not None
+    return request_cache_key(patch_request, language, max_edits, _model_key(language), whole_buffer)
+
+
+async def _model_for(language: str) -> NovaEditModel:
+    """Model for `language`; a first request for it loads the model off the event loop."""
+    registry.evict_idle()
+    if registry.is_loaded(language):
+        return registry.get(language)
+    return await asyncio.get_running_loop().run_in_executor(None, registry.get, language)
+
+
+def _batcher_for(language_model: NovaEditModel) -> Optional[MicroBatcher]:
+    if not language_model.supports_batching or MAX_BATCH_SIZE <= 1:
+        return None
+    batcher = batchers.get(language_model.language)
+    if batcher is None:
+        batcher = MicroBatcher(
+            language_model.generate_patch_batch,
+            max_batch_size=MAX_BATCH_SIZE,
+            max_wait=BATCH_WAIT_MS / 1000,
+        )
+        batchers[language_model.language] = batcher
+    return batcher
+
+
+async def _admit(request: EditRequest | BatchEditRequest, deadline: float) -> None:
+    try:
+        waited = await admission.acquire(request.priority, deadline)
+    except QueueFullError:
+        raise HTTPException(status_code=429, detail="Too many queued requests")
+    except DeadlineExceededError:
+        raise HTTPException(status_code=504, detail="Request timed out while queued")
+    if METRICS:
+        metrics.stage("queue", waited)
+
+
+def _check_admin(http_request: Request) -> None:
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    supplied = http_request.headers.get("authorization", "")
+    if not hmac.compare_digest(supplied.encode(), f"Bearer {ADMIN_TOKEN}".encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def _observe_decode(http_request: Request) -> None:
+    """Record the time from the request's arrival to its handler: body read and validation."""
+    start = http_request.scope.get(MetricsMiddleware.START_KEY)
+    if start is not None:
+        metrics.stage("decode", time.perf_counter() - start)
+
+
+T = TypeVar("T")
+
+
+async def _unless_disconnected(http_request: Request, work: Awaitable[T]) -> T:
+    """Await `work`, cancelling it if the client disconnects first."""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
+
+
+async def _generate(
+    request: EditRequest, patch_request: PatchRequest, cache_key: str
+) -> PatchResult:
+    language_model = await _model_for(request.language)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + REQUEST_TIMEOUT
+    await _admit(request, deadline)
+    cancel = CancelToken()
+    patch_request = replace(patch_request, cancel=cancel)
+    batcher = _batcher_for(language_model)
     try:
         if LOG_REQUESTS:
             logger.info("edit request language=%s start=%s end=%s", request.language, request.start_line, request.end_line)
-        loop = asyncio.get_running_loop()
-        generate = partial(
-            model.generate_patch,
-            code=request.code,
-            start_line=request.start_line,
-            end_line=request.end_line,
-            diagnostics=request.diagnostics,
-            instruction=request.instruction,
-        )
-        edits, patch_dsl = await asyncio.wait_for(loop.run_in_executor(None, generate), timeout=REQUEST_TIMEOUT)
+        if batcher is not None:
+            pending = batcher.submit(patch_request)
+        elif workers is not None and language_model.backend == "heuristic":
+            pending = workers.submit(patch_request, request.language)
+        else:
+            generate = partial(
+                language_model.generate_patch,
+                code=patch_request.code,
+                start_line=patch_request.start_line,
+                end_line=patch_request.end_line,
+                diagnostics=patch_request.diagnostics,
+                instruction=patch_request.instruction,
+                max_edits=patch_request.max_edits,
+                cancel=cancel,
+                tree=patch_request.tree,
+            )
+            pending = loop.run_in_executor(None, generate)
+        edits, patch_dsl = await asyncio.wait_for(pending, timeout=deadline - loop.time())
+    except asyncio.TimeoutError:
+        cancel.cancel()
+        cancellations["timeout"] += 1
+        raise HTTPException(status_code=504, detail="Request timed out")
+    except asyncio.CancelledError:
+        # Every client waiting on this generation went away.
+        cancel.cancel()
+        cancellations["disconnect"] += 1
+        raise
+    finally:
+        admission.release()
+
+    if cache.enabled:
+        cache.put(cache_key, (edits, patch_dsl))
+    return edits, patch_dsl
+
+
+async def _generate_batch(
+    request: BatchEditRequest, misses: Dict[str, Tuple[str, PatchRequest]]
+) -> Dict[str, PatchResult]:
+    """Generate the uncached regions of a batch, one model call per language."""
+    by_language: Dict[str, List[str]] = {}
+    for cache_key, (language, _) in misses.items():
+        by_language.setdefault(language, []).append(cache_key)
+    language_models = {language: await _model_for(language) for language in by_language}
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + BATCH_TIMEOUT
+    await _admit(request, deadline)
+    cancel = CancelToken()
+    try:
+        if LOG_REQUESTS:
+            logger.info("batch edit request regions=%s", len(misses))
+        pending = []
+        for language, keys in by_language.items():
+            language_model = language_models[language]
+            requests = [replace(misses[key][1], cancel=cancel) for key in keys]
+            if workers is not None and language_model.backend == "heuristic":
+                pending.append(
+                    asyncio.gather(*(workers.submit(r, language) for r in requests))
+                )
+            else:
+                pending.append(
+                    loop.run_in_executor(None, _generate_chunked, language_model, requests)
+                )
+        outputs = await asyncio.wait_for(asyncio.gather(*pending), timeout=deadline - loop.time())
     except asyncio.TimeoutError:
+        cancel.cancel()
+        cancellations["timeout"] += 1
         raise HTTPException(status_code=504, detail="Request timed out")
+    except asyncio.CancelledError:
+        cancel.cancel()
+        cancellations["disconnect"] += 1
+        raise
     finally:
-        semaphore.release()
+        admission.release()
 
-    structured = [
+    generated: Dict[str, PatchResult] = {}
+    for keys, results in zip(by_language.values(), outputs):
+        generated.update(zip(keys, results))
+    if cache.enabled:
+        for cache_key, result in generated.items():
+            cache.put(cache_key, result)
+    return generated
+
+
+def _generate_chunked(
+    language_model: NovaEditModel, requests: List[PatchRequest]
+) -> List[PatchResult]:
+    """Run `requests` through the model in batches of at most `MAX_BATCH_SIZE`."""
+    size = max(1, MAX_BATCH_SIZE)
+    results: List[PatchResult] = []
+    for start in range(0, len(requests), size):
+        results.extend(language_model.generate_patch_batch(requests[start : start + size]))
+    return results
+
+
+NDJSON = "application/x-ndjson"
+
+
+async def _ndjson_lines(
+    edits: Iterable[PatchEdit],
+    request: EditRequest,
+    patch_request: PatchRequest,
+    cache_key: str | None = None,
+    deadline: float | None = None,
+) -> AsyncIterator[str]:
+    loop = asyncio.get_running_loop()
+    emitted: List[PatchEdit] = []
+    iterator = iterate_in_threadpool(iter(edits))
+    while len(emitted) < request.max_edits:
+        timeout = None if deadline is None else deadline - loop.time()
+        try:
+            edit = await asyncio.wait_for(iterator.__anext__(), timeout=timeout)
+        except StopAsyncIteration:
+            break
+        except asyncio.TimeoutError:
+            cancellations["timeout"] += 1
+            yield json.dumps({"error": "Request timed out"}) + "\n"
+            return
+        emitted.append(edit)
+        structured = StructuredEdit(
+            start_line=edit.start_line, end_line=edit.end_line, replacement=edit.replacement
+        )
+        yield json.dumps({"edit": structured.model_dump()}) + "\n"
+    else:
+        # Stopped at max_edits; a truncated patch must not be cached as complete.
+        cache_key = None
+
+    patch_dsl = build_patch_dsl(patch_request.code.splitlines(), emitted)
+    if cache_key is not None and cache.enabled:
+        cache.put(cache_key, (emitted, patch_dsl))
+    model_version = EditResponse.model_fields["model_version"].default
+    done = {"done": True, "raw_patch_dsl": patch_dsl, "model_version": model_version}
+    yield json.dumps(done) + "\n"
+
+
+async def _release_after(lines: AsyncIterator[str], release) -> AsyncIterator[str]:
+    finished = False
+    try:
+        async for line in lines:
+            yield line
+        finished = True
+    finally:
+        if not finished:
+            cancellations["disconnect"] += 1
+        release()
+
+
+def _build_response(edits: List[PatchEdit], patch_dsl: str, max_edits: int) -> EditResponse:
+    return EditResponse(edits=_structured_edits(edits[:max_edits]), raw_patch_dsl=patch_dsl)
+
+
+def _structured_edits(edits: Iterable[PatchEdit]) -> List[StructuredEdit]:
+    return [
         StructuredEdit(
             start_line=e.start_line,
             end_line=e.end_line,
             replacement=e.replacement,
         )
-        for e in edits[: request.max_edits]
+        for e in edits
     ]
-    return EditResponse(edits=structured, raw_patch_dsl=patch_dsl)
+
+
+# Calls accepted over `/v1/ws`: message type -> (request schema, handler).
+SOCKET_CALLS: Dict[str, Tuple[type, Callable[..., Awaitable[object]]]] = {
+    "edit": (EditRequest, _edit),
+    "edit:batch": (BatchEditRequest, _edit_batch),
+    "open": (DidOpenRequest, did_open),
+    "change": (DidChangeRequest, did_change),
+    "close": (DidCloseRequest, did_close),
+}
 
 
 def get_app() -> FastAPI:
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional, Union
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore
+
+# Fields of /proc/<pid>/status and /proc/<pid>/smaps_rollup reported, in kB there.
+_STATUS_FIELDS = {
+    "VmRSS": "rss_bytes",
+    "VmHWM": "peak_rss_bytes",
+    "RssAnon": "anon_bytes",
+    "RssFile": "file_bytes",
+}
+_ROLLUP_FIELDS = {"Pss": "pss_bytes"}
+
+
+def process_memory(pid: Union[int, str] = "self") -> Dict[str, Optional[int]]:
+    """Resident memory of process `pid`.
+
+    `file_bytes` counts file-backed pages such as memory-mapped weights, which
+    processes mapping the same file share; `pss_bytes` splits shared pages
+    evenly between the processes mapping them, so summing it over workers gives
+    their real footprint. Off Linux only `rss_bytes` and `peak_rss_bytes` are
+    reported, both as the peak of the current process.
+    """
+    proc = Path("/proc") / str(pid)
+    memory: Dict[str, Optional[int]] = {"pid": os.getpid() if pid == "self" else int(pid)}
+    memory.update(dict.fromkeys([*_STATUS_FIELDS.values(), *_ROLLUP_FIELDS.values()]))
+    if not proc.exists():
+        if pid == "self" and resource is not None:
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            # ru_maxrss is in bytes on macOS and in kB elsewhere.
+            peak = peak if sys.platform == "darwin" else peak * 1024
+            memory["rss_bytes"] = memory["peak_rss_bytes"] = peak
+        return memory
+    memory.update(_read_kb(proc / "status", _STATUS_FIELDS))
+    memory.update(_read_kb(proc / "smaps_rollup", _ROLLUP_FIELDS))
+    return memory
+
+
+def _read_kb(path: Path, fields: Dict[str, str]) -> Dict[str, int]:
+    try:
+        text = path.read_text()
+    except OSError:
+        return {}
+    found = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(":")
+        if key in fields:
+            found[fields[key]] = int(value.split()[0]) * 1024
+    return found
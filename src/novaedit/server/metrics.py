@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Seconds; spans sub-millisecond stages (prompt building, patch DSL) to slow generations.
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0
+)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    """Prometheus histogram with optional labels; observations are a bisect and two adds."""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        # labels -> (per-bucket counts with a final +Inf slot, sum)
+        self._series: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(c), total[0]) for labels, (c, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            base = _labels(self.label_names, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket = _join(base, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{bucket} {cumulative}")
+            lines.append(f"{self.name}_sum{_join(base)} {total}")
+            lines.append(f"{self.name}_count{_join(base)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f"{self.name}{_join(_labels(self.label_names, labels))} {value}")
+        return lines
+
+
+class Gauge:
+    """Gauge read from `read()` at scrape time, so it costs nothing between scrapes."""
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.read = read
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {float(self.read())}",
+        ]
+
+
+class Metrics:
+    """Server metrics in Prometheus text format.
+
+    Also acts as the `ModelObserver` for the served models: model stages land
+    in `novaedit_stage_seconds` next to the server's own stages (decode,
+    queue), token counts in `novaedit_tokens_total` and the cascade tier that
+    answered each request in `novaedit_cascade_requests_total`.
+    """
+
+    def __init__(self) -> None:
+        self.stage_seconds = Histogram(
+            "novaedit_stage_seconds", "Time spent per request stage.", ("stage",)
+        )
+        self.request_seconds = Histogram(
+            "novaedit_request_seconds", "HTTP request latency.", ("path", "status")
+        )
+        self.tokens_total = Counter(
+            "novaedit_tokens_total", "Prompt and generated tokens.", ("direction",)
+        )
+        self.cascade_requests = Counter(
+            "novaedit_cascade_requests_total", "Requests answered per cascade tier.", ("tier",)
+        )
+        self.gauges: List[Gauge] = []
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> None:
+        self.gauges.append(Gauge(name, help, read))
+
+    def stage(self, name: str, seconds: float) -> None:
+        self.stage_seconds.observe(seconds, name)
+
+    def tokens(self, prompt_tokens: int, generated_tokens: int) -> None:
+        self.tokens_total.inc(prompt_tokens, "prompt")
+        self.tokens_total.inc(generated_tokens, "generated")
+
+    def tier(self, name: str) -> None:
+        self.cascade_requests.inc(1, name)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        metrics = (self.stage_seconds, self.request_seconds, self.tokens_total)
+        for metric in (*metrics, self.cascade_requests, *self.gauges):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing HTTP requests into `Metrics.request_seconds`.
+
+    The request's arrival time is left in the scope under `START_KEY` so
+    handlers can time what happened before they ran (body parsing and
+    validation). Unlike `BaseHTTPMiddleware` this does not wrap the response
+    body, so streaming and disconnect detection are unaffected.
+    """
+
+    START_KEY = "novaedit.start"
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        scope[self.START_KEY] = start
+        status = ["500"]
+
+        async def send_with_status(message) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Label by route template, not raw path, to keep the series count bounded.
+            path = getattr(scope.get("route"), "path", "other")
+            self.metrics.request_seconds.observe(time.perf_counter() - start, path, status[0])
+
+
+def _labels(names: Sequence[str], values: Sequence[str]) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+
+def _join(*parts: str) -> str:
+    parts = tuple(p for p in parts if p)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+import sys
+import sysconfig
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+# Innermost frames of threads that are parked rather than working: the event
+# loop waiting in `select`, and idle executor or timer threads.
+IDLE_FRAMES = {
+    ("selectors.py", "select"),
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("thread.py", "_worker"),
+    ("queue.py", "get"),
+}
+# Import roots, longest first, stripped from file names in frame labels.
+_PREFIXES = sorted(
+    {
+        path.replace("\\", "/").rstrip("/") + "/"
+        for path in sys.path + [sysconfig.get_paths()["stdlib"]]
+        if path
+    },
+    key=len,
+    reverse=True,
+)
+
+
+class SamplingProfiler:
+    """Statistical profiler for the running process, sampling every thread's stack.
+
+    A background thread reads `sys._current_frames()` every `interval` seconds
+    and counts each stack, root first, as one sample; there is no cost when no
+    profile is running. Idle threads are skipped unless `include_idle` is set.
+    `collapsed()` renders the counts in the collapsed-stack format read by
+    flamegraph.pl, speedscope and most other flame graph tools.
+    """
+
+    def __init__(self, interval: float = 0.005, include_idle: bool = False):
+        if interval <= 0:
+            raise ValueError("interval must be > 0")
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            raise RuntimeError("Profiler is already running")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="novaedit-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Dict[str, int]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return dict(self.stacks)
+
+    def collapsed(self) -> str:
+        """One `root;...;leaf count` line per distinct stack, most frequent first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(frame.f_code)
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                leaf = stack[0]
+                if not self.include_idle and (_filename(leaf), leaf.co_name) in IDLE_FRAMES:
+                    continue
+                self.stacks[";".join(_label(code) for code in reversed(stack))] += 1
+                self.samples += 1
+
+
+class RequestCountdown:
+    """Completes once `count` requests have called `finished()`."""
+
+    def __init__(self, count: int):
+        self.remaining = count
+        self._done = asyncio.Event()
+        if count <= 0:
+            self._done.set()
+
+    def finished(self) -> None:
+        self.remaining -= 1
+        if self.remaining <= 0:
+            self._done.set()
+
+    async def wait(self) -> None:
+        await self._done.wait()
+
+
+def _filename(code) -> str:
+    return code.co_filename.replace("\\", "/").rsplit("/", 1)[-1]
+
+
+def _label(code) -> str:
+    path = code.co_filename.replace("\\", "/")
+    # Paths relative to the import roots keep labels short but tell `__init__.py` files apart.
+    for prefix in _PREFIXES:
+        if path.startswith(prefix):
+            path = path[len(prefix) :]
+            break
+    return f"{code.co_name} ({path}:{code.co_firstlineno})".replace(";", ":")
+
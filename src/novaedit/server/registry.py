@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+from novaedit.model.modeling_novaedit import NovaEditModel
+from novaedit.model.quantization import model_nbytes
+
+
+@dataclass
+class _Checkpoint:
+    model: NovaEditModel
+    nbytes: int
+    languages: Set[str] = field(default_factory=set)
+
+
+@dataclass
+class _Language:
+    model: NovaEditModel
+    checkpoint: Optional[str]
+    last_used: float
+
+
+class ModelRegistry:
+    """Per-language `NovaEditModel`s, loaded lazily and sharing weights per checkpoint.
+
+    `checkpoint_for(language)` names the checkpoint serving a language (None for
+    the heuristics) and `load(checkpoint, language)` loads it. Languages that
+    map to the same checkpoint get views of one loaded model (see
+    `NovaEditModel.for_language`), so the weights are held once. Languages
+    unused for `idle_seconds` are dropped, as is a checkpoint once no language
+    uses it; when loaded weights exceed `max_bytes`, least recently used
+    checkpoints are evicted. `pinned` languages are never evicted. Zero
+    disables either limit.
+    """
+
+    def __init__(
+        self,
+        checkpoint_for: Callable[[str], Optional[str]],
+        load: Callable[[Optional[str], str], NovaEditModel],
+        idle_seconds: float = 0,
+        max_bytes: int = 0,
+        pinned: Iterable[str] = (),
+        on_evict: Optional[Callable[[str], None]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.checkpoint_for = checkpoint_for
+        self.load = load
+        self.idle_seconds = idle_seconds
+        self.max_bytes = max_bytes
+        self.pinned = set(pinned)
+        self.on_evict = on_evict
+        self.clock = clock
+        self._languages: Dict[str, _Language] = {}
+        self._checkpoints: "OrderedDict[Optional[str], _Checkpoint]" = OrderedDict()
+        # `_lock` guards the maps and is only held briefly; `_load_lock`
+        # serialises the (slow) checkpoint loads.
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+
+    def is_loaded(self, language: str) -> bool:
+        with self._lock:
+            return language in self._languages
+
+    def get(self, language: str) -> NovaEditModel:
+        """Return the model for `language`, loading its checkpoint if needed (may block)."""
+        model = self._touch(language)
+        if model is not None:
+            return model
+        checkpoint = self.checkpoint_for(language)
+        with self._load_lock:
+            model = self._touch(language)
+            if model is not None:
+                return model
+            with self._lock:
+                loaded = self._checkpoints.get(checkpoint)
+            if loaded is None:
+                base = self.load(checkpoint, language)
+                hf_model = getattr(base, "_hf_model", None)
+                loaded = _Checkpoint(base, model_nbytes(hf_model) if hf_model is not None else 0)
+                self.loads += 1
+            with self._lock:
+                self._checkpoints[checkpoint] = loaded
+                self._checkpoints.move_to_end(checkpoint)
+                model = loaded.model.for_language(language)
+                loaded.languages.add(language)
+                self._languages[language] = _Language(model, checkpoint, self.clock())
+                evicted = self._evict_over_budget(keep=checkpoint)
+        self._notify(evicted)
+        return model
+
+    def evict_idle(self) -> List[str]:
+        """Drop languages unused for `idle_seconds`; return the evicted languages."""
+        if self.idle_seconds <= 0:
+            return []
+        now = self.clock()
+        with self._lock:
+            idle = [
+                language
+                for language, entry in self._languages.items()
+                if language not in self.pinned and now - entry.last_used > self.idle_seconds
+            ]
+            for language in idle:
+                self._drop_language(language)
+        self._notify(idle)
+        return idle
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "languages": sorted(self._languages),
+                "checkpoints": len(self._checkpoints),
+                "bytes": sum(c.nbytes for c in self._checkpoints.values()),
+                "max_bytes": self.max_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+    def _touch(self, language: str) -> Optional[NovaEditModel]:
+        with self._lock:
+            entry = self._languages.get(language)
+            if entry is None:
+                return None
+            entry.last_used = self.clock()
+            self._checkpoints.move_to_end(entry.checkpoint)
+            return entry.model
+
+    def _evict_over_budget(self, keep: Optional[str]) -> List[str]:
+        evicted: List[str] = []
+        if self.max_bytes <= 0:
+            return evicted
+        for checkpoint in list(self._checkpoints):
+            if sum(c.nbytes for c in self._checkpoints.values()) <= self.max_bytes:
+                break
+            languages = self._checkpoints[checkpoint].languages
+            if checkpoint == keep or languages & self.pinned:
+                continue
+            for language in list(languages):
+                self._drop_language(language)
+                evicted.append(language)
+        return evicted
+
+    def _drop_language(self, language: str) -> None:
+        entry = self._languages.pop(language)
+        self.evictions += 1
+        loaded = self._checkpoints[entry.checkpoint]
+        loaded.languages.discard(language)
+        if not loaded.languages:
+            del self._checkpoints[entry.checkpoint]
+
+    def _notify(self, languages: List[str]) -> None:
+        if self.on_evict is not None:
+            for language in languages:
+                self.on_evict(language)
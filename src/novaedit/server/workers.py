@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import replace
+from typing import Any, Dict, List, Optional, Tuple
+
+from novaedit.model.instrumentation import ModelObserver
+from novaedit.model.modeling_novaedit import (
+    CascadeStats,
+    NovaEditModel,
+    PatchRequest,
+    PatchResult,
+)
+from novaedit.server.memory import process_memory
+
+# One warm model per worker process, built by `_init_worker`, plus views of it
+# for other languages.
+_worker_model: Optional[NovaEditModel] = None
+_worker_languages: Dict[str, NovaEditModel] = {}
+
+
+class _TierRecorder:
+    """Collects the cascade tiers of the request a worker is running."""
+
+    def __init__(self) -> None:
+        self.tiers: List[str] = []
+
+    def stage(self, name: str, seconds: float) -> None:
+        pass
+
+    def tokens(self, prompt_tokens: int, generated_tokens: int) -> None:
+        pass
+
+    def tier(self, name: str) -> None:
+        self.tiers.append(name)
+
+
+_tier_recorder = _TierRecorder()
+
+
+def _init_worker(model_kwargs: Dict[str, Any]) -> None:
+    global _worker_model
+    _worker_model = NovaEditModel(**model_kwargs)
+    _worker_model.observer = _tier_recorder
+
+
+def _run_in_worker(
+    request: PatchRequest, language: Optional[str]
+) -> Tuple[PatchResult, List[str]]:
+    assert _worker_model is not None
+    model = _worker_model
+    if language is not None:
+        if language not in _worker_languages:
+            _worker_languages[language] = _worker_model.for_language(language)
+        model = _worker_languages[language]
+    _tier_recorder.tiers.clear()
+    result = model.generate_patch_batch([request])[0]
+    return result, list(_tier_recorder.tiers)
+
+
+def _ping() -> bool:
+    return _worker_model is not None
+
+
+class ProcessWorkerPool:
+    """Run patch generation in `workers` processes, each holding its own model.
+
+    The heuristic backend is pure Python and holds the GIL, so threads cannot
+    use more than one core; separate processes can. Requests and results are
+    pickled across the process boundary. Workers are started with `spawn` so
+    they never inherit locks or threads from the server process.
+
+    Cancel tokens do not cross process boundaries: a cancelled request still
+    runs to completion in its worker, and its result is dropped. The cascade
+    tier that answered each request is counted in `cascade_stats` and
+    reported to `observer`.
+    """
+
+    def __init__(self, workers: int, **model_kwargs: Any):
+        if workers < 1:
+            raise ValueError("workers must be >= 1")
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(model_kwargs,),
+        )
+        self.submitted = 0
+        self.cascade_stats = CascadeStats()
+        self.observer: ModelObserver | None = None
+
+    def warm_up(self) -> None:
+        """Start every worker process and build its model before traffic arrives."""
+        futures = [self._executor.submit(_ping) for _ in range(self.workers)]
+        for future in futures:
+            future.result()
+
+    async def submit(self, request: PatchRequest, language: Optional[str] = None) -> PatchResult:
+        self.submitted += 1
+        loop = asyncio.get_running_loop()
+        result, tiers = await loop.run_in_executor(
+            # Parsing again in the worker is cheaper than pickling the AST.
+            self._executor, _run_in_worker, replace(request, cancel=None, tree=None), language
+        )
+        for tier in tiers:
+            self.cascade_stats.record(tier)
+            if self.observer is not None:
+                self.observer.tier(tier)
+        return result
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        processes = getattr(self._executor, "_processes", None) or {}
+        return {
+            "workers": self.workers,
+            "submitted": self.submitted,
+            "memory": [process_memory(pid) for pid in list(processes)],
+        }
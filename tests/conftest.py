@@ -0,0 +1,74 @@
+import string
+
+import pytest
+
+from novaedit.model.tokenization_novaedit import SPECIAL_TOKENS
+
+
+def _char_tokenizer():
+    """Character-level `tokenizers` backend with the NovaEdit special tokens."""
+    from tokenizers import Tokenizer, decoders
+    from tokenizers.models import BPE
+
+    specials = SPECIAL_TOKENS + ["<pad>"]
+    vocab = {tok: idx for idx, tok in enumerate(specials + sorted(set(string.printable)))}
+    backend = Tokenizer(BPE(vocab=vocab, merges=[]))
+    backend.add_special_tokens(specials)
+    backend.decoder = decoders.Fuse()
+    return backend
+
+
+@pytest.fixture(scope="session")
+def tiny_hf_model_dir(tmp_path_factory):
+    """Save a randomly initialised, character-level causal LM usable as `hf_model_id`."""
+    torch = pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+
+    tokenizer = transformers.PreTrainedTokenizerFast(
+        tokenizer_object=_char_tokenizer(), bos_token="<bos>", eos_token="<eos>", pad_token="<pad>"
+    )
+    config = transformers.LlamaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=2048,
+        bos_token_id=tokenizer.bos_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+    )
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("tiny-hf")
+    transformers.LlamaForCausalLM(config).save_pretrained(path)
+    tokenizer.save_pretrained(path)
+    return str(path)
+
+
+@pytest.fixture(scope="session")
+def tiny_native_model_dir(tmp_path_factory):
+    """Save a randomly initialised `NovaEditForCausalLM` usable as `native_model_dir`."""
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    from novaedit.model.config import ModelConfig
+    from novaedit.model.transformer import TOKENIZER_FILE, NovaEditForCausalLM
+
+    backend = _char_tokenizer()
+    config = ModelConfig(
+        d_model=32,
+        n_layers=2,
+        n_heads=4,
+        n_kv_heads=2,
+        d_ff=64,
+        vocab_size=backend.get_vocab_size(),
+        max_seq_len=2048,
+        pad_token_id=backend.token_to_id("<pad>"),
+        bos_token_id=backend.token_to_id("<bos>"),
+        eos_token_id=backend.token_to_id("<eos>"),
+    )
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("tiny-native")
+    NovaEditForCausalLM(config).save_pretrained(path)
+    backend.save(str(path / TOKENIZER_FILE))
+    return str(path)
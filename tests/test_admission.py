@@ -0,0 +1,49 @@
+import asyncio
+
+import pytest
+
+from novaedit.server.admission import AdmissionQueue, DeadlineExceededError, QueueFullError
+
+
+def test_interactive_requests_jump_ahead_of_batch():
+    async def main():
+        queue = AdmissionQueue(max_concurrent=1, max_depth=4)
+        await queue.acquire()
+        order = []
+
+        async def worker(name, priority):
+            await queue.acquire(priority)
+            order.append(name)
+            queue.release()
+
+        tasks = [
+            asyncio.create_task(worker("batch", "batch")),
+            asyncio.create_task(worker("interactive", "interactive")),
+        ]
+        await asyncio.sleep(0)
+        assert queue.depth == 2
+        queue.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["interactive", "batch"]
+
+
+def test_full_queue_rejects_and_expired_waiters_are_dropped():
+    async def main():
+        queue = AdmissionQueue(max_concurrent=1, max_depth=1)
+        await queue.acquire()
+        loop = asyncio.get_running_loop()
+        waiter = asyncio.create_task(queue.acquire(deadline=loop.time() + 0.01))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await queue.acquire()
+        with pytest.raises(DeadlineExceededError):
+            await waiter
+        queue.release()
+        return queue.stats()
+
+    stats = asyncio.run(main())
+    assert stats["rejected"] == 1
+    assert stats["expired"] == 1
+    assert stats["running"] == 0
@@ -0,0 +1,34 @@
+import asyncio
+
+from novaedit.model import NovaEditModel, PatchRequest
+from novaedit.server.batching import MicroBatcher
+
+
+def test_micro_batcher_groups_concurrent_requests():
+    seen = []
+
+    def run_batch(requests):
+        seen.append(len(requests))
+        return [([], r.code) for r in requests]
+
+    async def main():
+        batcher = MicroBatcher(run_batch, max_batch_size=4, max_wait=0.05)
+        requests = [PatchRequest(code=f"x{i}", start_line=1, end_line=1) for i in range(6)]
+        return await asyncio.gather(*(batcher.submit(r) for r in requests))
+
+    results = asyncio.run(main())
+    assert [patch for _, patch in results] == [f"x{i}" for i in range(6)]
+    assert seen == [4, 2]
+
+
+def test_hf_batch_returns_one_result_per_request(tiny_hf_model_dir):
+    model = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    requests = [
+        PatchRequest(code="x = 1\n", start_line=1, end_line=1),
+        PatchRequest(code="def f(a):\n    return b\n", start_line=1, end_line=2),
+    ]
+    results = model.generate_patch_batch(requests)
+    assert len(results) == 2
+    assert model.supports_batching
+    single = model.generate_patch(code="x = 1\n", start_line=1, end_line=1)
+    assert single[1] == results[0][1]
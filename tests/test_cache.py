@@ -0,0 +1,47 @@
+from novaedit.model import PatchEdit, PatchRequest
+from novaedit.server.cache import ENTRY_OVERHEAD_BYTES, PatchCache, request_cache_key
+
+
+def _result(text):
+    return [PatchEdit(start_line=1, end_line=1, replacement=text)], f"@@ 1-1\n+ {text}"
+
+
+def test_cache_key_ignores_code_outside_region_and_line_endings():
+    a = PatchRequest(code="x = 1\nprint(xx)\n", start_line=2, end_line=2)
+    b = PatchRequest(code="y = 2  \r\nprint(xx)\r\n", start_line=2, end_line=2)
+    c = PatchRequest(code="x = 1\nprint(xx)\n", start_line=2, end_line=2, instruction="style")
+    # Cached replacements carry the region's whitespace, so it is part of the key.
+    d = PatchRequest(code="x = 1\nprint(xx)   \n", start_line=2, end_line=2)
+    assert request_cache_key(a, "python", 5, "m") == request_cache_key(b, "python", 5, "m")
+    assert request_cache_key(a, "python", 5, "m") != request_cache_key(d, "python", 5, "m")
+    assert request_cache_key(a, "python", 5, "m") != request_cache_key(c, "python", 5, "m")
+    assert request_cache_key(a, "python", 5, "m") != request_cache_key(a, "python", 5, "other")
+
+
+def test_lru_eviction_and_ttl():
+    now = [0.0]
+    cache = PatchCache(max_bytes=2 * ENTRY_OVERHEAD_BYTES + 40, ttl=10, clock=lambda: now[0])
+    cache.put("a", _result("a"))
+    cache.put("b", _result("b"))
+    assert cache.get("a") is not None
+    cache.put("c", _result("c"))  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    now[0] = 11.0
+    assert cache.get("a") is None
+    assert cache.stats()["hits"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    PatchCache(max_bytes=1 << 20, ttl=60, disk_dir=tmp_path).put("k", _result("z"))
+    warm = PatchCache(max_bytes=1 << 20, ttl=60, disk_dir=tmp_path)
+    edits, patch = warm.get("k")
+    assert edits[0].replacement == "z"
+    assert warm.stats()["disk_hits"] == 1
+
+
+def test_whole_buffer_key_covers_code_outside_region():
+    a = PatchRequest(code="x = 1\nprint(x)\n", start_line=1, end_line=1)
+    b = PatchRequest(code="x = 1\nprint(x\n", start_line=1, end_line=1)
+    assert request_cache_key(a, "python", 5, "m") == request_cache_key(b, "python", 5, "m")
+    whole = [request_cache_key(r, "python", 5, "m", whole_buffer=True) for r in (a, b)]
+    assert whole[0] != whole[1]
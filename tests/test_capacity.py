@@ -0,0 +1,75 @@
+import pytest
+
+from novaedit.model.capacity import (
+    config_from_hf,
+    parameter_counts,
+    plan_capacity,
+    request_cost,
+    weight_bytes,
+)
+from novaedit.model.config import ModelConfig
+
+SMALL = ModelConfig(
+    d_model=32, n_layers=2, n_heads=4, n_kv_heads=2, d_ff=64, vocab_size=64, max_seq_len=128
+)
+MIB = 1024 * 1024
+
+
+def test_estimates_match_the_native_model():
+    torch = pytest.importorskip("torch")
+    from novaedit.model.transformer import KVCache, NovaEditForCausalLM
+
+    model = NovaEditForCausalLM(SMALL)
+    assert sum(parameter_counts(SMALL).values()) == sum(p.numel() for p in model.parameters())
+    assert weight_bytes(SMALL) == sum(p.numel() * p.element_size() for p in model.parameters())
+    cost = request_cost(SMALL, prompt_tokens=16, new_tokens=8, preallocated=True)
+    assert cost.kv_cache == KVCache(SMALL, dtype=torch.float32).nbytes
+    assert request_cost(SMALL, 16, 8).kv_cache < cost.kv_cache
+    assert weight_bytes(SMALL, "int8") < weight_bytes(SMALL)
+
+
+def test_plan_fills_the_budget_and_caps_batches():
+    plan = plan_capacity(SMALL, 600 * MIB, prompt_tokens=64, new_tokens=32)
+    used = plan.weights + plan.overhead + plan.max_concurrent * plan.per_request
+    assert used <= plan.memory_budget < used + plan.per_request
+    assert plan.max_batch_size == min(plan.max_concurrent, 8)
+    with pytest.raises(ValueError):
+        plan_capacity(SMALL, 1 * MIB, prompt_tokens=64, new_tokens=32)
+
+
+def test_config_from_hf_reads_llama_fields():
+    transformers = pytest.importorskip("transformers")
+    hf_config = transformers.LlamaConfig(
+        vocab_size=64,
+        hidden_size=32,
+        intermediate_size=64,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+        max_position_embeddings=128,
+    )
+    config = config_from_hf(hf_config)
+    assert (config.d_model, config.n_layers, config.n_kv_heads, config.d_ff) == (32, 2, 2, 64)
+    assert config.max_seq_len == 128
+
+
+def test_config_from_hf_reads_other_field_names_and_rejects_unknown_configs():
+    transformers = pytest.importorskip("transformers")
+    gpt2 = transformers.GPT2Config(n_embd=32, n_layer=2, n_head=4, n_positions=128, vocab_size=64)
+    config = config_from_hf(gpt2)
+    assert (config.d_model, config.n_layers, config.n_kv_heads, config.d_ff) == (32, 2, 4, 128)
+    assert config.max_seq_len == 128
+    with pytest.raises(ValueError, match="unsupported config"):
+        config_from_hf(transformers.PretrainedConfig())
+
+
+def test_capacity_measure_loads_the_configured_model(tiny_hf_model_dir):
+    from typer.testing import CliRunner
+
+    from novaedit.clients.cli.novaedit_cli import app
+
+    args = ["capacity", "--hf-model-id", tiny_hf_model_dir, "--measure", "--new-tokens", "4"]
+    result = CliRunner().invoke(app, args)
+    assert result.exit_code == 0, result.output
+    assert f"Measured ({tiny_hf_model_dir}, fp32)" in result.output.replace("\n", "")
+    assert result.output.count("(estimated") == 2
@@ -0,0 +1,63 @@
+from novaedit.languages.python.adapter import PythonAdapter
+from novaedit.model.context import (
+    PromptContext,
+    build_context,
+    context_token_budget,
+    diagnostic_lines,
+)
+from novaedit.model.generation import patch_token_budget
+from novaedit.model.modeling_novaedit import PatchEdit
+
+
+def count_chars(texts):
+    return [len(text) for text in texts]
+
+
+CODE = "".join(
+    f"def f{i}(x):\n    y = x + {i}\n    return y\n\n" for i in range(20)
+) + "class C:\n    @staticmethod\n    def g():\n        return totl\n"
+
+
+def test_diagnostic_lines_understand_common_formats():
+    diags = ["SyntaxError: invalid syntax at line 3", "app.py:12:5: F821 undefined", "oops"]
+    assert diagnostic_lines(diags) == [3, 12, None]
+
+
+def test_long_region_narrows_to_the_enclosing_scope():
+    lines = CODE.splitlines()
+    diags = ["F821 undefined name 'totl' at line 84", "E501 at line 2"]
+    whole = build_context(CODE, 1, len(lines), diags, count_chars, budget=None)
+    assert not whole.narrowed and whole.snippet == "\n".join(lines)
+    context = build_context(CODE, 1, len(lines), diags, count_chars, 90, PythonAdapter())
+    assert context.narrowed and context.tokens <= 90
+    assert context.start_line <= 81 and context.end_line == 84
+    assert context.snippet.startswith(lines[context.start_line - 1])
+    assert "class C:" in context.snippet and context.diagnostics == diags[:1]
+    # Without an AST the window still grows around the diagnostic line.
+    plain = build_context(CODE, 1, len(lines), diags[:1], count_chars, 90)
+    assert plain.start_line <= 84 <= plain.end_line and plain.tokens <= 90
+
+
+def test_edits_outside_the_prompted_lines_are_dropped():
+    context = PromptContext(50, 60, "", [], 0, narrowed=True)
+    edits = [PatchEdit(52, 53, "a\n"), PatchEdit(3, 3, "b\n"), PatchEdit(58, 70, "c\n")]
+    assert context.to_absolute(edits) == [PatchEdit(52, 53, "a\n")]
+
+
+def test_a_single_line_over_the_budget_is_truncated():
+    line = "x = [" + ", ".join(str(i) for i in range(100)) + "]"
+    code = "y = 1\n" + line + "\n"
+    diags = ["SyntaxError at line 2", "E501 at line 1"]
+    for start in (1, 2):
+        context = build_context(code, start, 2, diags, count_chars, budget=40)
+        assert context.truncated and (context.start_line, context.end_line) == (2, 2)
+        assert line.startswith(context.snippet) and context.tokens <= 40
+        assert context.diagnostics == diags[:1]
+        assert context.to_absolute([PatchEdit(2, 2, "x = []\n")]) == []
+
+
+def test_token_budget_leaves_room_for_the_patch():
+    for available in (100, 2048, 8192):
+        budget = context_token_budget(available)
+        assert budget + patch_token_budget(budget) <= available
+        assert budget + 1 + patch_token_budget(budget + 1) > available
@@ -0,0 +1,56 @@
+import pytest
+
+from novaedit.server.documents import (
+    DocumentStore,
+    DocumentVersionError,
+    TextChange,
+    UnknownDocumentError,
+)
+
+
+def test_incremental_changes_update_text_and_version():
+    store = DocumentStore()
+    store.open("s1", "file:///a.py", "python", 1, "x = 1\nprint(xx)\n")
+    document = store.change(
+        "s1",
+        "file:///a.py",
+        2,
+        [
+            TextChange("x", start_line=1, start_character=6, end_line=1, end_character=8),
+            TextChange("y = 2\n", start_line=2, start_character=0, end_line=2, end_character=0),
+        ],
+    )
+    assert document.text == "x = 1\nprint(x)\ny = 2\n"
+    assert store.get("s1", "file:///a.py", version=2) is document
+    with pytest.raises(DocumentVersionError):
+        store.get("s1", "file:///a.py", version=1)
+    with pytest.raises(DocumentVersionError):
+        store.change("s1", "file:///a.py", 2, [TextChange("")])
+
+
+def test_parsed_ast_is_cached_per_version():
+    store = DocumentStore()
+    document = store.open("s1", "a.py", "python", 1, "x = 1\n")
+    calls = []
+
+    def parse(text):
+        calls.append(text)
+        return text
+
+    assert document.parse(parse) == document.parse(parse) == "x = 1\n"
+    store.change("s1", "a.py", 2, [TextChange("x = 2\n")])
+    assert document.parse(parse) == "x = 2\n"
+    assert calls == ["x = 1\n", "x = 2\n"]
+
+
+def test_sessions_are_evicted_when_idle_or_over_budget():
+    now = [0.0]
+    store = DocumentStore(max_sessions=2, idle_seconds=10, clock=lambda: now[0])
+    for session in ("s1", "s2", "s3"):
+        store.open(session, "a.py", "python", 1, "x = 1\n")
+    with pytest.raises(UnknownDocumentError):
+        store.get("s1", "a.py")
+    now[0] = 20.0
+    with pytest.raises(UnknownDocumentError):
+        store.get("s3", "a.py")
+    assert store.stats()["evictions"] == 3
@@ -0,0 +1,64 @@
+from novaedit.model.generation import (
+    MAX_NEW_TOKENS,
+    MIN_NEW_TOKENS,
+    PatchTracker,
+    find_draft,
+    patch_is_finished,
+    patch_token_budget,
+)
+
+
+def test_patch_is_finished_on_terminator_and_garbage_headers():
+    assert not patch_is_finished("@@ 1-1\n- a\n+ b\n")
+    assert patch_is_finished("@@ 1-1\n+ b\n<PATCH_END>")
+    assert patch_is_finished("@@ one-two\n+ b")
+    assert patch_is_finished("@@ 4-2\n")
+    # An incomplete header line is not judged yet.
+    assert not patch_is_finished("@@ 1-")
+
+
+def test_patch_is_finished_once_max_edits_exceeded():
+    text = "@@ 1-1\n+ a\n@@ 3-3\n+ b\n"
+    assert not patch_is_finished(text, max_edits=2)
+    assert patch_is_finished(text + "@@", max_edits=2)
+    assert patch_is_finished(text, max_edits=1)
+
+
+def test_patch_tracker_matches_patch_is_finished_and_decodes_only_the_current_line():
+    class CharTokenizer:
+        decoded = 0
+
+        def decode(self, ids):
+            self.decoded += len(ids)
+            return "".join(chr(i) for i in ids)
+
+    patches = [
+        "@@ 1-1\n- a\n+ b\n@@ 3-3\n+ c\n<PATCH_END>",
+        "@@ 1-1\n+ b\n@@ 9-2\n+ c\n",
+        "@@ 1-1\n+ a\n@@ 2-2\n+ b\n@@ 4-4\n",
+    ]
+    for text in patches:
+        for max_edits in (None, 1, 2):
+            tokenizer = CharTokenizer()
+            tracker = PatchTracker(tokenizer, max_edits)
+            ids = [ord(c) for c in text]
+            for n in range(1, len(ids) + 1):
+                finished = tracker.update(ids[:n])
+                assert finished == patch_is_finished(text[:n], max_edits)
+                if finished:
+                    break
+            # Each call re-decodes at most the current line, never the whole output.
+            longest = max(len(line) + 1 for line in text.split("\n"))
+            assert tokenizer.decoded <= n * longest
+
+
+def test_patch_token_budget_scales_with_region():
+    assert patch_token_budget(0) == MIN_NEW_TOKENS
+    assert patch_token_budget(100) == 2 * 100 + MIN_NEW_TOKENS
+    assert patch_token_budget(10_000) == MAX_NEW_TOKENS
+
+
+def test_find_draft_copies_tokens_after_earlier_ngram():
+    tokens = [5, 6, 7, 8, 9, 1, 6, 7]
+    assert find_draft(tokens, max_ngram=2, limit=2) == [8, 9]
+    assert find_draft([1, 2, 3], max_ngram=2, limit=4) == []
@@ -0,0 +1,187 @@
+import io
+import json
+
+from novaedit.lsp import NovaEditLanguageServer
+from novaedit.lsp.jsonrpc import read_message
+from novaedit.model import NovaEditModel
+
+
+def _frame(*messages):
+    data = b""
+    for message in messages:
+        body = json.dumps({"jsonrpc": "2.0", **message}).encode("utf-8")
+        data += f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body
+    return io.BytesIO(data)
+
+
+def _run(*messages, **kwargs):
+    writer = io.BytesIO()
+    code = NovaEditLanguageServer(reader=_frame(*messages), writer=writer, **kwargs).serve()
+    writer.seek(0)
+    replies = []
+    while (message := read_message(writer)) is not None:
+        replies.append(message)
+    return code, replies
+
+
+def test_code_action_after_incremental_change():
+    uri = "file:///app.py"
+    change = {
+        "range": {"start": {"line": 1, "character": 6}, "end": {"line": 1, "character": 7}},
+        "text": "xx",
+    }
+    diagnostic = {
+        "range": {"start": {"line": 1, "character": 6}, "end": {"line": 1, "character": 8}},
+        "message": "NameError: name 'xx' is not defined",
+    }
+    code, replies = _run(
+        {"id": 1, "method": "initialize", "params": {"capabilities": {}}},
+        {"method": "initialized", "params": {}},
+        {
+            "method": "textDocument/didOpen",
+            "params": {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": "x = 1\nprint(x)\n",
+                }
+            },
+        },
+        {
+            "method": "textDocument/didChange",
+            "params": {"textDocument": {"uri": uri, "version": 2}, "contentChanges": [change]},
+        },
+        {
+            "id": 2,
+            "method": "textDocument/codeAction",
+            "params": {
+                "textDocument": {"uri": uri},
+                "range": diagnostic["range"],
+                "context": {"diagnostics": [diagnostic]},
+            },
+        },
+        {"id": 3, "method": "shutdown"},
+        {"method": "exit"},
+    )
+    assert code == 0
+    responses = {r["id"]: r for r in replies if "id" in r}
+    assert responses[1]["result"]["capabilities"]["textDocumentSync"]["change"] == 2
+    [action] = responses[2]["result"]
+    [change_set] = action["edit"]["documentChanges"]
+    assert change_set["textDocument"] == {"uri": uri, "version": 2}
+    assert change_set["edits"]
+    published = [r for r in replies if r.get("method") == "textDocument/publishDiagnostics"]
+    assert [p["params"]["version"] for p in published] == [1, 2]
+
+
+def test_requests_before_initialize_are_rejected():
+    code, replies = _run({"id": 1, "method": "shutdown"})
+    assert code == 1
+    assert replies[0]["error"]["code"] == -32002
+
+
+def test_malformed_messages_do_not_stop_the_server():
+    uri = "file:///app.py"
+    malformed = _frame(
+        {"id": 1, "method": "initialize", "params": {"capabilities": {}}},
+        {"method": "textDocument/didOpen", "params": {"textDocument": {"uri": uri}}},
+        {"method": "textDocument/didChange", "params": ["not", "an", "object"]},
+        {"id": 2, "method": "textDocument/codeAction", "params": {"textDocument": {"uri": uri}}},
+    ).getvalue() + b"Content-Length: 5\r\n\r\n{oops"
+    shutdown = _frame({"id": 3, "method": "shutdown"}, {"method": "exit"}).getvalue()
+    reader = io.BytesIO(malformed + shutdown)
+    writer = io.BytesIO()
+    assert NovaEditLanguageServer(reader=reader, writer=writer).serve() == 0
+    writer.seek(0)
+    replies = []
+    while (message := read_message(writer)) is not None:
+        replies.append(message)
+    errors = [r["error"]["code"] for r in replies if "error" in r]
+    assert errors == [-32602, -32700]
+    assert [r["id"] for r in replies if "result" in r] == [1, 3]
+
+
+def test_code_action_without_diagnostics_in_range_skips_the_model():
+    uri = "file:///app.py"
+
+    def no_model():
+        raise AssertionError("the model must not run without diagnostics")
+
+    code, replies = _run(
+        {"id": 1, "method": "initialize", "params": {"capabilities": {}}},
+        {
+            "method": "textDocument/didOpen",
+            "params": {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": "x = 1\nprint(x)\n",
+                }
+            },
+        },
+        {
+            "id": 2,
+            "method": "textDocument/codeAction",
+            "params": {
+                "textDocument": {"uri": uri},
+                "range": {"start": {"line": 1, "character": 0}, "end": {"line": 1, "character": 0}},
+                "context": {"diagnostics": []},
+            },
+        },
+        {"id": 3, "method": "shutdown"},
+        {"method": "exit"},
+        model_factory=no_model,
+    )
+    assert code == 0
+    responses = {r["id"]: r for r in replies if "id" in r}
+    assert responses[2]["result"] == []
+
+
+def test_each_document_version_is_parsed_once(monkeypatch):
+    from novaedit.languages.python.adapter import PythonAdapter
+    from novaedit.lsp import server
+
+    parsed = []
+
+    class CountingAdapter(PythonAdapter):
+        def parse_ast(self, code):
+            parsed.append(code)
+            return super().parse_ast(code)
+
+    monkeypatch.setitem(server.ADAPTERS, "python", CountingAdapter())
+    uri = "file:///app.py"
+    diagnostic = {
+        "range": {"start": {"line": 1, "character": 6}, "end": {"line": 1, "character": 8}},
+        "message": "NameError: name 'xx' is not defined",
+    }
+    code, replies = _run(
+        {"id": 1, "method": "initialize", "params": {"capabilities": {}}},
+        {
+            "method": "textDocument/didOpen",
+            "params": {
+                "textDocument": {
+                    "uri": uri,
+                    "languageId": "python",
+                    "version": 1,
+                    "text": "x = 1\nprint(xx)\n",
+                }
+            },
+        },
+        {
+            "id": 2,
+            "method": "textDocument/codeAction",
+            "params": {
+                "textDocument": {"uri": uri},
+                "range": diagnostic["range"],
+                "context": {"diagnostics": [diagnostic]},
+            },
+        },
+        {"id": 3, "method": "shutdown"},
+        {"method": "exit"},
+        model_factory=lambda: NovaEditModel(precheck=True),
+    )
+    assert code == 0
+    assert {r["id"]: r for r in replies if "id" in r}[2]["result"]
+    assert parsed == ["x = 1\nprint(xx)\n"]
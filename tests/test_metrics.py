@@ -0,0 +1,24 @@
+from novaedit.server.metrics import Histogram, Metrics
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("latency_seconds", "Latency.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value, "generate")
+    lines = histogram.render()
+    assert 'latency_seconds_bucket{stage="generate",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{stage="generate",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{stage="generate",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{stage="generate"} 4' in lines
+
+
+def test_metrics_count_tokens_and_read_gauges_at_scrape_time():
+    metrics = Metrics()
+    depth = [3]
+    metrics.gauge("queue_depth", "Queued requests.", lambda: depth[0])
+    metrics.tokens(10, 4)
+    depth[0] = 5
+    body = metrics.render()
+    assert 'novaedit_tokens_total{direction="prompt"} 10' in body
+    assert 'novaedit_tokens_total{direction="generated"} 4' in body
+    assert "queue_depth 5.0" in body
@@ -1,3 +1,9 @@
+import subprocess
+import sys
+
+import pytest
+
+from novaedit.model import CancelToken, GenerationCancelled, PatchRequest
 from novaedit.model.modeling_novaedit import NovaEditModel, build_patch_dsl
 
 
@@ -12,6 +18,23 @@ def test_generate_patch_fixes_name_error():
     assert "item" in patch_dsl
 
 
+def test_name_error_is_fixed_with_the_closest_other_name():
+    diags = ["NameError: name 'totl' is not defined"]
+    edits, _ = NovaEditModel().generate_patch("total = 1\nprint(totl)\n", 1, 2, diags)
+    assert [(e.start_line, e.replacement) for e in edits] == [(2, "print(total)\n")]
+
+
+def test_precheck_skips_clean_regions_only():
+    model = NovaEditModel(precheck=True)
+    clean = "x = 1\nprint(x)\n"
+    assert model.generate_patch(clean, 1, 2, instruction="Fix bugs.") == ([], "")
+    assert list(model.stream_patch(clean, 1, 2)) == []
+    assert model.generate_patch(clean, 1, 2, instruction="add type hints")[0]
+    assert model.generate_patch("def f(:\n    pass\n", 1, 2)[0]
+    assert model.cascade_stats.to_dict()["no_edit"] == 2
+    assert NovaEditModel().generate_patch(clean, 1, 2)[0]
+
+
 def test_build_patch_dsl_roundtrip():
     original_lines = ["a = 1", "b = 2", "print(a + b)"]
     edits = [
@@ -26,3 +49,30 @@ def test_build_patch_dsl_roundtrip():
 def model_patch(start_line: int, end_line: int, replacement: str):
     # helper to create PatchEdit without importing dataclass directly
     return type("Patch", (), {"start_line": start_line, "end_line": end_line, "replacement": replacement})
+
+
+def test_cancelled_request_raises_and_batch_keeps_other_results():
+    model = NovaEditModel()
+    cancel = CancelToken()
+    cancel.cancel()
+    code = "x = 1\nprint(xx)\n"
+    with pytest.raises(GenerationCancelled):
+        model.generate_patch(code=code, start_line=1, end_line=2, cancel=cancel)
+    results = model.generate_patch_batch(
+        [PatchRequest(code, 1, 2, cancel=cancel), PatchRequest(code, 1, 2)]
+    )
+    assert results[0] == ([], "")
+    assert results[1][0]
+
+
+def test_heuristic_backend_does_not_import_torch():
+    script = (
+        "import sys\n"
+        "import novaedit.clients.cli.novaedit_cli\n"
+        "from novaedit.model import NovaEditModel\n"
+        "NovaEditModel().generate_patch('x = y\\n', 1, 1, [\"NameError: name 'y'\"])\n"
+        "print(sorted(m for m in ('torch', 'transformers') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
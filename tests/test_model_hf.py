@@ -0,0 +1,166 @@
+import pytest
+
+from novaedit.model import CancelToken, GenerationCancelled, NovaEditModel, PatchRequest
+
+
+def test_stream_patch_matches_generate_patch(tiny_hf_model_dir):
+    model = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    code = "def f(a):\n    return b\n"
+    streamed = list(model.stream_patch(code=code, start_line=1, end_line=2))
+    edits, _ = model.generate_patch(code=code, start_line=1, end_line=2)
+    assert [(e.start_line, e.end_line) for e in streamed] == [
+        (e.start_line, e.end_line) for e in edits
+    ]
+
+
+def test_generate_patch_respects_max_edits(tiny_hf_model_dir):
+    model = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    edits, _ = model.generate_patch(code="x = 1\ny = 2\n", start_line=1, end_line=2, max_edits=1)
+    assert len(edits) <= 1
+
+
+def test_speculative_decoding_matches_greedy(tiny_hf_model_dir):
+    baseline = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    speculative = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu", speculative=True)
+    code = "items = [1, 2, 3]\nfor item in items:\n    print(itme)\n"
+    expected = baseline.generate_patch(code=code, start_line=1, end_line=3)
+    assert speculative.generate_patch(code=code, start_line=1, end_line=3) == expected
+    stats = speculative.speculative_stats.to_dict()
+    assert stats["verify_steps"] > 0
+    assert 0.0 <= stats["acceptance_rate"] <= 1.0
+
+
+def test_prefix_cache_reuses_shared_prompt_prefix(tiny_hf_model_dir):
+    baseline = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    cached = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu", prefix_cache_bytes=1 << 24)
+    code = "def f(a):\n    return a + b\n"
+    for diagnostics in (["NameError: name 'b' is not defined"], ["unused argument 'a'"]):
+        kwargs = dict(code=code, start_line=1, end_line=2, diagnostics=diagnostics)
+        assert cached.generate_patch(**kwargs) == baseline.generate_patch(**kwargs)
+    stats = cached.prefix_cache.stats()
+    assert stats["hits"] == 1
+    assert stats["reused_tokens"] > len(code)
+
+
+def test_cancelled_hf_request_stops_without_result(tiny_hf_model_dir):
+    model = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    cancel = CancelToken()
+    cancel.cancel()
+    code = "def f(a):\n    return b\n"
+    assert list(model.stream_patch(code=code, start_line=1, end_line=2, cancel=cancel)) == []
+    with pytest.raises(GenerationCancelled):
+        model.generate_patch(code=code, start_line=1, end_line=2, cancel=cancel)
+
+
+def test_observer_receives_stage_timings_and_token_counts(tiny_hf_model_dir):
+    from novaedit.server.metrics import Metrics
+
+    model = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    model.observer = Metrics()
+    model.generate_patch_batch(
+        [PatchRequest("x = 1\nprint(xx)\n", 1, 2), PatchRequest("y = 2\n", 1, 1)]
+    )
+    body = model.observer.render()
+    for stage in ("prompt", "tokenize", "generate", "parse", "patch_dsl"):
+        assert f'novaedit_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'novaedit_tokens_total{direction="prompt"}' in body
+
+
+def test_mmapped_hf_weights_match_regular_load(tiny_hf_model_dir):
+    loaded = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    mapped = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu", mmap_weights=True)
+    assert mapped.weights_mmapped
+    code = "def f(a):\n    return b\n"
+    kwargs = dict(code=code, start_line=1, end_line=2, max_edits=1)
+    assert mapped.generate_patch(**kwargs) == loaded.generate_patch(**kwargs)
+
+
+def test_cascade_answers_confident_fixes_with_heuristics(tiny_hf_model_dir):
+    from novaedit.server.metrics import Metrics
+
+    hf = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    cascade = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu", cascade=True)
+    cascade.observer = Metrics()
+    typo = PatchRequest(
+        "total = 1\nprint(totl)\n", 1, 2, ["NameError: name 'totl' is not defined"]
+    )
+    syntax = PatchRequest("def f(:\n    pass\n", 1, 2, ["SyntaxError: invalid syntax"])
+    # No defined name is close to `zzz`, so the rules could only guess a placeholder.
+    guess = PatchRequest("print(zzz)\n", 1, 1, ["NameError: name 'zzz' is not defined"])
+    results = cascade.generate_patch_batch([typo, syntax, guess])
+    assert results[0] == NovaEditModel().generate_patch_batch([typo])[0]
+    assert results[1:] == hf.generate_patch_batch([syntax, guess])
+    stats = cascade.cascade_stats.to_dict()
+    assert (stats["no_edit"], stats["heuristic"], stats["model"]) == (0, 1, 2)
+    assert stats["heuristic_rate"] == 1 / 3
+    assert 'novaedit_cascade_requests_total{tier="heuristic"} 1' in cascade.observer.render()
+
+
+def test_precheck_scores_no_edit_and_reuses_the_prompt_prefill(tiny_hf_model_dir):
+    import torch
+
+    hf = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu")
+    model = NovaEditModel(
+        hf_model_id=tiny_hf_model_dir, device="cpu", precheck=True, prefix_cache_bytes=1 << 24
+    )
+    tokenizer = model._hf_tokenizer
+    no_edit, edit = tokenizer.convert_tokens_to_ids(["<NO_EDIT>", "<EDIT>"])
+    head = model._hf_model.get_output_embeddings().weight
+    clean = PatchRequest("x = 1\nprint(x)\n", 1, 2, instruction="fix")
+    with torch.no_grad():
+        head[no_edit] = head[edit]
+    # A tie is not a NO_EDIT: the request decodes, reusing the pre-check's prefill.
+    assert model.generate_patch_batch([clean]) == hf.generate_patch_batch([clean])
+    assert model.prefix_cache.stats()["hits"] == 1
+    # Point the `<NO_EDIT>` row along the prompt's final hidden state so it wins.
+    prompt = model._format_prompt(model._context(clean), clean.instruction)
+    input_ids = tokenizer(prompt, return_tensors="pt")["input_ids"]
+    with torch.no_grad():
+        hidden = model._hf_model.model(input_ids).last_hidden_state[0, -1]
+        head[no_edit] = hidden * 1000
+
+    def fail(*args, **kwargs):
+        raise AssertionError("a NO_EDIT request must not decode")
+
+    model._hf_model.generate = fail
+    assert model.generate_patch_batch([clean]) == [([], "")]
+    assert model.generate_patch(clean.code, 1, 2, instruction="fix") == ([], "")
+    stats = model.cascade_stats.to_dict()
+    assert (stats["no_edit"], stats["model"]) == (2, 1)
+
+
+def test_long_regions_are_narrowed_to_the_prompt_budget(tiny_hf_model_dir):
+    code = "".join(f"v{i} = {i}\n" for i in range(300)) + "print(totl)\n"
+    diags = ["NameError: name 'totl' is not defined at line 301"]
+    model = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu", max_prompt_tokens=400)
+    request = PatchRequest(code, 1, 301, diags)
+    context = model._context(request)
+    prompt = model._format_prompt(context, request.instruction)
+    assert context.narrowed and context.end_line == 301 and context.start_line > 200
+    assert len(model._hf_tokenizer(prompt, add_special_tokens=False)["input_ids"]) <= 400
+    edits, _ = model.generate_patch(code, 1, 301, diags)
+    assert all(context.start_line <= e.start_line <= e.end_line <= 301 for e in edits)
+
+
+def test_batches_are_chunked_and_speculation_decodes_one_row_at_a_time(
+    tiny_hf_model_dir, monkeypatch
+):
+    from novaedit.server import main
+
+    requests = [
+        PatchRequest(f"v{i} = {i}\nprint(v{i}x)\n", 1, 2, max_edits=1) for i in range(5)
+    ]
+    rows = []
+    for speculative in (False, True):
+        model = NovaEditModel(hf_model_id=tiny_hf_model_dir, device="cpu", speculative=speculative)
+        generate = model._hf_model.generate
+
+        def counting_generate(*args, **kwargs):
+            rows.append(kwargs["input_ids"].shape[0])
+            return generate(*args, **kwargs)
+
+        model._hf_model.generate = counting_generate
+        monkeypatch.setattr(main, "MAX_BATCH_SIZE", 2)
+        assert len(main._generate_chunked(model, requests)) == 5
+    assert rows == [2, 2, 1]
+    assert model.speculative_stats.verify_steps > 0
@@ -1,4 +1,10 @@
-from novaedit.languages.python.patch_apply import apply_patch_dsl
+from novaedit.languages.python.patch_apply import (
+    Edit,
+    PatchStreamParser,
+    apply_patch_dsl,
+    merge_edits,
+    parse_patch_dsl,
+)
 
 
 def test_apply_patch_dsl():
@@ -27,3 +33,22 @@ def test_validate_overlapping_edits():
     except ValueError:
         return
     assert False, "Expected ValueError for overlapping edits"
+
+
+def test_stream_parser_emits_hunks_as_they_complete():
+    patch = "@@ 1-1\n- a = 1\n+ a = 2\n@@ 3-3\n- c\n+ d\n"
+    parser = PatchStreamParser()
+    assert parser.feed(patch[:10]) == []
+    first = parser.feed(patch[10:30])
+    assert [(e.start_line, e.replacement) for e in first] == [(1, "a = 2\n")]
+    rest = parser.feed(patch[30:]) + parser.close()
+    assert first + rest == parse_patch_dsl(patch)
+
+
+def test_merge_edits_drops_overlaps_and_keeps_duplicates_once():
+    first = [Edit(1, 2, "a\n"), Edit(5, 5, "e\n")]
+    second = [Edit(5, 5, "e\n"), Edit(7, 8, "g\n")]
+    third = [Edit(2, 3, "b\n")]
+    merged, conflicts = merge_edits([first, second, third])
+    assert [(e.start_line, e.end_line) for e in merged] == [(1, 2), (5, 5), (7, 8)]
+    assert conflicts == [2]
@@ -0,0 +1,39 @@
+from novaedit.model.prefix_cache import PrefixCache
+
+
+class FakeCache:
+    """Stands in for a KV cache: one slot per token, 10 bytes each."""
+
+    def __init__(self, tokens):
+        self.tokens = list(tokens)
+
+    @property
+    def nbytes(self):
+        return 10 * len(self.tokens)
+
+    def crop(self, n):
+        self.tokens = self.tokens[:n]
+
+
+def test_lookup_returns_cropped_copy_of_longest_prefix():
+    cache = PrefixCache(max_bytes=1000)
+    stored = FakeCache([1, 2, 3, 4, 5])
+    cache.store([1, 2, 3, 4, 5], stored)
+    depth, hit = cache.lookup([1, 2, 3, 9])
+    assert depth == 3 and hit.tokens == [1, 2, 3]
+    assert stored.tokens == [1, 2, 3, 4, 5]
+    # The last prompt token is never served from cache.
+    depth, hit = cache.lookup([1, 2, 3, 4, 5])
+    assert depth == 4
+    assert cache.lookup([7, 8]) == (0, None)
+
+
+def test_lru_eviction_prunes_trie():
+    cache = PrefixCache(max_bytes=100)
+    cache.store([1, 2, 3, 4], FakeCache([1, 2, 3, 4]))
+    cache.store([5, 6, 7, 8], FakeCache([5, 6, 7, 8]))
+    cache.lookup([1, 2, 3, 0])
+    cache.store([9, 9, 9], FakeCache([9, 9, 9]))  # evicts [5, 6, 7, 8]
+    assert cache.lookup([5, 6, 7, 0]) == (0, None)
+    assert cache.lookup([1, 2, 0])[0] == 2
+    assert cache.stats()["bytes"] == 70
@@ -0,0 +1,23 @@
+import threading
+import time
+
+from novaedit.server.profiler import SamplingProfiler
+
+
+def _spin(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        sum(range(100))
+
+
+def test_sampling_profiler_attributes_samples_to_busy_thread():
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    worker = threading.Thread(target=_spin, args=(0.2,))
+    worker.start()
+    worker.join()
+    stacks = profiler.stop()
+    assert profiler.samples > 0
+    busy = sum(count for stack, count in stacks.items() if "_spin" in stack.split(";")[-1])
+    assert busy > profiler.samples // 2
+    assert not any("_wait_for_tstate_lock" in stack for stack in stacks)
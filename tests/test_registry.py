@@ -0,0 +1,70 @@
+import pytest
+
+from novaedit.model import NovaEditModel
+from novaedit.server.registry import ModelRegistry
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _loader(loaded, weights=None):
+    def load(checkpoint, language):
+        loaded.append(checkpoint)
+        model = NovaEditModel(language=language)
+        if weights is not None:
+            model._hf_model = weights()
+        return model
+
+    return load
+
+
+def test_languages_on_one_checkpoint_share_a_single_load():
+    loaded = []
+    registry = ModelRegistry(lambda language: "shared", _loader(loaded))
+    python = registry.get("python")
+    javascript = registry.get("javascript")
+    assert loaded == ["shared"]
+    assert (python.language, javascript.language) == ("python", "javascript")
+    assert type(python.adapter).__name__ == "PythonAdapter"
+    assert type(javascript.adapter).__name__ == "JavaScriptAdapter"
+    assert registry.get("javascript") is javascript
+
+
+def test_idle_languages_are_evicted_but_pinned_ones_stay():
+    clock = FakeClock()
+    evicted = []
+    registry = ModelRegistry(
+        lambda language: None,
+        _loader([]),
+        idle_seconds=60,
+        pinned=["python"],
+        on_evict=evicted.append,
+        clock=clock,
+    )
+    registry.get("python")
+    registry.get("javascript")
+    clock.now = 61
+    assert registry.evict_idle() == ["javascript"]
+    assert evicted == ["javascript"]
+    assert registry.stats()["languages"] == ["python"]
+
+
+def test_memory_budget_evicts_least_recently_used_checkpoint():
+    torch = pytest.importorskip("torch")
+    loaded = []
+    registry = ModelRegistry(
+        lambda language: f"{language}-model",
+        _loader(loaded, weights=lambda: torch.nn.Linear(256, 256, bias=False)),
+        max_bytes=300_000,
+    )
+    registry.get("python")
+    registry.get("javascript")
+    assert registry.stats()["languages"] == ["javascript"]
+    assert registry.stats()["bytes"] == 256 * 256 * 4
+    registry.get("python")
+    assert loaded == ["python-model", "javascript-model", "python-model"]
@@ -1,6 +1,11 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 
-from novaedit.server.main import app
+from novaedit.server.main import _unless_disconnected, app
 
 
 client = TestClient(app)
@@ -48,3 +53,292 @@ def test_health_includes_backend():
     assert resp.status_code == 200
     body = resp.json()
     assert "backend" in body
+    assert body["memory"]["pid"] > 0
+
+
+def test_repeated_edit_is_served_from_cache():
+    payload = {
+        "language": "python",
+        "code": "total = 1\nprint(totl)\n",
+        "start_line": 1,
+        "end_line": 2,
+        "diagnostics": ["NameError: name 'totl' is not defined"],
+    }
+    before = client.get("/health").json()["cache"]["hits"]
+    first = client.post("/v1/edit", json=payload).json()
+    second = client.post("/v1/edit", json=payload).json()
+    assert first == second
+    assert client.get("/health").json()["cache"]["hits"] == before + 1
+
+
+def test_edit_stream_emits_ndjson_edits_then_done():
+    payload = {
+        "language": "python",
+        "code": "value = 1\nprint(valeu)\n",
+        "start_line": 1,
+        "end_line": 2,
+        "diagnostics": ["NameError: name 'valeu' is not defined"],
+    }
+    with client.stream("POST", "/v1/edit/stream", json=payload) as resp:
+        assert resp.status_code == 200
+        messages = [json.loads(line) for line in resp.iter_lines() if line]
+    assert messages[0]["edit"]["start_line"] == 2
+    assert messages[-1]["done"] is True
+    assert "@@ 2-2" in messages[-1]["raw_patch_dsl"]
+
+
+def test_client_disconnect_cancels_pending_work():
+    class GoneRequest:
+        async def is_disconnected(self):
+            return True
+
+    async def main():
+        work = asyncio.ensure_future(asyncio.sleep(10))
+        with pytest.raises(HTTPException) as exc:
+            await _unless_disconnected(GoneRequest(), work)
+        await asyncio.sleep(0)
+        return exc.value.status_code, work.cancelled()
+
+    assert asyncio.run(main()) == (499, True)
+
+
+def test_javascript_request_is_routed_to_a_javascript_model():
+    payload = {
+        "language": "javascript",
+        "code": "let total = 1;\nconsole.log(totl);\n",
+        "start_line": 1,
+        "end_line": 2,
+        "diagnostics": ["ReferenceError: name 'totl' is not defined"],
+    }
+    assert client.post("/v1/edit", json=payload).status_code == 200
+    assert "javascript" in client.get("/health").json()["models"]["languages"]
+
+
+def test_batch_edit_returns_per_region_and_merged_patches():
+    code = "import os\nx = 1\nprint(xx)\ny = 2\nprint(yy)\n"
+    payload = {
+        "documents": [
+            {
+                "code": code,
+                "file_path": "a.py",
+                "regions": [
+                    {
+                        "start_line": 1,
+                        "end_line": 3,
+                        "diagnostics": ["NameError: name 'xx' is not defined"],
+                    },
+                    {
+                        "start_line": 4,
+                        "end_line": 5,
+                        "diagnostics": ["NameError: name 'yy' is not defined"],
+                    },
+                ],
+            }
+        ]
+    }
+    resp = client.post("/v1/edit:batch", json=payload)
+    assert resp.status_code == 200
+    document = resp.json()["documents"][0]
+    assert document["file_path"] == "a.py"
+    assert len(document["regions"]) == 2
+    assert all(region["edits"] for region in document["regions"])
+    spans = [(e["start_line"], e["end_line"]) for e in document["edits"]]
+    assert spans == sorted(spans)
+    assert all(a[1] < b[0] for a, b in zip(spans, spans[1:]))
+
+
+def test_batch_edit_rejects_bad_region():
+    payload = {"documents": [{"code": "x = 1\n", "regions": [{"start_line": 3, "end_line": 1}]}]}
+    assert client.post("/v1/edit:batch", json=payload).status_code == 400
+
+
+def test_edit_refers_to_session_document_after_incremental_change():
+    session = {"session_id": "test-session", "uri": "file:///app.py"}
+    opened = client.post(
+        "/v1/documents/open", json={**session, "version": 1, "text": "x = 1\nprint(x)\n"}
+    )
+    assert opened.status_code == 200
+    change = {
+        "range": {"start": {"line": 1, "character": 6}, "end": {"line": 1, "character": 7}},
+        "text": "xx",
+    }
+    changed = client.post(
+        "/v1/documents/change", json={**session, "version": 2, "changes": [change]}
+    )
+    assert changed.json()["version"] == 2
+
+    payload = {
+        "session_id": session["session_id"],
+        "document_uri": session["uri"],
+        "document_version": 2,
+        "start_line": 1,
+        "end_line": 2,
+        "diagnostics": ["NameError: name 'xx' is not defined"],
+    }
+    resp = client.post("/v1/edit", json=payload)
+    assert resp.status_code == 200
+    assert resp.json()["edits"]
+    stale = client.post("/v1/edit", json={**payload, "document_version": 1})
+    assert stale.status_code == 409
+
+    assert client.post("/v1/documents/close", json=session).status_code == 200
+    assert client.post("/v1/edit", json=payload).status_code == 404
+
+
+def test_websocket_multiplexes_calls_by_id():
+    edit = {
+        "code": "x = 1\nprint(xx)\n",
+        "start_line": 1,
+        "end_line": 2,
+        "diagnostics": ["NameError: name 'xx' is not defined"],
+    }
+    with client.websocket_connect("/v1/ws") as ws:
+        ws.send_json({"id": "a", "type": "edit", "params": edit})
+        ws.send_json({"id": "b", "type": "edit", "params": {**edit, "start_line": 3}})
+        ws.send_json({"id": "c", "type": "rename", "params": {}})
+        ws.send_json({"id": "d", "type": "cancel"})
+        replies = {reply["id"]: reply for reply in (ws.receive_json() for _ in range(3))}
+    assert replies["a"]["status"] == 200
+    assert replies["a"]["result"]["edits"]
+    assert replies["b"]["status"] == 400
+    assert replies["c"]["status"] == 400
+
+
+def test_websocket_call_that_raises_gets_a_500_reply(monkeypatch):
+    from novaedit.server import main
+
+    class BrokenModel:
+        language = "python"
+        backend = "broken"
+        supports_batching = False
+
+        def generate_patch(self, **kwargs):
+            raise RuntimeError("model failed")
+
+    async def broken_model(language):
+        return BrokenModel()
+
+    monkeypatch.setattr(main, "_model_for", broken_model)
+    edit = {"code": "broken = 1\nprint(brokn)\n", "start_line": 1, "end_line": 2}
+    with client.websocket_connect("/v1/ws") as ws:
+        ws.send_json({"id": "a", "type": "edit", "params": edit})
+        assert ws.receive_json() == {"id": "a", "status": 500, "error": "Internal server error"}
+
+
+def test_metrics_report_stage_latencies_and_gauges():
+    payload = {
+        "code": "a = 1\nprint(aa)\n",
+        "start_line": 1,
+        "end_line": 2,
+        "diagnostics": ["NameError: name 'aa' is not defined"],
+    }
+    assert client.post("/v1/edit", json=payload).status_code == 200
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    body = resp.text
+    assert 'novaedit_stage_seconds_count{stage="heuristics"}' in body
+    assert 'novaedit_stage_seconds_count{stage="decode"}' in body
+    assert 'novaedit_request_seconds_bucket{path="/v1/edit",status="200",le="+Inf"}' in body
+    assert "novaedit_queue_depth 0.0" in body
+
+
+def test_admin_profile_returns_collapsed_stacks(monkeypatch):
+    from novaedit.server import main
+
+    assert client.post("/admin/profile", params={"seconds": 0}).status_code == 404
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    assert client.post("/admin/profile", params={"seconds": 0}).status_code == 401
+    resp = client.post(
+        "/admin/profile",
+        params={"seconds": 0.2, "interval_ms": 1, "include_idle": True},
+        headers={"Authorization": "Bearer secret"},
+    )
+    assert resp.status_code == 200
+    assert int(resp.headers["x-profile-samples"]) > 0
+    stack, count = resp.text.splitlines()[0].rsplit(" ", 1)
+    assert ";" in stack and int(count) >= 1
+
+
+def test_admin_profile_can_wait_for_edit_requests(monkeypatch):
+    import threading
+    import time
+
+    from novaedit.server import main
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    result = {}
+    # One client session, so both requests share the app's event loop.
+    with TestClient(app) as session:
+
+        def run_profile():
+            result["resp"] = session.post(
+                "/admin/profile", params={"requests": 1}, headers={"Authorization": "Bearer secret"}
+            )
+
+        profiling = threading.Thread(target=run_profile)
+        profiling.start()
+        while main.profile_countdown is None:
+            time.sleep(0.01)
+        session.post("/v1/edit", json={"code": "x = 1\n", "instruction": "add type hints"})
+        profiling.join(timeout=10)
+    assert result["resp"].status_code == 200
+
+
+def test_admin_profile_counts_every_edit_endpoint(monkeypatch):
+    import threading
+    import time
+
+    from novaedit.server import main
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    headers = {"Authorization": "Bearer secret"}
+    result = {}
+    with TestClient(app) as session:
+
+        def run_profile():
+            result["resp"] = session.post("/admin/profile", params={"requests": 3}, headers=headers)
+
+        profiling = threading.Thread(target=run_profile)
+        profiling.start()
+        while main.profile_countdown is None:
+            time.sleep(0.01)
+        code = "x = 1\nprint(xx)\n"
+        region = {"start_line": 1, "end_line": 2}
+        batch = {"documents": [{"file_path": "a.py", "code": code, "regions": [region]}]}
+        session.post("/v1/edit:batch", json=batch)
+        with session.stream("POST", "/v1/edit/stream", json={"code": code, **region}) as resp:
+            resp.read()
+        with session.websocket_connect("/v1/ws") as socket:
+            socket.send_json({"id": 1, "type": "edit", "params": {"code": code, **region}})
+            assert socket.receive_json()["status"] == 200
+        profiling.join(timeout=10)
+    assert not profiling.is_alive() and result["resp"].status_code == 200
+    monkeypatch.setattr(main, "workers", object())
+    assert client.post("/admin/profile", headers=headers).status_code == 409
+
+
+def test_admin_profile_counts_rejected_stream_requests(monkeypatch):
+    import threading
+    import time
+
+    from novaedit.server import main
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    result = {}
+    with TestClient(app) as session:
+
+        def run_profile():
+            result["resp"] = session.post(
+                "/admin/profile", params={"requests": 2}, headers={"Authorization": "Bearer secret"}
+            )
+
+        profiling = threading.Thread(target=run_profile)
+        profiling.start()
+        while main.profile_countdown is None:
+            time.sleep(0.01)
+        bad_range = {"code": "x = 1\n", "start_line": 3, "end_line": 1}
+        for _ in range(2):
+            assert session.post("/v1/edit/stream", json=bad_range).status_code == 400
+        profiling.join(timeout=10)
+    assert not profiling.is_alive() and result["resp"].status_code == 200
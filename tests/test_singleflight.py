@@ -0,0 +1,51 @@
+import asyncio
+
+from novaedit.server.singleflight import SingleFlight
+
+
+def test_identical_calls_share_one_run_even_if_leader_gives_up():
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "patch"
+
+    async def main():
+        flights = SingleFlight()
+        leader = asyncio.create_task(flights.run("k", work))
+        followers = [asyncio.create_task(flights.run("k", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        return flights, results
+
+    flights, results = asyncio.run(main())
+    assert results == ["patch"] * 3
+    assert len(calls) == 1
+    assert flights.stats() == {"in_flight": 0, "started": 1, "coalesced": 3, "abandoned": 0}
+
+
+def test_work_is_cancelled_once_every_caller_gives_up():
+    cancelled = []
+
+    async def work():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(1)
+            raise
+
+    async def main():
+        flights = SingleFlight()
+        callers = [asyncio.create_task(flights.run("k", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flights
+
+    flights = asyncio.run(main())
+    assert cancelled == [1]
+    assert flights.stats()["abandoned"] == 1
@@ -0,0 +1,153 @@
+import pytest
+
+from novaedit.model import NovaEditModel
+from novaedit.model.config import ModelConfig
+
+torch = pytest.importorskip("torch")
+
+from novaedit.model.transformer import NovaEditForCausalLM  # noqa: E402
+
+SMALL = ModelConfig(
+    d_model=32, n_layers=2, n_heads=4, n_kv_heads=2, d_ff=64, vocab_size=64, max_seq_len=128
+)
+
+
+def _model() -> NovaEditForCausalLM:
+    torch.manual_seed(0)
+    return NovaEditForCausalLM(SMALL).eval()
+
+
+def test_incremental_decoding_matches_full_forward():
+    model = _model()
+    ids = torch.randint(0, SMALL.vocab_size, (1, 12))
+    with torch.no_grad():
+        full = model(ids, use_cache=False).logits
+        cache = model(ids[:, :8]).past_key_values
+        steps = [model(ids[:, i : i + 1], past_key_values=cache).logits for i in range(8, 12)]
+    assert cache.get_seq_length() == 12
+    assert torch.allclose(torch.cat(steps, dim=1), full[:, 8:], atol=1e-5)
+
+
+def test_kv_cache_is_preallocated_for_shared_heads_and_crops():
+    model = _model()
+    cache = model(torch.randint(0, SMALL.vocab_size, (1, 5))).past_key_values
+    head_dim = SMALL.d_model // SMALL.n_heads
+    assert cache.keys.shape == (SMALL.n_layers, 1, SMALL.n_kv_heads, SMALL.max_seq_len, head_dim)
+    cache.crop(-2)
+    assert cache.get_seq_length() == 3
+
+
+def test_matches_hf_llama_with_same_weights():
+    transformers = pytest.importorskip("transformers")
+    model = _model()
+    hf = transformers.LlamaForCausalLM(
+        transformers.LlamaConfig(
+            vocab_size=SMALL.vocab_size,
+            hidden_size=SMALL.d_model,
+            intermediate_size=SMALL.d_ff,
+            num_hidden_layers=SMALL.n_layers,
+            num_attention_heads=SMALL.n_heads,
+            num_key_value_heads=SMALL.n_kv_heads,
+            max_position_embeddings=SMALL.max_seq_len,
+            rope_theta=SMALL.rope_base,
+            rms_norm_eps=1e-6,
+        )
+    ).eval()
+    with torch.no_grad():
+        hf.model.embed_tokens.weight.copy_(model.embed.weight)
+        hf.model.norm.weight.copy_(model.norm.weight)
+        hf.lm_head.weight.copy_(model.lm_head.weight)
+        for block, layer in zip(model.layers, hf.model.layers):
+            attn = layer.self_attn
+            q, k, v = block.attn.qkv.weight.split(
+                (attn.q_proj.out_features, attn.k_proj.out_features, attn.v_proj.out_features)
+            )
+            attn.q_proj.weight.copy_(q)
+            attn.k_proj.weight.copy_(k)
+            attn.v_proj.weight.copy_(v)
+            attn.o_proj.weight.copy_(block.attn.out.weight)
+            gate, up = block.ffn.gate_up.weight.split(SMALL.d_ff)
+            layer.mlp.gate_proj.weight.copy_(gate)
+            layer.mlp.up_proj.weight.copy_(up)
+            layer.mlp.down_proj.weight.copy_(block.ffn.down.weight)
+            layer.input_layernorm.weight.copy_(block.attn_norm.weight)
+            layer.post_attention_layernorm.weight.copy_(block.ffn_norm.weight)
+        ids = torch.randint(0, SMALL.vocab_size, (1, 10))
+        assert torch.allclose(model(ids).logits, hf(ids).logits, atol=1e-5)
+
+
+def test_native_backend_generates_patches(tiny_native_model_dir):
+    model = NovaEditModel(native_model_dir=tiny_native_model_dir, device="cpu")
+    speculative = NovaEditModel(
+        native_model_dir=tiny_native_model_dir, device="cpu", speculative=True
+    )
+    assert model.backend == "native"
+    assert not model.supports_batching
+    code = "items = [1, 2, 3]\nfor item in items:\n    print(itme)\n"
+    expected = model.generate_patch(code=code, start_line=1, end_line=3, max_edits=2)
+    assert len(expected[0]) <= 2
+    assert speculative.generate_patch(code=code, start_line=1, end_line=3, max_edits=2) == expected
+    streamed = list(model.stream_patch(code=code, start_line=1, end_line=3, max_edits=2))
+    assert streamed == expected[0]
+
+
+def test_int8_quantized_native_backend_uses_disk_cache(tiny_native_model_dir, tmp_path):
+    from novaedit.model.quantization import model_nbytes
+
+    fp32 = NovaEditModel(native_model_dir=tiny_native_model_dir, device="cpu")
+    first = NovaEditModel(
+        native_model_dir=tiny_native_model_dir, quantization="int8", quant_cache_dir=str(tmp_path)
+    )
+    assert first.device == "cpu"
+    assert model_nbytes(first._hf_model) < model_nbytes(fp32._hf_model)
+    assert len(list(tmp_path.glob("*-int8.safetensors"))) == 1
+    second = NovaEditModel(
+        native_model_dir=tiny_native_model_dir, quantization="int8", quant_cache_dir=str(tmp_path)
+    )
+    code = "def f(a):\n    return b\n"
+    kwargs = dict(code=code, start_line=1, end_line=2, max_edits=1)
+    assert second.generate_patch(**kwargs) == first.generate_patch(**kwargs)
+
+
+def test_mmapped_native_weights_match_regular_load(tiny_native_model_dir):
+    loaded = NovaEditModel(native_model_dir=tiny_native_model_dir, device="cpu")
+    mapped = NovaEditModel(native_model_dir=tiny_native_model_dir, mmap_weights=True)
+    assert mapped.weights_mmapped and not loaded.weights_mmapped
+    assert not any(p.is_meta for p in mapped._hf_model.parameters())
+    code = "def f(a):\n    return b\n"
+    kwargs = dict(code=code, start_line=1, end_line=2, max_edits=1)
+    assert mapped.generate_patch(**kwargs) == loaded.generate_patch(**kwargs)
+
+
+def test_mmapped_build_leaves_other_threads_on_real_devices(tiny_native_model_dir):
+    import threading
+    from pathlib import Path
+
+    from novaedit.model.transformer import CONFIG_FILE
+    from novaedit.model.weights import load_mmapped, safetensors_files
+
+    config = ModelConfig.from_yaml(Path(tiny_native_model_dir) / CONFIG_FILE)
+    building, built = threading.Event(), threading.Event()
+    other = {}
+
+    def build():
+        building.set()
+        built.wait(timeout=10)
+        return NovaEditForCausalLM(config)
+
+    def construct_elsewhere():
+        building.wait(timeout=10)
+        other["linear"] = torch.nn.Linear(4, 4)
+        built.set()
+
+    thread = threading.Thread(target=construct_elsewhere)
+    thread.start()
+    model = load_mmapped(build, safetensors_files(tiny_native_model_dir))
+    thread.join()
+    assert not other["linear"].weight.is_meta
+    assert model is not None and not any(b.is_meta for b in model.buffers())
+
+
+def test_unknown_quantization_mode_is_rejected():
+    with pytest.raises(ValueError):
+        NovaEditModel(quantization="int3")
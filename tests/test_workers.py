@@ -0,0 +1,63 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from novaedit.model import NovaEditModel, PatchRequest
+from novaedit.server.workers import ProcessWorkerPool
+
+
+def test_process_pool_matches_in_process_heuristics():
+    requests = [
+        PatchRequest("x = 1\nprint(xx)\n", 1, 2, ["NameError: name 'xx' is not defined"]),
+        PatchRequest("def f(a):\n    return a\n", 1, 2, instruction="add type hints"),
+    ]
+    pool = ProcessWorkerPool(1, language="python")
+    try:
+        pool.warm_up()
+
+        async def main():
+            return await asyncio.gather(*(pool.submit(request) for request in requests))
+
+        results = asyncio.run(main())
+        stats = pool.stats()
+    finally:
+        pool.shutdown()
+    assert results == NovaEditModel().generate_patch_batch(requests)
+    assert (stats["workers"], stats["submitted"]) == (1, 2)
+    assert len(stats["memory"]) == 1
+
+
+def test_server_workers_run_the_precheck():
+    script = (
+        "from fastapi.testclient import TestClient\n"
+        "from novaedit.server.main import app\n"
+        "with TestClient(app) as client:\n"
+        "    payload = {'code': 'x = 1\\nprint(x)\\n', 'start_line': 1, 'end_line': 2}\n"
+        "    assert client.post('/v1/edit', json=payload).json()['edits'] == []\n"
+        "    health = client.get('/health').json()\n"
+        "    assert health['workers']['submitted'] == 1, health['workers']\n"
+        "    assert health['cascade']['no_edit'] == 1, health['cascade']\n"
+    )
+    env = dict(os.environ, NOVAEDIT_WORKERS="2", NOVAEDIT_PRECHECK="true")
+    env.pop("NOVAEDIT_MODEL_ID", None)
+    subprocess.run([sys.executable, "-c", script], env=env, check=True, timeout=120)
+
+
+def test_server_profiles_model_backends_that_ignore_workers(tiny_hf_model_dir):
+    script = (
+        "from fastapi.testclient import TestClient\n"
+        "from novaedit.server.main import app\n"
+        "with TestClient(app) as client:\n"
+        "    assert client.get('/health').json()['workers'] is None\n"
+        "    resp = client.post('/admin/profile', params={'seconds': 0.1},\n"
+        "                       headers={'Authorization': 'Bearer secret'})\n"
+        "    assert resp.status_code == 200, resp.text\n"
+    )
+    env = dict(
+        os.environ,
+        NOVAEDIT_WORKERS="2",
+        NOVAEDIT_MODEL_ID=tiny_hf_model_dir,
+        NOVAEDIT_ADMIN_TOKEN="secret",
+    )
+    subprocess.run([sys.executable, "-c", script], env=env, check=True, timeout=120)